@@ -21,7 +21,7 @@ if _PROJECT_ROOT not in sys.path:
     sys.path.insert(0, _PROJECT_ROOT)
 
 from evaluation.f1_score import f1_score
-from scripts.normalize import extract_domain, normalize_url
+from scripts.normalize import parse_urls
 
 sns.set_style("whitegrid")
 plt.rcParams["figure.figsize"] = (12, 8)
@@ -69,11 +69,10 @@ class CultivateAnalyzer:
         self.automation['city'] = self.automation['city'].str.lower()
         self.city_language['city'] = self.city_language['city'].str.lower()
 
-        self.ground_truth['source_url_norm'] = self.ground_truth['source_url'].apply(normalize_url)
-        self.automation['source_url_norm'] = self.automation['source_url'].apply(normalize_url)
-
-        self.ground_truth['domain'] = self.ground_truth['source_url'].apply(extract_domain)
-        self.automation['domain'] = self.automation['source_url'].apply(extract_domain)
+        for df in [self.ground_truth, self.automation]:
+            parts = parse_urls(df['source_url'])
+            df['source_url_norm'] = parts['url_norm']
+            df['domain'] = parts['domain']
 
         self.automation['version'] = self.automation['run_id'].str.extract(r'(v\d+)$')[0]
 
@@ -6,11 +6,14 @@ Provides detailed string similarity analysis for manual review
 
 from __future__ import annotations
 
+import argparse
 import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from difflib import SequenceMatcher
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
 # Allow imports from project root
@@ -18,23 +21,9 @@ _PROJECT_ROOT = str(Path(__file__).resolve().parents[3])
 if _PROJECT_ROOT not in sys.path:
     sys.path.insert(0, _PROJECT_ROOT)
 
-from scripts.normalize import extract_domain, normalize_url
-
-
-def extract_path_segments(url_norm: str | None) -> list[str]:
-    """Extract path segments from normalized URL"""
-    if pd.isna(url_norm) or not url_norm:
-        return []
-
-    # Remove domain part
-    parts = url_norm.split('/', 1)
-    if len(parts) < 2:
-        return []
-
-    path = parts[1]
-    # Split by / and filter empty strings
-    segments = [s for s in path.split('/') if s]
-    return segments
+from scripts.blocking import QGramIndex, gram_frequencies
+from scripts.normalize import parse_urls
+from scripts.similarity import RatioScorer
 
 
 def calculate_string_similarity(str1: object, str2: object) -> float:
@@ -71,6 +60,237 @@ def calculate_token_similarity(str1: object, str2: object) -> float:
     return len(intersection) / len(union) if union else 0.0
 
 
+_PLATFORM_DOMAINS = ['facebook.com', 'instagram.com', 'twitter.com', 'linkedin.com']
+
+_MATCH_COLUMNS = [
+    'ground_truth_id', 'city', 'search_language', 'gt_url', 'gt_url_norm',
+    'automation_id', 'run_id', 'version', 'auto_url', 'auto_url_norm', 'is_included',
+    'match_level', 'confidence_score', 'url_similarity_pct', 'token_similarity_pct',
+    'combined_similarity_pct', 'review_action',
+]
+
+
+def _codes(left: pd.Series, right: pd.Series) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Factorize two columns against one vocabulary (missing values get -1)."""
+    codes, uniques = pd.factorize(pd.concat([left, right], ignore_index=True))
+    return codes[:len(left)], codes[len(left):], np.asarray(uniques, dtype=object)
+
+
+def _join_codes(left: np.ndarray, right: np.ndarray, pairs: pd.DataFrame | None = None) -> pd.DataFrame:
+    """Row pairs (g, a) whose codes are equal, or listed in *pairs* (columns cg, ca)."""
+    left_rows = pd.DataFrame({'cg': left, 'g': np.arange(len(left))})
+    right_rows = pd.DataFrame({'ca': right, 'a': np.arange(len(right))})
+    if pairs is None:
+        keyed = left_rows[left_rows['cg'] >= 0]
+        return keyed.merge(right_rows, left_on='cg', right_on='ca')[['g', 'a']]
+    return pairs.merge(left_rows, on='cg').merge(right_rows, on='ca')[['g', 'a']]
+
+
+def plausible_pairs(
+    url_gt: np.ndarray,
+    url_auto: np.ndarray,
+    dom_gt: np.ndarray,
+    dom_auto: np.ndarray,
+    lowered: list[str],
+    tokens: list[set[str]],
+    min_similarity: float,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Row pairs (g, a) find_similar_urls can keep, sorted by (g, a)
+
+    A pair is kept when its confidence is non-zero or its combined
+    similarity (70 * url_sim + 30 * token_sim) reaches min_similarity.
+    Non-zero confidence needs the same URL or domain (domain + first path
+    segment is a subset), found by key lookups. By similarity, a pair needs
+    a shared '/' token or, without one, url_sim >= min_similarity / 70,
+    which a character q-gram index (scripts.blocking) finds without loss.
+    With min_similarity <= 0 every pair is kept.
+
+    Args:
+        url_gt, url_auto, dom_gt, dom_auto: Factorized url_norm and domain
+            codes per row (-1 = missing)
+        lowered, tokens: Lowercased URL and its '/' tokens per URL code
+    """
+    n_gt, n_auto = len(url_gt), len(url_auto)
+    threshold = min_similarity / 70 - 1e-9
+    if threshold <= 0:
+        return np.repeat(np.arange(n_gt), n_auto), np.tile(np.arange(n_auto), n_gt)
+
+    frames = [_join_codes(dom_gt, dom_auto), _join_codes(url_gt, url_auto)]
+
+    auto_codes = np.unique(url_auto[url_auto >= 0])
+    by_token: dict[str, list[int]] = {}
+    for c in auto_codes:
+        for tok in tokens[c]:
+            by_token.setdefault(tok, []).append(c)
+    names = None
+    if threshold <= 1:
+        auto_urls = [lowered[c] for c in auto_codes]
+        names = QGramIndex(threshold, gram_frequencies=gram_frequencies(auto_urls))
+        for url in auto_urls:
+            names.add(url)
+
+    cg, ca = [], []
+    for c in np.unique(url_gt[url_gt >= 0]):
+        found = set()
+        for tok in tokens[c]:
+            found.update(by_token.get(tok, ()))
+        if names is not None:
+            found.update(auto_codes[k] for k in names.candidates(lowered[c]))
+        cg += [c] * len(found)
+        ca += found
+    frames.append(_join_codes(url_gt, url_auto, pd.DataFrame({'cg': cg, 'ca': ca}, dtype=np.int64)))
+
+    pairs = pd.concat(frames, ignore_index=True)
+    ids = np.unique(pairs['g'].to_numpy(dtype=np.int64) * n_auto + pairs['a'].to_numpy(dtype=np.int64))
+    return ids // n_auto, ids % n_auto
+
+
+def match_city_urls(
+    gt: pd.DataFrame,
+    auto: pd.DataFrame,
+    min_similarity: float = 0.0,
+    exhaustive: bool = False,
+) -> pd.DataFrame:
+    """
+    Score the ground truth x automation pairs of one city
+
+    Only pairs from plausible_pairs are scored unless *exhaustive* is set;
+    both give the same result, the exhaustive mode exists for audits.
+    Match levels and confidence are computed on factorized URL, domain and
+    path columns for all candidate pairs at once. String and token
+    similarity are computed once per distinct (gt_url_norm, auto_url_norm)
+    pair; pairs that can only be kept by similarity are scored with a
+    cutoff, so hopeless ones exit early. Values equal
+    calculate_string_similarity and calculate_token_similarity exactly.
+
+    Returns the rows find_similar_urls keeps, in (ground truth, automation)
+    order, with the row positions in ``_gt_pos`` and ``_auto_pos``.
+    """
+    url_gt, url_auto, urls = _codes(gt['url_norm'], auto['url_norm'])
+    dom_gt, dom_auto, domains = _codes(gt['domain'], auto['domain'])
+    p1_gt, p1_auto, _ = _codes(gt['path_seg_1'], auto['path_seg_1'])
+
+    lowered = [str(u).lower() for u in urls]
+    tokens = [set(u.split('/')) for u in lowered]
+
+    if exhaustive:
+        n_gt, n_auto = len(gt), len(auto)
+        g, a = np.repeat(np.arange(n_gt), n_auto), np.tile(np.arange(n_auto), n_gt)
+    else:
+        g, a = plausible_pairs(url_gt, url_auto, dom_gt, dom_auto, lowered, tokens, min_similarity)
+
+    url_g, url_a = url_gt[g], url_auto[a]
+    dom_g, dom_a = dom_gt[g], dom_auto[a]
+    p1_g = p1_gt[g]
+
+    exact = (url_g == url_a) & (url_g >= 0)
+    same_domain = (dom_g == dom_a) & (dom_g >= 0)
+    same_path1 = same_domain & (p1_g == p1_auto[a]) & (p1_g >= 0)
+    platform = np.isin(domains, _PLATFORM_DOMAINS)[dom_g] & same_domain
+
+    match_level = np.select(
+        [exact, same_path1, platform, same_domain],
+        ['exact_url', 'domain_path1', 'domain_platform', 'domain_only'],
+        default='no_match',
+    )
+    confidence = np.select([exact, same_path1, platform, same_domain], [100, 75, 20, 40], default=0)
+
+    # Similarity per distinct URL pair; missing URLs score 0
+    n_urls = len(urls) + 1
+    pair_key = (url_g + 1) * n_urls + (url_a + 1)
+    pairs, inverse = np.unique(pair_key, return_inverse=True)
+    pair_g, pair_a = pairs // n_urls - 1, pairs % n_urls - 1
+    pair_conf = np.zeros(len(pairs), dtype=int)
+    np.maximum.at(pair_conf, inverse, confidence)
+
+    url_sim = np.zeros(len(pairs))
+    token_sim = np.zeros(len(pairs))
+    scorer = RatioScorer()
+    for k in np.lexsort((pair_g, pair_a)):
+        i, j = pair_g[k], pair_a[k]
+        if i < 0 or j < 0:
+            continue
+        t1, t2 = tokens[i], tokens[j]
+        union = t1 | t2
+        t = len(t1 & t2) / len(union) if union else 0.0
+        token_sim[k] = t
+        # Rows kept only for similarity need url_sim >= this; others need it exact
+        cutoff = 0.0 if pair_conf[k] > 0 else (min_similarity / 100 - t * 0.3) / 0.7 - 1e-9
+        url_sim[k] = scorer.score(lowered[i], lowered[j], cutoff=max(cutoff, 0.0))
+
+    u, t = url_sim[inverse], token_sim[inverse]
+    combined = (u * 0.7 + t * 0.3) * 100
+    keep = np.flatnonzero((combined >= min_similarity) | (confidence > 0))
+    if len(keep) == 0:
+        return pd.DataFrame(columns=_MATCH_COLUMNS + ['_gt_pos', '_auto_pos'])
+
+    gk, ak = g[keep], a[keep]
+    conf_k = confidence[keep]
+    gt_cols = {col: gt[col].to_numpy()[gk] for col in ['ground_truth_id', 'city', 'search_language', 'source_url', 'url_norm']}
+    auto_cols = {col: auto[col].to_numpy()[ak] for col in ['automation_id', 'run_id', 'version', 'source_url', 'url_norm', 'is_included_bool']}
+    return pd.DataFrame({
+        'ground_truth_id': gt_cols['ground_truth_id'],
+        'city': gt_cols['city'],
+        'search_language': gt_cols['search_language'],
+        'gt_url': gt_cols['source_url'],
+        'gt_url_norm': gt_cols['url_norm'],
+        'automation_id': auto_cols['automation_id'],
+        'run_id': auto_cols['run_id'],
+        'version': auto_cols['version'],
+        'auto_url': auto_cols['source_url'],
+        'auto_url_norm': auto_cols['url_norm'],
+        'is_included': auto_cols['is_included_bool'],
+        'match_level': match_level[keep],
+        'confidence_score': conf_k,
+        'url_similarity_pct': [round(x * 100, 2) for x in u[keep].tolist()],
+        'token_similarity_pct': [round(x * 100, 2) for x in t[keep].tolist()],
+        'combined_similarity_pct': [round(x, 2) for x in combined[keep].tolist()],
+        'review_action': np.where(conf_k == 100, 'AUTO_ACCEPT', 'MANUAL_REVIEW'),
+        '_gt_pos': gt.index.to_numpy()[gk],
+        '_auto_pos': auto.index.to_numpy()[ak],
+    })
+
+
+def _match_partitions(
+    partitions: list[tuple[str, pd.DataFrame, pd.DataFrame]],
+    min_similarity: float,
+    exhaustive: bool,
+    workers: int,
+) -> list[pd.DataFrame]:
+    """
+    Run match_city_urls on each (city, gt, auto) partition, one line per city
+
+    With workers > 1 cities go to a process pool, largest first so one big
+    city does not start last. Each worker receives only its own city's rows.
+    Chunks are returned in partition order either way.
+    """
+    total = len(partitions)
+    chunks: list[pd.DataFrame | None] = [None] * total
+
+    def report(done: int, k: int) -> None:
+        city, gt_city, auto_city = partitions[k]
+        print(f"  [{done}/{total}] {city}: {len(gt_city)} x {len(auto_city)} URLs, {len(chunks[k])} matches")
+
+    if workers <= 1 or total <= 1:
+        for k, (_, gt_city, auto_city) in enumerate(partitions):
+            chunks[k] = match_city_urls(gt_city, auto_city, min_similarity, exhaustive)
+            report(k + 1, k)
+        return chunks
+
+    order = sorted(range(total), key=lambda k: -len(partitions[k][1]) * len(partitions[k][2]))
+    with ProcessPoolExecutor(max_workers=min(workers, total)) as pool:
+        futures = {
+            pool.submit(match_city_urls, partitions[k][1], partitions[k][2], min_similarity, exhaustive): k
+            for k in order
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            k = futures[future]
+            chunks[k] = future.result()
+            report(done, k)
+    return chunks
+
+
 class SimilarityAnalyzer:
     """Analyzer for URL similarity matching"""
 
@@ -114,19 +334,11 @@ class SimilarityAnalyzer:
         self.automation['city'] = self.automation['city'].str.lower()
         self.city_language['city'] = self.city_language['city'].str.lower()
 
-        # URL processing
-        self.ground_truth['url_norm'] = self.ground_truth['source_url'].apply(normalize_url)
-        self.automation['url_norm'] = self.automation['source_url'].apply(normalize_url)
-
-        self.ground_truth['domain'] = self.ground_truth['source_url'].apply(extract_domain)
-        self.automation['domain'] = self.automation['source_url'].apply(extract_domain)
-
-        # Extract path segments
-        self.ground_truth['path_segments'] = self.ground_truth['url_norm'].apply(extract_path_segments)
-        self.automation['path_segments'] = self.automation['url_norm'].apply(extract_path_segments)
-
-        self.ground_truth['path_seg_1'] = self.ground_truth['path_segments'].apply(lambda x: x[0] if len(x) > 0 else None)
-        self.automation['path_seg_1'] = self.automation['path_segments'].apply(lambda x: x[0] if len(x) > 0 else None)
+        # URL processing: normalized URL, domain and path segments in one parse
+        url_cols = ['url_norm', 'domain', 'path_segments', 'path_seg_1']
+        for df in [self.ground_truth, self.automation]:
+            parts = parse_urls(df['source_url'])
+            df[url_cols] = parts[url_cols]
 
         # Merge with reviews
         self.automation = self.automation.merge(
@@ -158,96 +370,56 @@ class SimilarityAnalyzer:
         print(f"  Automation: {len(self.automation)} URLs")
         print(f"  Cities: {self.city_language['city'].nunique()}")
 
-    def find_similar_urls(self, city_filter: str | None = None, min_similarity: float = 0.0) -> pd.DataFrame:
+    def find_similar_urls(
+        self,
+        city_filter: str | None = None,
+        min_similarity: float = 0.0,
+        exhaustive: bool = False,
+        workers: int = 1,
+    ) -> pd.DataFrame:
         """
         Find similar URLs between ground truth and automation
 
         Args:
             city_filter: Optional city to filter (e.g., 'cork')
             min_similarity: Minimum similarity score to include (0.0 to 1.0)
+            exhaustive: Score every pair instead of indexed candidates only
+                (same result; for audits)
+            workers: Number of processes to score cities in (1 = in-process).
+                The result does not depend on it.
 
         Returns:
             DataFrame with similarity scores
         """
-        gt = self.ground_truth.copy()
-        auto = self.automation.copy()
+        gt = self.ground_truth.reset_index(drop=True)
+        auto = self.automation.reset_index(drop=True)
 
         if city_filter:
             gt = gt[gt['city'] == city_filter.lower()]
             auto = auto[auto['city'] == city_filter.lower()]
 
-        results = []
-
         print(f"\nCalculating similarity for {len(gt)} ground truth URLs...")
 
-        for idx, gt_row in gt.iterrows():
-            gt_city = gt_row['city']
-            gt_url = gt_row['url_norm']
-            gt_domain = gt_row['domain']
-            gt_path1 = gt_row['path_seg_1']
-
-            # Filter automation URLs for same city
-            auto_city = auto[auto['city'] == gt_city]
-
-            for _, auto_row in auto_city.iterrows():
-                auto_url = auto_row['url_norm']
-                auto_domain = auto_row['domain']
-                auto_path1 = auto_row['path_seg_1']
-
-                # Calculate similarity scores
-                url_similarity = calculate_string_similarity(gt_url, auto_url)
-                token_similarity = calculate_token_similarity(gt_url, auto_url)
-
-                # Determine match level and confidence
-                if gt_url == auto_url:
-                    match_level = 'exact_url'
-                    confidence = 100
-                elif gt_domain == auto_domain and gt_path1 == auto_path1 and gt_path1 is not None:
-                    match_level = 'domain_path1'
-                    confidence = 75
-                elif gt_domain == auto_domain:
-                    # Lower confidence for known platforms
-                    if gt_domain in ['facebook.com', 'instagram.com', 'twitter.com', 'linkedin.com']:
-                        match_level = 'domain_platform'
-                        confidence = 20
-                    else:
-                        match_level = 'domain_only'
-                        confidence = 40
-                else:
-                    match_level = 'no_match'
-                    confidence = 0
-
-                # Calculate combined similarity score
-                combined_similarity = (url_similarity * 0.7 + token_similarity * 0.3) * 100
-
-                # Only include if meets minimum similarity
-                if combined_similarity >= min_similarity or confidence > 0:
-                    results.append({
-                        'ground_truth_id': gt_row['ground_truth_id'],
-                        'city': gt_city,
-                        'search_language': gt_row['search_language'],
-                        'gt_url': gt_row['source_url'],
-                        'gt_url_norm': gt_url,
-                        'automation_id': auto_row['automation_id'],
-                        'run_id': auto_row['run_id'],
-                        'version': auto_row['version'],
-                        'auto_url': auto_row['source_url'],
-                        'auto_url_norm': auto_url,
-                        'is_included': auto_row['is_included_bool'],
-                        'match_level': match_level,
-                        'confidence_score': confidence,
-                        'url_similarity_pct': round(url_similarity * 100, 2),
-                        'token_similarity_pct': round(token_similarity * 100, 2),
-                        'combined_similarity_pct': round(combined_similarity, 2),
-                        'review_action': 'AUTO_ACCEPT' if confidence == 100 else 'MANUAL_REVIEW'
-                    })
-
-            if (idx + 1) % 10 == 0:
-                print(f"  Processed {idx + 1}/{len(gt)} ground truth URLs...")
-
-        df = pd.DataFrame(results)
-
-        if len(df) > 0:
+        # Rows keep their original positions so the result is assembled in
+        # the same (ground truth, automation) order as a nested loop would.
+        auto_by_city = {city: part for city, part in auto.groupby('city', sort=False)}
+        partitions = [
+            (city, gt_city, auto_by_city[city])
+            for city, gt_city in gt.groupby('city', sort=False)
+            if city in auto_by_city
+        ]
+        chunks = _match_partitions(partitions, min_similarity, exhaustive, workers)
+        chunks = [c for c in chunks if len(c) > 0]
+
+        if not chunks:
+            df = pd.DataFrame()
+        else:
+            df = (
+                pd.concat(chunks)
+                .sort_values(['_gt_pos', '_auto_pos'], kind='stable')
+                .drop(columns=['_gt_pos', '_auto_pos'])
+                .reset_index(drop=True)
+            )
             # Sort by ground truth ID and similarity scores
             df = df.sort_values(
                 ['ground_truth_id', 'confidence_score', 'combined_similarity_pct'],
@@ -257,7 +429,12 @@ class SimilarityAnalyzer:
         print(f"\nFound {len(df)} potential matches")
         return df
 
-    def generate_review_report(self, output_dir: str | Path = "reports", min_similarity: float = 30.0) -> None:
+    def generate_review_report(
+        self,
+        output_dir: str | Path = "reports",
+        min_similarity: float = 30.0,
+        workers: int = 1,
+    ) -> None:
         """Generate manual review report with similarity scores"""
         output_dir = Path(output_dir)
         output_dir.mkdir(exist_ok=True)
@@ -269,7 +446,7 @@ class SimilarityAnalyzer:
         print("SIMILARITY-BASED MATCHING ANALYSIS")
         print("="*80)
 
-        matches_df = self.find_similar_urls(min_similarity=min_similarity)
+        matches_df = self.find_similar_urls(min_similarity=min_similarity, workers=workers)
 
         if len(matches_df) == 0:
             print("No matches found!")
@@ -342,6 +519,13 @@ class SimilarityAnalyzer:
 
 def main() -> None:
     """Main execution function"""
+    parser = argparse.ArgumentParser(description="Similarity-based URL matching for manual review")
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Processes to score cities in (default: 1; the result does not depend on it)",
+    )
+    args = parser.parse_args()
+
     print("="*80)
     print("CULTIVATE Similarity-Based URL Matching")
     print("="*80)
@@ -351,7 +535,7 @@ def main() -> None:
     analyzer.load_data()
 
     # Generate review report with 30% minimum similarity
-    analyzer.generate_review_report(output_dir='reports', min_similarity=30.0)
+    analyzer.generate_review_report(output_dir='reports', min_similarity=30.0, workers=args.workers)
 
     print("\n" + "="*80)
     print("Analysis complete!")
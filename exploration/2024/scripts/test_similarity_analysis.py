@@ -0,0 +1,156 @@
+"""Tests for similarity_analysis.find_similar_urls."""
+
+from __future__ import annotations
+
+import random
+
+import pandas as pd
+import pytest
+from scripts.normalize import parse_urls
+from similarity_analysis import (
+    SimilarityAnalyzer,
+    calculate_string_similarity,
+    calculate_token_similarity,
+    match_city_urls,
+)
+
+THRESHOLDS = [0.0, 30.0, 55.0, 80.0, 101.0]
+
+
+def _urls(rng: random.Random, n: int) -> list[object]:
+    hosts = ["foodbank.ie", "tafel.de", "facebook.com", "cork.ie", "example.org", "gemeinschaftsgarten.de"]
+    paths = ["", "about", "projects", "projects/fridge", "events/2024", "foodbank", "tafel", "p/123"]
+    urls: list[object] = []
+    for _ in range(n):
+        kind = rng.random()
+        if kind < 0.05:
+            urls.append(None)
+            continue
+        host = rng.choice(hosts)
+        if kind < 0.2:
+            host = host.replace("o", "0", 1)  # near-miss domain
+        path = rng.choice(paths)
+        scheme = rng.choice(["https://", "http://www.", ""])
+        urls.append(f"{scheme}{host}/{path}" + rng.choice(["", "/", "?utm_source=x"]))
+    return urls
+
+
+def _analyzer(seed: int, n_gt: int = 40, n_auto: int = 60) -> SimilarityAnalyzer:
+    rng = random.Random(seed)
+    cities = ["cork", "koln", "lyon"]
+    gt = pd.DataFrame({
+        'ground_truth_id': range(n_gt),
+        'city': [rng.choice(cities) for _ in range(n_gt)],
+        'search_language': 'en',
+        'source_url': _urls(rng, n_gt),
+    })
+    auto = pd.DataFrame({
+        'automation_id': [f"a{i}" for i in range(n_auto)],
+        'city': [rng.choice(cities) for _ in range(n_auto)],
+        'run_id': [rng.choice(["run_v1", "run_v2"]) for _ in range(n_auto)],
+        'source_url': _urls(rng, n_auto),
+        'is_included_bool': [rng.random() < 0.5 for _ in range(n_auto)],
+    })
+    auto['version'] = auto['run_id'].str.extract(r'(v\d+)$')[0]
+    for df in [gt, auto]:
+        parts = parse_urls(df['source_url'])
+        df[['url_norm', 'domain', 'path_seg_1']] = parts[['url_norm', 'domain', 'path_seg_1']]
+
+    analyzer = SimilarityAnalyzer(data_dir='unused')
+    analyzer.ground_truth, analyzer.automation = gt, auto
+    return analyzer
+
+
+def _nested_loop(analyzer: SimilarityAnalyzer, min_similarity: float) -> pd.DataFrame:
+    """The original O(n^2) find_similar_urls loop, kept as the reference."""
+    gt, auto = analyzer.ground_truth, analyzer.automation
+    results = []
+    for _, gt_row in gt.iterrows():
+        gt_city = gt_row['city']
+        gt_url = gt_row['url_norm']
+        gt_domain = gt_row['domain']
+        gt_path1 = gt_row['path_seg_1']
+        for _, auto_row in auto[auto['city'] == gt_city].iterrows():
+            auto_url = auto_row['url_norm']
+            url_similarity = calculate_string_similarity(gt_url, auto_url)
+            token_similarity = calculate_token_similarity(gt_url, auto_url)
+            if gt_url == auto_url:
+                match_level, confidence = 'exact_url', 100
+            elif gt_domain == auto_row['domain'] and gt_path1 == auto_row['path_seg_1'] and gt_path1 is not None:
+                match_level, confidence = 'domain_path1', 75
+            elif gt_domain == auto_row['domain']:
+                if gt_domain in ['facebook.com', 'instagram.com', 'twitter.com', 'linkedin.com']:
+                    match_level, confidence = 'domain_platform', 20
+                else:
+                    match_level, confidence = 'domain_only', 40
+            else:
+                match_level, confidence = 'no_match', 0
+            combined_similarity = (url_similarity * 0.7 + token_similarity * 0.3) * 100
+            if combined_similarity >= min_similarity or confidence > 0:
+                results.append({
+                    'ground_truth_id': gt_row['ground_truth_id'],
+                    'city': gt_city,
+                    'search_language': gt_row['search_language'],
+                    'gt_url': gt_row['source_url'],
+                    'gt_url_norm': gt_url,
+                    'automation_id': auto_row['automation_id'],
+                    'run_id': auto_row['run_id'],
+                    'version': auto_row['version'],
+                    'auto_url': auto_row['source_url'],
+                    'auto_url_norm': auto_url,
+                    'is_included': auto_row['is_included_bool'],
+                    'match_level': match_level,
+                    'confidence_score': confidence,
+                    'url_similarity_pct': round(url_similarity * 100, 2),
+                    'token_similarity_pct': round(token_similarity * 100, 2),
+                    'combined_similarity_pct': round(combined_similarity, 2),
+                    'review_action': 'AUTO_ACCEPT' if confidence == 100 else 'MANUAL_REVIEW',
+                })
+    df = pd.DataFrame(results)
+    if len(df) > 0:
+        df = df.sort_values(
+            ['ground_truth_id', 'confidence_score', 'combined_similarity_pct'],
+            ascending=[True, False, False]
+        )
+    return df
+
+
+def _assert_same(got: pd.DataFrame, expected: pd.DataFrame) -> None:
+    pd.testing.assert_frame_equal(
+        got.reset_index(drop=True), expected.reset_index(drop=True), check_dtype=False
+    )
+
+
+@pytest.mark.parametrize("min_similarity", THRESHOLDS)
+def test_find_similar_urls_matches_nested_loop(min_similarity: float) -> None:
+    analyzer = _analyzer(seed=1)
+    expected = _nested_loop(analyzer, min_similarity)
+    assert len(expected) > 0
+    _assert_same(analyzer.find_similar_urls(min_similarity=min_similarity), expected)
+
+
+def test_city_filter_matches_nested_loop() -> None:
+    analyzer = _analyzer(seed=2)
+    expected = _nested_loop(analyzer, 30.0)
+    expected = expected[expected['city'] == 'cork']
+    _assert_same(analyzer.find_similar_urls(city_filter='Cork', min_similarity=30.0), expected)
+
+
+@pytest.mark.parametrize("min_similarity", [*THRESHOLDS, 45.0, 70.0, 90.0])
+def test_plausible_pairs_keep_every_exhaustive_match(min_similarity: float) -> None:
+    analyzer = _analyzer(seed=3, n_gt=80, n_auto=120)
+    gt, auto = analyzer.ground_truth, analyzer.automation
+    for city in ['cork', 'koln', 'lyon']:
+        gt_city, auto_city = gt[gt['city'] == city], auto[auto['city'] == city]
+        exhaustive = match_city_urls(gt_city, auto_city, min_similarity, exhaustive=True)
+        pruned = match_city_urls(gt_city, auto_city, min_similarity)
+        assert len(exhaustive) > 0
+        _assert_same(pruned, exhaustive)
+
+
+def test_worker_count_does_not_change_the_result() -> None:
+    analyzer = _analyzer(seed=4)
+    _assert_same(
+        analyzer.find_similar_urls(min_similarity=30.0, workers=2),
+        analyzer.find_similar_urls(min_similarity=30.0, workers=1),
+    )
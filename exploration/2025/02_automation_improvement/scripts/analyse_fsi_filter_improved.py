@@ -1,32 +1,51 @@
 import os
-import csv
-import time
-import json
+import asyncio
 import pathlib
+import sys
 from typing import List, Dict, Any
 
-from openai import OpenAI, RateLimitError, APIError
+from openai import AsyncOpenAI, OpenAI
 from dotenv import load_dotenv
 import argparse
 
+from llm_batch import BATCH_MAX_REQUESTS, LocalBatchBackend, OpenAIBatchBackend, request_line, run_batches
+from llm_cache import ResponseCache, cache_key, prompt_version
+from llm_engine import ClassificationEngine, build_messages
+from page_sample import PageSampler
+from prefilter import Prefilter
+from result_log import DeadLetterLog, ResultLog
+from text_pack import list_texts, read_text
+
 # ========= ENV & OpenAI client =========
 load_dotenv()  
 
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise RuntimeError(
-        "❌ OPENAI_API_KEY not found. Please create a .env file containing:\n"
-        "OPENAI_API_KEY=sk-your-key-here"
-    )
+def _api_key() -> str:
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError(
+            "❌ OPENAI_API_KEY not found. Please create a .env file containing:\n"
+            "OPENAI_API_KEY=sk-your-key-here"
+        )
+    return api_key
+
+def make_client(base_url: str | None = None) -> AsyncOpenAI:
+    # retries are done by ClassificationEngine (jittered, rate-limit aware)
+    return AsyncOpenAI(api_key=_api_key(), base_url=base_url, max_retries=0)
 
-client = OpenAI(api_key=api_key)
+def make_batch_backend(base_url: str | None = None):
+    return OpenAIBatchBackend(OpenAI(api_key=_api_key(), base_url=base_url))
 
 # ========= CONFIG  =========
 MODEL = "gpt-4o-mini"      
+TEMPERATURE = 0.1
 MAX_CHARS_DEFAULT = 12000  
 MAX_RETRIES = 5
 BACKOFF_BASE = 2.0
-PAUSE_DEFAULT = 0.2        
+CONCURRENCY_DEFAULT = 8
+RPM_DEFAULT = 500          # requests per minute (account tier limit)
+TPM_DEFAULT = 200_000      # tokens per minute (account tier limit)
+SYSTEM_PROMPT = "You are a precise, concise classifier. Use British English."
+CACHE_DEFAULT = pathlib.Path(__file__).resolve().parent / "_llm_cache.sqlite"
 
 # ========= PROMPT =========
 INSTRUCTIONS = """
@@ -71,36 +90,208 @@ Keep "evidence_quotes" short (≤200 characters each). Use British English.
 """
 
 # ========= Helpers =========
-def find_txt_files(base: pathlib.Path) -> List[pathlib.Path]:
-    """Find all txt files one level below base (city folders)."""
-    return sorted(base.glob("*/*.txt"))
+def find_txt_files(base: pathlib.Path) -> List[tuple[str, str, pathlib.Path]]:
+    """Find all pages one level below base (city folders), as (city, url_id, path).
+
+    Covers loose .txt files and compressed text packs (text_pack.py).
+    """
+    return list_texts(base)
 
 def read_page_sample(p: pathlib.Path, max_chars: int) -> str:
-    text = p.read_text(encoding="utf-8", errors="ignore").strip()
+    text = read_text(p).strip()
     if len(text) <= max_chars:
         return text
     return text[:max_chars]
 
-def call_classifier(text: str) -> Dict[str, Any]:
-    last_err: Exception | None = None
-    for attempt in range(1, MAX_RETRIES + 1):
-        try:
-            resp = client.chat.completions.create(
-                model=MODEL,
-                messages=[
-                    {"role": "system", "content": "You are a precise, concise classifier. Use British English."},
-                    {"role": "user", "content": f"{INSTRUCTIONS}\n\n---\nTEXT:\n{text}"}
-                ],
-                temperature=0.1,
-                response_format={"type": "json_object"},
-            )
-            content = resp.choices[0].message.content
-            return json.loads(content)
-        except (RateLimitError, APIError, json.JSONDecodeError) as e:
-            last_err = e
-            # simple backoff
-            time.sleep((BACKOFF_BASE ** attempt) + 0.1 * attempt)
-    raise RuntimeError(f"Classification failed after {MAX_RETRIES} retries; last error: {last_err}")
+def make_sampler(files: List[tuple[str, str, pathlib.Path]], budget: int, max_chars: int) -> PageSampler:
+    """Token-budget sampler with site boilerplate learned from *files*."""
+    sampler = PageSampler(budget, baseline_chars=max_chars)
+    return sampler.fit((url_id, read_text(p)) for _, url_id, p in files)
+
+def page_input(url_id: str, p: pathlib.Path, max_chars: int, sampler: PageSampler | None = None) -> str:
+    """Text sent for one page: a token-budget sample, or the first max_chars characters."""
+    if sampler is None:
+        return read_page_sample(p, max_chars)
+    return sampler.sample(url_id, read_text(p))
+
+def open_cache(path: pathlib.Path | None = CACHE_DEFAULT) -> ResponseCache | None:
+    """Response cache for the current prompt; editing SYSTEM_PROMPT/INSTRUCTIONS invalidates it."""
+    if path is None:
+        return None
+    return ResponseCache(path, prompt_version(SYSTEM_PROMPT, INSTRUCTIONS))
+
+def make_engine(client: AsyncOpenAI, concurrency: int = CONCURRENCY_DEFAULT, rpm: float = RPM_DEFAULT,
+                tpm: float = TPM_DEFAULT, cache: ResponseCache | None = None,
+                pack_tokens: int = 0) -> ClassificationEngine:
+    return ClassificationEngine(
+        client, MODEL, SYSTEM_PROMPT, INSTRUCTIONS, temperature=TEMPERATURE, concurrency=concurrency,
+        rpm=rpm, tpm=tpm, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, cache=cache,
+        pack_tokens=pack_tokens,
+    )
+
+def call_classifier(text: str, cache_path: pathlib.Path | None = CACHE_DEFAULT) -> Dict[str, Any]:
+    """Classify one text (blocking); batches go through classify_files."""
+    cache = open_cache(cache_path)
+    try:
+        return asyncio.run(make_engine(make_client(), concurrency=1, cache=cache).classify(text))
+    finally:
+        if cache is not None:
+            cache.close()
+
+EMPTY_RESULT = {
+    "decision": "exclude",
+    "confidence": 3,
+    "reasons": ["Empty page or no extractable text"],
+    "evidence_quotes": [],
+    "organisation_name": None,
+    "organisation_type": None,
+    "is_ongoing": None,
+    "site_owner_is_initiative": None,
+    "notes": "No content available.",
+}
+
+def local_result(url_id: str, text: str, prefilter: Prefilter | None) -> Dict[str, Any] | None:
+    """Result decided by the pre-filter cascade, or None when the page needs the LLM."""
+    if prefilter is None:
+        return None
+    decision = prefilter.decide(url_id, text)
+    if decision.decision is None:
+        return None
+    return {
+        **EMPTY_RESULT,
+        "decision": decision.decision,
+        "confidence": decision.confidence,
+        "reasons": [f"Pre-filter: {decision.reason}"],
+        "notes": "Decided locally by the pre-filter; not sent to the LLM.",
+    }
+
+CSV_HEADER = [
+    "city",
+    "file",
+    "url_id",
+    "decision",
+    "confidence",
+    "organisation_name",
+    "organisation_type",
+    "is_ongoing",
+    "site_owner_is_initiative",
+    "reasons",
+    "evidence_quotes",
+    "notes",
+]
+
+def one_line(value: Any) -> Any:
+    """*value* with line breaks turned into spaces, so every CSV record stays on one line."""
+    return " ".join(value.splitlines()) if isinstance(value, str) else value
+
+def result_row(city: str, p: pathlib.Path, url_id: str, result: Dict[str, Any]) -> list:
+    return [
+        city,
+        p.name,
+        url_id,
+        result.get("decision"),
+        result.get("confidence"),
+        one_line(result.get("organisation_name")),
+        one_line(result.get("organisation_type")),
+        result.get("is_ongoing"),
+        result.get("site_owner_is_initiative"),
+        one_line(" | ".join(result.get("reasons", []) or [])),
+        one_line(" | ".join(result.get("evidence_quotes", []) or [])),
+        one_line(result.get("notes", "")),
+    ]
+
+def record_failure(dead_letter: DeadLetterLog | None, city: str, url_id: str, p: pathlib.Path,
+                   error: Exception | str) -> None:
+    print(f"✗ {city}: {p.name} → {error}")
+    if dead_letter is not None:
+        dead_letter.add(error, city=city, url_id=url_id, file=str(p))
+
+async def classify_files(files: List[tuple[str, str, pathlib.Path]], engine: ClassificationEngine,
+                         max_chars: int, writer, dead_letter: DeadLetterLog | None = None,
+                         sampler: PageSampler | None = None, prefilter: Prefilter | None = None) -> int:
+    """Classify (city, url_id, path) entries concurrently; rows are written as results arrive.
+
+    Without *dead_letter* the first page that fails after all retries stops
+    the run; with it, such pages are recorded there and the run goes on.
+    Returns the number of pages that failed (no row).
+    """
+    def write(i: int, result: Dict[str, Any]) -> None:
+        city, url_id, p = files[i]
+        writer.writerow(result_row(city, p, url_id, result))
+        print(f"✓ {city}: {p.name} → {result.get('decision')} (conf {result.get('confidence')})")
+
+    def texts():
+        for i, (_, url_id, p) in enumerate(files):
+            text = page_input(url_id, p, max_chars, sampler)
+            if not text:
+                write(i, EMPTY_RESULT)
+            elif (local := local_result(url_id, text, prefilter)) is not None:
+                write(i, local)
+            else:
+                yield i, text
+
+    failed = 0
+    async for i, result in engine.classify_all(texts(), return_exceptions=dead_letter is not None,
+                                               label=lambda i: files[i][1]):
+        if isinstance(result, Exception):
+            failed += 1
+            record_failure(dead_letter, *files[i], result)
+        else:
+            write(i, result)
+    return failed
+
+def classify_files_batch(files: List[tuple[str, str, pathlib.Path]], backend, work_dir: pathlib.Path,
+                         max_chars: int, writer, cache: ResponseCache | None = None,
+                         poll_interval: float = 60.0, max_requests: int = BATCH_MAX_REQUESTS,
+                         dead_letter: DeadLetterLog | None = None, sampler: PageSampler | None = None,
+                         prefilter: Prefilter | None = None) -> int:
+    """Classify (city, url_id, path) entries through batch jobs; rows are written as results arrive.
+
+    Cached and empty pages are not submitted, and pages with identical text
+    share one request. Returns the number of pages that failed (no row);
+    they are also recorded in *dead_letter* when given.
+    """
+    requests: Dict[str, tuple[str, List[int]]] = {}  # custom_id -> (cache key, page indices)
+    by_key: Dict[str, str] = {}  # cache key -> custom_id
+
+    def write(i: int, result: Dict[str, Any]) -> None:
+        city, url_id, p = files[i]
+        writer.writerow(result_row(city, p, url_id, result))
+
+    def lines():
+        for i, (city, url_id, p) in enumerate(files):
+            text = page_input(url_id, p, max_chars, sampler)
+            if not text:
+                write(i, EMPTY_RESULT)
+                continue
+            if (local := local_result(url_id, text, prefilter)) is not None:
+                write(i, local)
+                continue
+            key = cache_key(MODEL, TEMPERATURE, SYSTEM_PROMPT, INSTRUCTIONS, text)
+            if key in by_key:
+                requests[by_key[key]][1].append(i)
+                continue
+            cached = cache.get(key) if cache is not None else None
+            if cached is not None:
+                write(i, cached)
+                continue
+            custom_id = by_key[key] = f"{city}/{url_id}"
+            requests[custom_id] = (key, [i])
+            yield request_line(custom_id, MODEL, build_messages(SYSTEM_PROMPT, INSTRUCTIONS, text), TEMPERATURE)
+
+    failed = 0
+    for custom_id, result, error in run_batches(backend, lines(), work_dir, poll_interval, max_requests):
+        key, indices = requests[custom_id]
+        if error is not None:
+            failed += len(indices)
+            for i in indices:
+                record_failure(dead_letter, *files[i], error)
+            continue
+        if cache is not None:
+            cache.put(key, result)
+        for i in indices:
+            write(i, result)
+    return failed
 
 # ========= Main =========
 def main():
@@ -117,7 +308,19 @@ def main():
         "--output-csv",
         type=pathlib.Path,
         required=True,
-        help="Path to output CSV file (will be created or overwritten).",
+        help="Path to output CSV file. Rows are appended; pages already in it are skipped.",
+    )
+    parser.add_argument(
+        "--fresh",
+        action="store_true",
+        help="Overwrite the output CSV instead of resuming it.",
+    )
+    parser.add_argument(
+        "--dead-letter",
+        type=pathlib.Path,
+        default=None,
+        help="JSONL file for pages that fail after all retries "
+             "(default: <output-csv stem>_failed.jsonl next to the output CSV).",
     )
     parser.add_argument(
         "--max-chars",
@@ -126,10 +329,82 @@ def main():
         help=f"Max characters to read from each page (default: {MAX_CHARS_DEFAULT}).",
     )
     parser.add_argument(
-        "--pause",
+        "--token-budget",
+        type=int,
+        default=None,
+        help="Send a token-budgeted sample per page instead of the first --max-chars characters: "
+             "site boilerplate removed, FSI-relevant chunks first (see page_sample.py).",
+    )
+    parser.add_argument(
+        "--pack-tokens",
+        type=int,
+        default=0,
+        help="Classify short pages several per request, up to this many page tokens per request "
+             "(default: 0, one page per request). Not used with --batch.",
+    )
+    parser.add_argument(
+        "--prefilter",
+        type=pathlib.Path,
+        default=None,
+        help="Trained pre-filter (prefilter.py --out) that decides obvious cases without the LLM.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=CONCURRENCY_DEFAULT,
+        help=f"Requests in flight at once (default: {CONCURRENCY_DEFAULT}).",
+    )
+    parser.add_argument(
+        "--rpm",
+        type=float,
+        default=RPM_DEFAULT,
+        help=f"Requests-per-minute limit (default: {RPM_DEFAULT}).",
+    )
+    parser.add_argument(
+        "--tpm",
+        type=float,
+        default=TPM_DEFAULT,
+        help=f"Tokens-per-minute limit (default: {TPM_DEFAULT}).",
+    )
+    parser.add_argument(
+        "--cache",
+        type=pathlib.Path,
+        default=CACHE_DEFAULT,
+        help=f"SQLite cache of classification results (default: {CACHE_DEFAULT.name} next to this script).",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Call the API for every page, without reading or writing the cache.",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Submit offline batch jobs instead of live requests (cheaper; can take up to 24h).",
+    )
+    parser.add_argument(
+        "--batch-dir",
+        type=pathlib.Path,
+        default=None,
+        help="Work folder for batch request files and the job manifest "
+             "(default: <output-csv stem>_batch next to the output CSV). Re-running resumes its jobs.",
+    )
+    parser.add_argument(
+        "--batch-local",
+        type=pathlib.Path,
+        default=None,
+        help="Hand batch jobs to a local folder instead of the API (output.jsonl is expected per job).",
+    )
+    parser.add_argument(
+        "--poll-interval",
         type=float,
-        default=PAUSE_DEFAULT,
-        help=f"Pause between files in seconds (default: {PAUSE_DEFAULT}).",
+        default=60.0,
+        help="Seconds between batch status checks (default: 60).",
+    )
+    parser.add_argument(
+        "--base-url",
+        default=None,
+        help="OpenAI-compatible API base URL (default: OpenAI, or OPENAI_BASE_URL).",
     )
 
     args = parser.parse_args()
@@ -137,7 +412,6 @@ def main():
     txt_base: pathlib.Path = args.txt_base
     output_csv: pathlib.Path = args.output_csv
     max_chars: int = args.max_chars
-    pause_between: float = args.pause
 
     if not txt_base.exists():
         print(f"❌ Input folder not found: {txt_base}")
@@ -148,67 +422,47 @@ def main():
         print(f"No .txt files found under: {txt_base}")
         return
 
-    # ensure output folder exists
-    output_csv.parent.mkdir(parents=True, exist_ok=True)
     print(f"Found {len(files)} text files.")
     print(f"Writing results to:\n{output_csv}\n")
 
-    with open(output_csv, "w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerow([
-            "city",
-            "file",
-            "url_id",
-            "decision",
-            "confidence",
-            "organisation_name",
-            "organisation_type",
-            "is_ongoing",
-            "site_owner_is_initiative",
-            "reasons",
-            "evidence_quotes",
-            "notes",
-        ])
-
-        for p in files:
-            city = p.parent.name          # folder name (city)
-            url_id = p.stem               # host__hash
-            text = read_page_sample(p, max_chars)
+    dead_letter_path = args.dead_letter or output_csv.with_name(f"{output_csv.stem}_failed.jsonl")
+    cache = open_cache(None if args.no_cache else args.cache)
+    with ResultLog(output_csv, CSV_HEADER, fresh=args.fresh) as log, DeadLetterLog(dead_letter_path) as dead_letter:
+        todo = [f for f in files if (f[0], f[1]) not in log.completed]
+        if len(todo) < len(files):
+            print(f"Skipping {len(files) - len(todo)} page(s) already in the output CSV.")
+        sampler = make_sampler(files, args.token_budget, max_chars) if args.token_budget else None
+        prefilter = Prefilter.load(args.prefilter) if args.prefilter else None
+        if args.batch:
+            backend = LocalBatchBackend(args.batch_local) if args.batch_local else make_batch_backend(args.base_url)
+            batch_dir = args.batch_dir or output_csv.with_name(f"{output_csv.stem}_batch")
+            failed = classify_files_batch(todo, backend, batch_dir, max_chars, log, cache, args.poll_interval,
+                                          dead_letter=dead_letter, sampler=sampler, prefilter=prefilter)
+        else:
+            engine = make_engine(make_client(args.base_url), args.concurrency, args.rpm, args.tpm, cache,
+                                 args.pack_tokens)
+            failed = asyncio.run(classify_files(todo, engine, max_chars, log, dead_letter, sampler, prefilter))
+            if engine.packed_requests:
+                print(f"\nPacking: {engine.packed_docs} page(s) in {engine.packed_requests} request(s), "
+                      f"{engine.pack_fallbacks} re-sent alone")
+        if sampler is not None:
+            stats = sampler.stats
+            print(f"\nSampling: {stats.pages} page(s), {stats.sample_tokens / max(stats.pages, 1):.0f} tokens per "
+                  f"page on average, {stats.saved_per_page:.0f} saved per request vs. the {max_chars}-char cut; "
+                  f"{stats.boilerplate_lines} boilerplate line(s) dropped")
+        if failed:
+            print(f"\n⚠️ {failed} page(s) failed and have no row (see {dead_letter_path}); "
+                  "re-run to retry them.")
 
-            if not text:
-                result = {
-                    "decision": "exclude",
-                    "confidence": 3,
-                    "reasons": ["Empty page or no extractable text"],
-                    "evidence_quotes": [],
-                    "organisation_name": None,
-                    "organisation_type": None,
-                    "is_ongoing": None,
-                    "site_owner_is_initiative": None,
-                    "notes": "No content available.",
-                }
-            else:
-                result = call_classifier(text)
-
-            w.writerow([
-                city,
-                p.name,
-                url_id,
-                result.get("decision"),
-                result.get("confidence"),
-                result.get("organisation_name"),
-                result.get("organisation_type"),
-                result.get("is_ongoing"),
-                result.get("site_owner_is_initiative"),
-                " | ".join(result.get("reasons", []) or []),
-                " | ".join(result.get("evidence_quotes", []) or []),
-                result.get("notes", ""),
-            ])
-
-            print(f"✓ {city}: {p.name} → {result.get('decision')} (conf {result.get('confidence')})")
-            time.sleep(pause_between)
+    if cache is not None:
+        stats = cache.stats
+        print(f"\nCache: {stats.hits} hit(s), {stats.misses} miss(es) ({stats.hit_rate:.0%}), "
+              f"{stats.size} entries, {stats.evictions} evicted")
+        cache.close()
 
     print("\nDone.")
+    if failed:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Benchmark HTML-to-text backends on a synthetic corpus of scraped pages.
+
+Pages are shaped like FSI websites: a head with scripts and styles, a
+navigation menu, several content sections and a footer, ~60-250 KB each.
+Reports pages/sec and MB/sec per backend, with the full text and with the
+classifier's character budget (MAX_CHARS_DEFAULT), plus the old two-parse
+path of second_filtering.py (``soup.title`` + ``extract_visible_text``).
+
+Usage:
+  python benchmark_html_text.py
+  python benchmark_html_text.py --pages 100 --max-chars 4000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from collections.abc import Callable
+
+from bs4 import BeautifulSoup
+
+from html_text import available_backends, extract_page
+from second_filtering import MAX_CHARS_DEFAULT
+
+_WORDS = [
+    "food", "sharing", "community", "fridge", "surplus", "volunteers", "Fairteiler", "Tafel", "kitchen",
+    "garden", "seeds", "redistribution", "café", "Über", "uns", "meals", "solidarity", "&amp;", "&nbsp;",
+]
+
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(n)).capitalize() + "."
+
+
+def make_page(rng: random.Random) -> str:
+    """One page: scripts, styles, nav and footer around a few content sections."""
+    script = "<script>window.dataLayer = [];" + "var x = '<div>' + 1;" * rng.randint(200, 1500) + "</script>"
+    style = "<style>" + ".c{color:red;margin:0 auto}" * rng.randint(200, 1500) + "</style>"
+    nav = "<nav><ul>" + "".join(f"<li><a href='/p{i}'>{rng.choice(_WORDS)}</a></li>" for i in range(40)) + "</ul></nav>"
+    sections = []
+    for _ in range(rng.randint(10, 60)):
+        paragraphs = "".join(
+            f"<p class='text'>{_sentence(rng, rng.randint(8, 40))} <a href='#'>{rng.choice(_WORDS)}</a> "
+            f"{_sentence(rng, rng.randint(5, 30))}<br>{_sentence(rng, 10)}</p>"
+            for _ in range(rng.randint(2, 8))
+        )
+        sections.append(f"<section><div class='wrap'><h2>{_sentence(rng, 3)}</h2>{paragraphs}"
+                        f"<svg viewBox='0 0 10 10'><path d='M0 0L10 10'/></svg></div></section>")
+    footer = "<footer>" + _sentence(rng, 60) + "</footer>"
+    return (
+        f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{_sentence(rng, 4)}</title>{style}{script}</head>"
+        f"<body>{nav}<main>{''.join(sections)}</main><aside>{_sentence(rng, 30)}</aside>{footer}</body></html>"
+    )
+
+
+def _two_parse(html: str, max_chars: int | None) -> tuple[str | None, str]:
+    """What second_filtering.py did before: one parse for the title, another for the text."""
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.string.strip() if soup.title and soup.title.string else None
+    return title, extract_page(html, backend="bs4")[1]
+
+
+def _time(fn: Callable[[], None], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark HTML-to-text extraction backends")
+    parser.add_argument("--pages", type=int, default=40, help="Pages in the synthetic corpus")
+    parser.add_argument("--max-chars", type=int, default=MAX_CHARS_DEFAULT, help="Character budget")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing repeats (best is reported)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    pages = [make_page(rng) for _ in range(args.pages)]
+    megabytes = sum(len(p.encode("utf-8")) for p in pages) / 1e6
+    print(f"pages={len(pages)} size={megabytes:.1f} MB backends={available_backends()}")
+
+    expected = [extract_page(p, backend="bs4") for p in pages]
+    cases = [("two-parse bs4", _two_parse, None)]
+    for backend in available_backends():
+        cases.append((backend, lambda html, m, b=backend: extract_page(html, m, b), None))
+        cases.append((f"{backend} @{args.max_chars}", lambda html, m, b=backend: extract_page(html, m, b), args.max_chars))
+
+    baseline = None
+    for name, fn, max_chars in cases:
+        out = [fn(p, max_chars) for p in pages]
+        want = [(t, text if max_chars is None else text[:max_chars]) for t, text in expected]
+        if out != want:
+            print(f"{name}: output differs from bs4 (malformed markup is repaired differently)", file=sys.stderr)
+        seconds = _time(lambda fn=fn, m=max_chars: [fn(p, m) for p in pages], args.repeat)
+        baseline = baseline or seconds
+        print(
+            f"{name:18s} {len(pages) / seconds:8.1f} pages/s   {megabytes / seconds:7.2f} MB/s   "
+            f"speed-up {baseline / seconds:5.1f}x"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
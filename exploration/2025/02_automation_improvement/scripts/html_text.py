@@ -0,0 +1,235 @@
+"""Single-pass title + visible-text extraction for scraped HTML.
+
+``extract_page(html)`` returns ``(title, text)`` where *text* is what
+``BeautifulSoup(html, "html.parser").get_text("\\n", strip=True)`` yields
+after dropping script/style/noscript/template/svg/canvas and
+nav/footer/aside, with runs of 3+ newlines collapsed, and *title* is
+``soup.title.string.strip()``.
+
+The backend is pluggable:
+
+- ``stream``: the standard library ``HTMLParser`` feeding a callback
+  that skips hidden subtrees, without building a tree. Always available;
+  same output as ``bs4`` on well-formed pages.
+- ``lxml``: libxml2's parser driving the same callbacks. Fastest; used
+  when ``lxml`` is installed. libxml2 repairs broken markup differently,
+  so malformed pages can differ slightly.
+- ``bs4``: the original BeautifulSoup implementation, kept as reference.
+
+With *max_chars*, the streaming backends stop parsing once that much text
+has been collected and return ``text[:max_chars]``, the same prefix the
+classifier reads (``MAX_CHARS_DEFAULT`` in analyse_fsi_filter_improved.py).
+"""
+
+from __future__ import annotations
+
+import re
+from collections.abc import Callable
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:  # optional speed-up
+    etree = None
+
+HIDDEN_TAGS = frozenset({"script", "style", "noscript", "template", "svg", "canvas", "nav", "footer", "aside"})
+
+# Elements that never have content, so never sit on the open-element stack
+VOID_TAGS = frozenset({
+    "area", "base", "basefont", "bgsound", "br", "col", "command", "embed", "frame", "hr", "image", "img",
+    "input", "isindex", "keygen", "link", "menuitem", "meta", "nextid", "param", "source", "spacer",
+    "track", "wbr",
+})
+
+_NEWLINES = re.compile(r"\n{3,}")
+_CHUNK = 16384
+
+
+class _Collector:
+    """Parser callbacks: keeps the first title and text outside hidden tags.
+
+    Open elements are tracked on a stack like BeautifulSoup's tree builder,
+    so an end tag also closes unclosed elements opened after its start tag.
+    """
+
+    def __init__(self, max_chars: int | None) -> None:
+        self.max_chars = max_chars
+        self.pieces: list[str] = []
+        self.length = 0
+        self.stack: list[str] = []
+        self.hidden = 0
+        self.buffer: list[str] = []
+        self.title: str | None = None
+        self.title_seen = False
+        self.in_title = False
+        self.title_parts: list[str] | None = None
+
+    @property
+    def full(self) -> bool:
+        return self.max_chars is not None and self.length >= self.max_chars
+
+    def start(self, tag: str) -> None:
+        self.flush()
+        if self.in_title:
+            # soup.title.string is None once <title> has child elements
+            self.title_parts = None
+            self.in_title = False
+        if tag in VOID_TAGS:
+            return
+        self.stack.append(tag)
+        if tag in HIDDEN_TAGS:
+            self.hidden += 1
+        elif tag == "title" and not self.title_seen:
+            self.title_seen = True
+            self.in_title = True
+            self.title_parts = []
+
+    def end(self, tag: str) -> None:
+        self.flush()
+        if tag not in self.stack:
+            return
+        while True:
+            closed = self.stack.pop()
+            if closed in HIDDEN_TAGS:
+                self.hidden -= 1
+            elif closed == "title" and self.in_title:
+                self.in_title = False
+                if self.title_parts and len(self.title_parts) == 1:
+                    self.title = self.title_parts[0].strip()
+            if closed == tag:
+                break
+
+    def data(self, data: str) -> None:
+        self.buffer.append(data)
+
+    def flush(self) -> None:
+        """Emit the text node accumulated since the last tag."""
+        if not self.buffer:
+            return
+        node = "".join(self.buffer)
+        self.buffer = []
+        if self.in_title:
+            self.title_parts.append(node)
+        if self.hidden:
+            return
+        piece = node.strip()
+        if piece:
+            # Pieces start and end with non-whitespace, so newline runs never span two pieces
+            piece = _NEWLINES.sub("\n\n", piece)
+            self.length += len(piece) + (1 if self.pieces else 0)
+            self.pieces.append(piece)
+
+    def result(self) -> tuple[str | None, str]:
+        self.flush()
+        text = "\n".join(self.pieces)
+        return self.title, text if self.max_chars is None else text[: self.max_chars]
+
+
+class _StreamParser(HTMLParser):
+    def __init__(self, collector: _Collector) -> None:
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+
+    def handle_starttag(self, tag, attrs) -> None:
+        self.collector.start(tag)
+
+    def handle_endtag(self, tag) -> None:
+        self.collector.end(tag)
+
+    def handle_startendtag(self, tag, attrs) -> None:
+        self.collector.flush()
+
+    def handle_data(self, data) -> None:
+        self.collector.data(data)
+
+    def handle_comment(self, data) -> None:
+        self.collector.flush()
+
+    handle_decl = handle_pi = unknown_decl = handle_comment
+
+
+def _extract_stream(html: str, max_chars: int | None) -> tuple[str | None, str]:
+    collector = _Collector(max_chars)
+    parser = _StreamParser(collector)
+    for pos in range(0, len(html), _CHUNK):
+        parser.feed(html[pos : pos + _CHUNK])
+        if collector.full:
+            return collector.result()
+    parser.close()
+    return collector.result()
+
+
+class _LxmlTarget:
+    def __init__(self, collector: _Collector) -> None:
+        self.collector = collector
+
+    def start(self, tag, attrib) -> None:
+        self.collector.start(tag)
+
+    def end(self, tag) -> None:
+        self.collector.end(tag)
+
+    def data(self, data) -> None:
+        self.collector.data(data)
+
+    def comment(self, text) -> None:
+        self.collector.flush()
+
+    def close(self) -> None:
+        pass
+
+
+def _extract_lxml(html: str, max_chars: int | None) -> tuple[str | None, str]:
+    collector = _Collector(max_chars)
+    parser = etree.HTMLParser(target=_LxmlTarget(collector))
+    for pos in range(0, len(html), _CHUNK):
+        parser.feed(html[pos : pos + _CHUNK])
+        if collector.full:
+            return collector.result()
+    parser.close()
+    return collector.result()
+
+
+def _extract_bs4(html: str, max_chars: int | None) -> tuple[str | None, str]:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.string.strip() if soup.title and soup.title.string else None
+    for tag in soup(["script", "style", "noscript", "template", "svg", "canvas"]):
+        tag.decompose()
+    for tagname in ["nav", "footer", "aside"]:
+        for t in soup.find_all(tagname):
+            t.decompose()
+    text = _NEWLINES.sub("\n\n", soup.get_text(separator="\n", strip=True))
+    return title, text if max_chars is None else text[:max_chars]
+
+
+def available_backends() -> list[str]:
+    """Names accepted by :func:`get_extractor`, fastest first."""
+    backends = ["stream", "bs4"]
+    if etree is not None:
+        backends.insert(0, "lxml")
+    return backends
+
+
+def get_extractor(backend: str = "auto") -> Callable[[str, int | None], tuple[str | None, str]]:
+    """Return the ``(html, max_chars) -> (title, text)`` function for *backend*.
+
+    ``"auto"`` picks ``lxml`` when it is installed and ``stream`` otherwise.
+    """
+    if backend == "auto":
+        backend = available_backends()[0]
+    if backend == "lxml":
+        if etree is None:
+            raise ImportError("backend 'lxml' requested but the lxml package is not installed")
+        return _extract_lxml
+    if backend == "stream":
+        return _extract_stream
+    if backend == "bs4":
+        return _extract_bs4
+    raise ValueError(f"Unknown extraction backend: {backend!r} (expected one of {available_backends()})")
+
+
+def extract_page(html: str, max_chars: int | None = None, backend: str = "auto") -> tuple[str | None, str]:
+    """Title and visible text of *html*, optionally cut to *max_chars*."""
+    return get_extractor(backend)(html, max_chars)
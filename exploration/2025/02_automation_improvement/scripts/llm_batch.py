@@ -0,0 +1,227 @@
+"""Offline batch-job classification.
+
+For full runs, requests are written to JSONL files in the Batch API format
+(one ``POST /v1/chat/completions`` body per line, tagged with a
+``custom_id``), submitted as batch jobs, polled until they finish, and the
+outputs are joined back by ``custom_id``.
+
+Requests are split into chunks that respect the batch limits
+(``max_requests`` lines and ``max_bytes`` per input file). Every submitted
+chunk is recorded in ``manifest.json`` in the work folder along with a
+hash of its contents, so re-running after an interruption polls the
+existing jobs instead of paying for them again.
+
+Backends:
+
+- ``OpenAIBatchBackend``: the OpenAI Files + Batches API.
+- ``LocalBatchBackend``: a folder stand-in with no network. ``submit``
+  copies the input file to ``<folder>/<batch_id>/input.jsonl``; the job is
+  complete once ``output.jsonl`` appears next to it. With a *handler*,
+  the backend writes that output itself on the first poll.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import time
+import uuid
+from collections.abc import Callable, Iterable, Iterator
+from typing import Any
+
+ENDPOINT = "/v1/chat/completions"
+BATCH_MAX_REQUESTS = 50_000
+BATCH_MAX_BYTES = 190 * 1024 * 1024  # API limit is 200 MB per input file
+TERMINAL_STATES = frozenset({"completed", "failed", "expired", "cancelled"})
+MANIFEST_NAME = "manifest.json"
+
+
+def request_line(custom_id: str, model: str, messages: list[dict[str, str]], temperature: float) -> str:
+    return json.dumps(
+        {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": ENDPOINT,
+            "body": {
+                "model": model,
+                "messages": messages,
+                "temperature": temperature,
+                "response_format": {"type": "json_object"},
+            },
+        },
+        ensure_ascii=False,
+    )
+
+
+def chunk_lines(lines: Iterable[str], max_requests: int = BATCH_MAX_REQUESTS,
+                max_bytes: int = BATCH_MAX_BYTES) -> Iterator[list[str]]:
+    """Group JSONL lines into chunks of at most *max_requests* lines and *max_bytes* bytes."""
+    chunk: list[str] = []
+    size = 0
+    for line in lines:
+        n = len(line.encode("utf-8")) + 1
+        if n > max_bytes:
+            raise ValueError(f"A single request is {n} bytes, over the {max_bytes}-byte batch limit")
+        if chunk and (len(chunk) >= max_requests or size + n > max_bytes):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(line)
+        size += n
+    if chunk:
+        yield chunk
+
+
+def parse_output_line(line: str) -> tuple[str, dict[str, Any] | None, str | None]:
+    """(custom_id, parsed JSON decision, error) for one output or error-file line."""
+    record = json.loads(line)
+    custom_id = record["custom_id"]
+    if record.get("error"):
+        return custom_id, None, str(record["error"].get("message", record["error"]))
+    response = record.get("response") or {}
+    if response.get("status_code") != 200:
+        return custom_id, None, f"HTTP {response.get('status_code')}: {response.get('body')}"
+    try:
+        content = response["body"]["choices"][0]["message"]["content"]
+        return custom_id, json.loads(content), None
+    except (KeyError, IndexError, TypeError, json.JSONDecodeError) as e:
+        return custom_id, None, f"Unparseable response: {e!r}"
+
+
+# ---------- backends ----------
+class OpenAIBatchBackend:
+    def __init__(self, client, completion_window: str = "24h"):
+        self.client = client  # a synchronous openai.OpenAI
+        self.completion_window = completion_window
+        self._batches: dict[str, Any] = {}
+
+    def submit(self, path: pathlib.Path) -> str:
+        with open(path, "rb") as f:
+            upload = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=upload.id, endpoint=ENDPOINT, completion_window=self.completion_window
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        batch = self._batches[batch_id] = self.client.batches.retrieve(batch_id)
+        return batch.status
+
+    def results(self, batch_id: str) -> list[str]:
+        batch = self._batches.get(batch_id) or self.client.batches.retrieve(batch_id)
+        lines: list[str] = []
+        # expired/cancelled jobs can still carry the part that finished
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                lines += self.client.files.content(file_id).text.splitlines()
+        return [line for line in lines if line.strip()]
+
+
+class LocalBatchBackend:
+    def __init__(self, directory: str | os.PathLike,
+                 handler: Callable[[dict[str, Any]], dict[str, Any]] | None = None):
+        """*handler* maps a request body to a chat-completion response body."""
+        self.directory = pathlib.Path(directory)
+        self.handler = handler
+
+    def submit(self, path: pathlib.Path) -> str:
+        batch_id = f"local_{uuid.uuid4().hex[:12]}"
+        job = self.directory / batch_id
+        job.mkdir(parents=True)
+        shutil.copyfile(path, job / "input.jsonl")
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        job = self.directory / batch_id
+        if not (job / "output.jsonl").exists():
+            if self.handler is None:
+                return "in_progress"
+            self._run(job)
+        return "completed"
+
+    def results(self, batch_id: str) -> list[str]:
+        text = (self.directory / batch_id / "output.jsonl").read_text(encoding="utf-8")
+        return [line for line in text.splitlines() if line.strip()]
+
+    def _run(self, job: pathlib.Path) -> None:
+        out = []
+        with open(job / "input.jsonl", encoding="utf-8") as f:
+            for line in f:
+                request = json.loads(line)
+                try:
+                    response = {"status_code": 200, "body": self.handler(request["body"])}
+                except Exception as e:
+                    response = {"status_code": 500, "body": {"error": {"message": str(e)}}}
+                out.append(json.dumps({"custom_id": request["custom_id"], "response": response, "error": None},
+                                      ensure_ascii=False))
+        tmp = job / "output.jsonl.tmp"
+        tmp.write_text("".join(line + "\n" for line in out), encoding="utf-8")
+        tmp.replace(job / "output.jsonl")
+
+
+# ---------- runner ----------
+def _load_manifest(work_dir: pathlib.Path) -> dict[str, dict[str, str]]:
+    path = work_dir / MANIFEST_NAME
+    if path.exists():
+        return json.loads(path.read_text(encoding="utf-8"))
+    return {}
+
+
+def _save_manifest(work_dir: pathlib.Path, manifest: dict[str, dict[str, str]]) -> None:
+    tmp = work_dir / (MANIFEST_NAME + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    tmp.replace(work_dir / MANIFEST_NAME)
+
+
+def run_batches(
+    backend,
+    lines: Iterable[str],
+    work_dir: str | os.PathLike,
+    poll_interval: float = 60.0,
+    max_requests: int = BATCH_MAX_REQUESTS,
+    max_bytes: int = BATCH_MAX_BYTES,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Iterator[tuple[str, dict[str, Any] | None, str | None]]:
+    """Submit *lines* as batch jobs and yield (custom_id, result, error) as jobs finish.
+
+    Exactly one of *result* / *error* is set. Requests missing from a
+    finished job's output (e.g. an expired job) are yielded as errors.
+    """
+    work_dir = pathlib.Path(work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    manifest = _load_manifest(work_dir)
+
+    pending: dict[str, tuple[str, list[str]]] = {}  # batch_id -> (chunk name, custom_ids)
+    for n, chunk in enumerate(chunk_lines(lines, max_requests, max_bytes)):
+        name = f"batch_{n:03d}.jsonl"
+        data = "".join(line + "\n" for line in chunk)
+        digest = hashlib.sha256(data.encode("utf-8")).hexdigest()
+        entry = manifest.get(name)
+        if entry is None or entry["sha256"] != digest:
+            (work_dir / name).write_text(data, encoding="utf-8")
+            entry = manifest[name] = {"sha256": digest, "batch_id": backend.submit(work_dir / name)}
+            _save_manifest(work_dir, manifest)
+            print(f"Submitted {name} ({len(chunk)} requests) as {entry['batch_id']}")
+        else:
+            print(f"Resuming {name} ({len(chunk)} requests) as {entry['batch_id']}")
+        pending[entry["batch_id"]] = (name, [json.loads(line)["custom_id"] for line in chunk])
+
+    while pending:
+        for batch_id in list(pending):
+            state = backend.status(batch_id)
+            if state not in TERMINAL_STATES:
+                continue
+            name, custom_ids = pending.pop(batch_id)
+            print(f"{name}: {state}")
+            seen = set()
+            for line in backend.results(batch_id):
+                custom_id, result, error = parse_output_line(line)
+                seen.add(custom_id)
+                yield custom_id, result, error
+            for custom_id in custom_ids:
+                if custom_id not in seen:
+                    yield custom_id, None, f"No output (batch {state})"
+        if pending:
+            sleep(poll_interval)
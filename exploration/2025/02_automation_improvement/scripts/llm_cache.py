@@ -0,0 +1,136 @@
+"""Persistent cache of parsed LLM classification results.
+
+Entries are keyed by SHA-256 of (model, temperature, system prompt,
+instructions, text sample), so the same sample is paid for once, across
+runs and across duplicate pages in different cities.
+
+Each cache file belongs to one prompt version (a hash of the system prompt
+and instructions unless given explicitly). Opening it under another
+version drops the old entries. Size is bounded by ``capacity`` entries;
+the least recently used go first.
+
+Example::
+
+    cache = ResponseCache("llm_cache.sqlite", prompt_version(SYSTEM_PROMPT, INSTRUCTIONS))
+    engine = ClassificationEngine(client, MODEL, SYSTEM_PROMPT, INSTRUCTIONS, cache=cache)
+    ...
+    print(cache.stats.hit_rate)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+from dataclasses import dataclass
+from typing import Any
+
+
+def prompt_version(*parts: str) -> str:
+    """Short hash identifying a prompt; changes whenever any part changes."""
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def cache_key(model: str, temperature: float, system: str, instructions: str, text: str) -> str:
+    payload = json.dumps([model, temperature, system, instructions, text], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    capacity: int
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / total
+
+
+class ResponseCache:
+    """SQLite-backed, size-bounded LRU cache of classification results."""
+
+    def __init__(self, path: str | os.PathLike, version: str, capacity: int = 500_000):
+        if capacity < 1:
+            raise ValueError(f"capacity must be >= 1, got {capacity}")
+        self.version = version
+        self.capacity = capacity
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                prompt_version TEXT NOT NULL,
+                result TEXT NOT NULL,
+                last_used INTEGER NOT NULL
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        # Invalidate everything written under another prompt version
+        self.conn.execute("DELETE FROM responses WHERE prompt_version != ?", (version,))
+        self.conn.commit()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._size, self._clock = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(MAX(last_used), 0) FROM responses"
+        ).fetchone()
+        self._evict()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            evictions=self._evictions,
+            size=self._size,
+            capacity=self.capacity,
+        )
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        row = self.conn.execute("SELECT result FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        self.conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (self._tick(), key))
+        self.conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, result: dict[str, Any]) -> None:
+        existed = self.conn.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone() is not None
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (key, prompt_version, result, last_used) VALUES (?, ?, ?, ?)",
+            (key, self.version, json.dumps(result, ensure_ascii=False), self._tick()),
+        )
+        self._size += not existed
+        self._evict()
+        self.conn.commit()
+
+    def _tick(self) -> int:
+        """Logical clock for LRU order (wall-clock time can tie or go backwards)."""
+        self._clock += 1
+        return self._clock
+
+    def _evict(self) -> None:
+        excess = self._size - self.capacity
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            self.conn.commit()
+            self._size -= excess
+            self._evictions += excess
@@ -0,0 +1,394 @@
+"""Concurrent, rate-limited chat-completion classification.
+
+ClassificationEngine keeps up to ``concurrency`` requests in flight over one
+``AsyncOpenAI`` client. Before each request it takes capacity from a
+RateLimiter holding two token buckets: requests per minute and tokens per
+minute (estimated prompt tokens + the completion allowance; the estimate
+is corrected with the reported usage afterwards).
+
+The limiter is adaptive: a rate-limit error halves the effective rates and
+honours ``Retry-After``; every success then adds a little back, up to the
+configured limits. Failed requests are retried with full-jitter exponential
+backoff, so clients that were throttled together do not retry together.
+
+With a ResponseCache (llm_cache.py), results are looked up before any
+request is made, and identical texts classified at the same time share one
+request.
+
+With ``pack_tokens`` set, short texts (up to ``pack_page_tokens``) are
+classified several per request: the prompt asks for one decision per
+document, keyed by its id. Documents missing from the reply, duplicated or
+malformed are classified again one at a time.
+
+Any OpenAI-compatible server works (``base_url``), which is how the tests
+run the engine against a local mock.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import time
+from collections.abc import AsyncIterator, Callable, Iterable, Iterator
+from typing import Any, TypeVar
+
+from llm_cache import ResponseCache, cache_key
+from openai import APIError, AsyncOpenAI, RateLimitError
+
+K = TypeVar("K")
+
+PACK_INSTRUCTIONS = """
+Several TEXTs follow, each introduced by a line "=== url_id: <id> ===".
+Classify each TEXT on its own, using the rules above.
+Return STRICT JSON only: {"results": [...]}, with exactly one object per TEXT
+holding "url_id" (copied exactly) and the fields of the schema above.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for rate budgeting."""
+    return len(text) // 4 + 1
+
+
+def retry_after(error: Exception) -> float | None:
+    """Seconds from a ``Retry-After`` / ``retry-after-ms`` header on an API error, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def build_messages(system: str, instructions: str, text: str) -> list[dict[str, str]]:
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": f"{instructions}\n\n---\nTEXT:\n{text}"},
+    ]
+
+
+def build_pack_messages(system: str, instructions: str, docs: list[tuple[str, str]]) -> list[dict[str, str]]:
+    """Messages classifying several (url_id, text) documents in one request."""
+    body = "\n\n".join(f"=== url_id: {doc_id} ===\n{text}" for doc_id, text in docs)
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": f"{instructions}\n{PACK_INSTRUCTIONS}\n---\n{body}"},
+    ]
+
+
+def parse_pack_reply(reply: Any, doc_ids: Iterable[str]) -> dict[str, dict[str, Any]]:
+    """Valid per-document results of a packed reply, by url_id.
+
+    Entries with an unknown or repeated url_id, or without a valid
+    ``decision``, are left out; the caller re-classifies those documents.
+    """
+    expected = set(doc_ids)
+    entries = reply.get("results") if isinstance(reply, dict) else None
+    if not isinstance(entries, list):
+        return {}
+    found: dict[str, dict[str, Any]] = {}
+    repeated: set[str] = set()
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        doc_id = str(entry.get("url_id"))
+        if doc_id not in expected or entry.get("decision") not in ("include", "exclude"):
+            continue
+        if doc_id in found:
+            repeated.add(doc_id)
+        found[doc_id] = {k: v for k, v in entry.items() if k != "url_id"}
+    return {doc_id: result for doc_id, result in found.items() if doc_id not in repeated}
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute token buckets with adaptive rates.
+
+    ``acquire`` waits (first come, first served) until both buckets hold
+    enough capacity. ``penalize`` halves the effective rates, down to
+    ``min_fraction`` of the limits; ``reward`` adds ``recovery`` of the
+    limits back per success.
+    """
+
+    def __init__(self, rpm: float, tpm: float, min_fraction: float = 0.1, recovery: float = 0.05,
+                 clock=time.monotonic):
+        self.max_rpm = rpm
+        self.max_tpm = tpm
+        self.min_fraction = min_fraction
+        self.recovery = recovery
+        self.scale = 1.0
+        self._clock = clock
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def rpm(self) -> float:
+        return self.max_rpm * self.scale
+
+    @property
+    def tpm(self) -> float:
+        return self.max_tpm * self.scale
+
+    def _refill(self) -> float:
+        now = self._clock()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+        return now
+
+    async def acquire(self, tokens: int) -> None:
+        async with self._lock:
+            while True:
+                now = self._refill()
+                # A request larger than the bucket would never fit: let it go once the bucket is full
+                need = min(tokens, self.tpm)
+                wait = max(
+                    self._paused_until - now,
+                    (1 - self._requests) * 60 / self.rpm,
+                    (need - self._tokens) * 60 / self.tpm,
+                )
+                if wait <= 0:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep(wait)
+
+    def settle(self, estimated: int, used: int) -> None:
+        """Return (or charge) the difference between estimated and reported tokens."""
+        self._tokens = min(self.tpm, self._tokens + estimated - used)
+
+    def penalize(self, pause: float | None = None) -> None:
+        self.scale = max(self.min_fraction, self.scale / 2)
+        self._requests = min(self._requests, self.rpm)
+        self._tokens = min(self._tokens, self.tpm)
+        if pause:
+            self._paused_until = max(self._paused_until, self._clock() + pause)
+
+    def reward(self) -> None:
+        self.scale = min(1.0, self.scale + self.recovery)
+
+
+class ClassificationEngine:
+    """Classify texts with a JSON-returning chat prompt, many requests at a time."""
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        model: str,
+        system: str,
+        instructions: str,
+        temperature: float = 0.1,
+        concurrency: int = 8,
+        rpm: float = 500,
+        tpm: float = 200_000,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_cap: float = 60.0,
+        max_output_tokens: int = 800,
+        cache: ResponseCache | None = None,
+        pack_tokens: int = 0,
+        pack_page_tokens: int = 500,
+        pack_max_docs: int = 10,
+    ):
+        self.client = client
+        self.model = model
+        self.system = system
+        self.instructions = instructions
+        self.temperature = temperature
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rpm, tpm)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.max_output_tokens = max_output_tokens
+        self.cache = cache
+        self.pack_tokens = pack_tokens
+        self.pack_page_tokens = pack_page_tokens
+        self.pack_max_docs = pack_max_docs
+        self.packed_requests = 0
+        self.packed_docs = 0
+        self.pack_fallbacks = 0
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+    def messages(self, text: str) -> list[dict[str, str]]:
+        return build_messages(self.system, self.instructions, text)
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(cap, base * 2**(attempt - 1))]."""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** (attempt - 1)))
+
+    def _cache_key(self, text: str) -> str:
+        return cache_key(self.model, self.temperature, self.system, self.instructions, text)
+
+    async def classify(self, text: str) -> dict[str, Any]:
+        if self.cache is None:
+            return await self._request(text)
+        key = self._cache_key(text)
+        if key in self._in_flight:
+            return await asyncio.shield(self._in_flight[key])
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        return await self._classify_new(key, text)
+
+    async def _classify_new(self, key: str, text: str) -> dict[str, Any]:
+        """Request a cache miss, sharing the request with concurrent callers of the same text."""
+        if key in self._in_flight:
+            return await asyncio.shield(self._in_flight[key])
+        future = self._in_flight[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await self._request(text)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved: waiters re-raise it, nobody else needs it
+            raise
+        finally:
+            del self._in_flight[key]
+        self.cache.put(key, result)
+        future.set_result(result)
+        return result
+
+    async def _request(self, text: str) -> dict[str, Any]:
+        return await self._complete(self.messages(text))
+
+    async def _complete(self, messages: list[dict[str, str]], docs: int = 1) -> Any:
+        """Send *messages* (with retries) and return the parsed JSON reply."""
+        estimate = estimate_tokens(self.system + messages[1]["content"]) + self.max_output_tokens * docs
+        last_err: Exception | None = None
+        for attempt in range(1, self.max_retries + 1):
+            await self.limiter.acquire(estimate)
+            try:
+                resp = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=self.temperature,
+                    response_format={"type": "json_object"},
+                )
+                usage = getattr(resp, "usage", None)
+                if usage is not None and usage.total_tokens:
+                    self.limiter.settle(estimate, usage.total_tokens)
+                self.limiter.reward()
+                content = resp.choices[0].message.content
+                if content is None:  # empty or refused completion
+                    raise ValueError("completion has no content")
+                return json.loads(content)
+            except RateLimitError as e:
+                last_err = e
+                self.limiter.penalize(retry_after(e))
+            except (APIError, ValueError) as e:  # ValueError includes json.JSONDecodeError
+                last_err = e
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt))
+        raise RuntimeError(f"Classification failed after {self.max_retries} retries; last error: {last_err}")
+
+    async def _classify_pack(self, docs: list[tuple[str, str]]) -> dict[str, dict[str, Any] | Exception]:
+        """Classify (url_id, text) documents in one request; returns results by url_id."""
+        results: dict[str, dict[str, Any] | Exception] = {}
+        todo = []
+        for doc_id, text in docs:
+            cached = self.cache.get(self._cache_key(text)) if self.cache is not None else None
+            if cached is not None:
+                results[doc_id] = cached
+            else:
+                todo.append((doc_id, text))
+
+        if len(todo) > 1:
+            try:
+                reply = await self._complete(build_pack_messages(self.system, self.instructions, todo), len(todo))
+            except Exception as e:
+                return {**results, **{doc_id: e for doc_id, _ in todo}}
+            decoded = parse_pack_reply(reply, (doc_id for doc_id, _ in todo))
+            self.packed_requests += 1
+            self.packed_docs += len(decoded)
+            for doc_id, text in todo:
+                if doc_id in decoded:
+                    results[doc_id] = decoded[doc_id]
+                    if self.cache is not None:
+                        self.cache.put(self._cache_key(text), decoded[doc_id])
+            todo = [(doc_id, text) for doc_id, text in todo if doc_id not in decoded]
+            self.pack_fallbacks += len(todo)
+
+        async def single(text: str) -> dict[str, Any]:
+            return await (self._request(text) if self.cache is None else self._classify_new(self._cache_key(text), text))
+
+        singles = await asyncio.gather(*(single(text) for _, text in todo), return_exceptions=True)
+        results.update((doc_id, result) for (doc_id, _), result in zip(todo, singles, strict=True))
+        return results
+
+    def _units(self, items: Iterable[tuple[K, str]], label) -> Iterator[list[tuple[K, str]]]:
+        """Group items into requests: short texts packed up to ``pack_tokens``, others alone."""
+        pack: list[tuple[K, str]] = []
+        labels: set[str] = set()
+        size = 0
+        for key, text in items:
+            tokens = estimate_tokens(text)
+            if not self.pack_tokens or tokens > self.pack_page_tokens:
+                yield [(key, text)]
+                continue
+            if pack and (size + tokens > self.pack_tokens or len(pack) >= self.pack_max_docs
+                         or label(key) in labels):
+                yield pack
+                pack, labels, size = [], set(), 0
+            pack.append((key, text))
+            labels.add(label(key))
+            size += tokens
+        if pack:
+            yield pack
+
+    async def classify_all(
+        self, items: Iterable[tuple[K, str]], return_exceptions: bool = False, label: Callable[[K], str] = str
+    ) -> AsyncIterator[tuple[K, dict[str, Any] | Exception]]:
+        """Yield (key, result) as classifications finish.
+
+        *items* is consumed lazily, at most ``concurrency`` requests ahead
+        of the results. The first failure (after retries) stops the run and
+        is raised here, unless *return_exceptions* is set: then the
+        exception is yielded as that item's result and the run carries on.
+        *label* gives the url_id that identifies an item in a packed request.
+        """
+        units = self._units(items, label)
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def worker() -> None:
+            for unit in units:  # shared iterator: each unit goes to exactly one worker
+                if len(unit) == 1:
+                    key, text = unit[0]
+                    try:
+                        results = [(key, await self.classify(text))]
+                    except Exception as e:
+                        results = [(key, e)]
+                else:
+                    by_label = await self._classify_pack([(label(key), text) for key, text in unit])
+                    results = [(key, by_label[label(key)]) for key, _ in unit]
+                for key, result in results:
+                    if isinstance(result, Exception) and not return_exceptions:
+                        raise result
+                    await queue.put((key, result))
+
+        async def run() -> None:
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                await queue.put(None)
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        runner = asyncio.create_task(run())
+        try:
+            while (item := await queue.get()) is not None:
+                yield item
+            await runner
+        finally:
+            for task in workers:
+                task.cancel()
+            runner.cancel()
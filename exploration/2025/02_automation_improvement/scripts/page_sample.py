@@ -0,0 +1,251 @@
+"""Token-budgeted page samples for the FSI classifier.
+
+Instead of the first ``max_chars`` characters of a page, ``PageSampler``
+builds a sample that fits a token budget:
+
+1. Lines repeated across pages of the same site (menus, cookie banners,
+   footers the extractor did not drop) are learned with :meth:`fit` and
+   removed, as are lines repeated within the page.
+2. Pages that fit the budget are sent whole.
+3. Longer pages are cut into chunks of consecutive lines. The chunks are
+   ranked by FSI keyword density (the first chunk, which usually names
+   the organisation, always goes in, cut down if it alone is over the
+   budget) and the best are added until the budget is full. They are
+   kept in page order, with ``[...]`` marking gaps.
+
+Tokens are counted locally: with ``tiktoken`` when installed (the
+``o200k_base`` encoding used by gpt-4o models), else with a regex
+estimate.
+
+Example::
+
+    sampler = PageSampler(budget=2500)
+    sampler.fit(iter_pages())            # (url_id, text) pairs
+    sample = sampler.sample(url_id, text)
+    print(sampler.stats.saved_per_page)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from collections import Counter
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+
+try:
+    import tiktoken
+except ImportError:  # optional: exact token counts
+    tiktoken = None
+
+TOKEN_BUDGET_DEFAULT = 2500
+CHUNK_TOKENS = 120
+GAP = "[...]"
+
+# Word starts that signal food-sharing content, in the languages of the study cities
+FSI_KEYWORDS = (
+    # English
+    "food", "meal", "fridge", "surplus", "pantry", "kitchen", "garden", "allotment", "seed", "shar",
+    "donat", "volunteer", "redistribut", "waste", "hunger", "harvest", "grow", "cook", "community",
+    "cooperative", "co-op", "solidar", "charity", "free",
+    # Dutch / German
+    "voedsel", "maaltijd", "koelkast", "tuin", "zaad", "zaden", "delen", "vrijwillig", "lebensmittel",
+    "tafel", "essen", "kühlschrank", "garten", "saatgut", "teilen", "ehrenamt", "foodsharing",
+    # French / Spanish / Italian / Portuguese
+    "aliment", "nourriture", "repas", "frigo", "jardin", "graine", "partag", "bénévol", "comida",
+    "comedor", "huerto", "semilla", "compartir", "voluntari", "cibo", "pasti", "orto", "semi",
+    "condivi", "dispensa", "refei", "horta", "sement", "partilh",
+)
+_KEYWORD_RE = re.compile(r"\b(?:" + "|".join(re.escape(k) for k in FSI_KEYWORDS) + ")", re.IGNORECASE)
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+# ---------- tokenizers ----------
+def _regex_count(text: str) -> int:
+    """Estimate: one token per punctuation mark, one per word plus one per 6 further characters."""
+    return sum(1 + (len(m) - 1) // 6 for m in _TOKEN_RE.findall(text))
+
+
+def available_tokenizers() -> list[str]:
+    """Names accepted by :func:`get_tokenizer`, most exact first."""
+    return (["tiktoken"] if tiktoken is not None else []) + ["regex"]
+
+
+def get_tokenizer(name: str = "auto") -> Callable[[str], int]:
+    """Return a ``text -> token count`` function.
+
+    ``"auto"`` uses ``tiktoken`` when it is installed and its encoding can
+    be loaded (it is downloaded on first use), and the regex estimate
+    otherwise.
+    """
+    if name == "auto":
+        try:
+            return get_tokenizer("tiktoken")
+        except Exception:
+            return _regex_count
+    if name == "tiktoken":
+        if tiktoken is None:
+            raise ImportError("tokenizer 'tiktoken' requested but the tiktoken package is not installed")
+        encoding = tiktoken.get_encoding("o200k_base")
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    if name == "regex":
+        return _regex_count
+    raise ValueError(f"Unknown tokenizer: {name!r} (expected one of {available_tokenizers()})")
+
+
+def site_of(url_id: str) -> str:
+    """Host part of a ``<host>__<hash>`` url_id (second_filtering.safe_file_stem)."""
+    return url_id.split("__", 1)[0]
+
+
+def _line_hash(line: str) -> bytes:
+    return hashlib.blake2b(line.encode("utf-8"), digest_size=8).digest()
+
+
+def keyword_hits(text: str) -> int:
+    return len(_KEYWORD_RE.findall(text))
+
+
+# ---------- sampler ----------
+@dataclass(frozen=True)
+class SampleStats:
+    pages: int
+    baseline_tokens: int
+    sample_tokens: int
+    boilerplate_lines: int
+
+    @property
+    def saved_per_page(self) -> float:
+        """Average tokens saved per request against the fixed character cut."""
+        if self.pages == 0:
+            return 0.0
+        return (self.baseline_tokens - self.sample_tokens) / self.pages
+
+
+class PageSampler:
+    """Build classifier input that fits a token budget; see the module docstring."""
+
+    def __init__(self, budget: int = TOKEN_BUDGET_DEFAULT, tokenizer: str = "auto",
+                 chunk_tokens: int = CHUNK_TOKENS, min_site_pages: int = 2,
+                 baseline_chars: int | None = None):
+        """*baseline_chars* is the fixed cut the stats compare against (whole page if None)."""
+        if budget < 1:
+            raise ValueError(f"budget must be >= 1, got {budget}")
+        self.budget = budget
+        self.count_tokens = get_tokenizer(tokenizer)
+        self.chunk_tokens = chunk_tokens
+        self.min_site_pages = min_site_pages
+        self.baseline_chars = baseline_chars
+        self._site_lines: Counter[tuple[str, bytes]] = Counter()
+        self._pages = 0
+        self._baseline_tokens = 0
+        self._sample_tokens = 0
+        self._boilerplate_lines = 0
+
+    @property
+    def stats(self) -> SampleStats:
+        return SampleStats(
+            pages=self._pages,
+            baseline_tokens=self._baseline_tokens,
+            sample_tokens=self._sample_tokens,
+            boilerplate_lines=self._boilerplate_lines,
+        )
+
+    def fit(self, pages: Iterable[tuple[str, str]]) -> PageSampler:
+        """Count, per site, how many distinct pages each line appears on."""
+        seen_texts: set[tuple[str, bytes]] = set()
+        for url_id, text in pages:
+            site = site_of(url_id)
+            key = (site, _line_hash(text))
+            if key in seen_texts:  # URL variants with identical text are one page
+                continue
+            seen_texts.add(key)
+            for h in {_line_hash(line.strip()) for line in text.splitlines() if line.strip()}:
+                self._site_lines[site, h] += 1
+        return self
+
+    def is_boilerplate(self, site: str, line: str) -> bool:
+        return self._site_lines.get((site, _line_hash(line)), 0) >= self.min_site_pages
+
+    def clean_lines(self, url_id: str, text: str) -> list[str]:
+        """Lines of *text* without site boilerplate and in-page repeats.
+
+        A page made only of boilerplate keeps its lines: the site's pages
+        are then near-identical and the shared text is the content.
+        """
+        site = site_of(url_id)
+        lines = list(dict.fromkeys(line.strip() for line in text.splitlines() if line.strip()))
+        kept = [line for line in lines if not self.is_boilerplate(site, line)]
+        if not kept:
+            return lines
+        self._boilerplate_lines += len(lines) - len(kept)
+        return kept
+
+    def _pieces(self, line: str) -> list[tuple[str, int]]:
+        """*line* as (text, tokens) pieces of at most about ``chunk_tokens``, split at spaces."""
+        n = self.count_tokens(line) + 1
+        if n <= self.chunk_tokens:
+            return [(line, n)]
+        words = line.split(" ")
+        k = -(-n // self.chunk_tokens)
+        step = -(-len(words) // k)
+        pieces = [" ".join(words[i : i + step]) for i in range(0, len(words), step)]
+        return [(piece, self.count_tokens(piece) + 1) for piece in pieces]
+
+    def _chunks(self, lines: list[str]) -> list[tuple[str, int]]:
+        """Consecutive lines grouped into (text, tokens) chunks of about ``chunk_tokens``."""
+        chunks: list[tuple[str, int]] = []
+        current: list[str] = []
+        size = 0
+        for piece, n in (piece for line in lines for piece in self._pieces(line)):
+            if current and size + n > self.chunk_tokens:
+                chunks.append(("\n".join(current), size))
+                current, size = [], 0
+            current.append(piece)
+            size += n
+        if current:
+            chunks.append(("\n".join(current), size))
+        return chunks
+
+    def _select(self, chunks: list[tuple[str, int]]) -> str:
+        def density(i: int) -> float:
+            text, tokens = chunks[i]
+            return keyword_hits(text) / max(tokens, 1)
+
+        used = chunks[0][1] + 2  # room for a gap marker
+        if used > self.budget:
+            # first chunk alone is over budget: cut it by characters, ~4 per token
+            return chunks[0][0][: self.budget * 4]
+        chosen = [0]
+        for i in sorted(range(1, len(chunks)), key=density, reverse=True):
+            tokens = chunks[i][1] + 2
+            if used + tokens <= self.budget:
+                chosen.append(i)
+                used += tokens
+
+        parts: list[str] = []
+        previous = -1
+        for i in sorted(chosen):
+            if parts and i != previous + 1:
+                parts.append(GAP)
+            parts.append(chunks[i][0])
+            previous = i
+        if previous != len(chunks) - 1:
+            parts.append(GAP)
+        return "\n".join(parts)
+
+    def sample(self, url_id: str, text: str) -> str:
+        """Classifier input for one page: cleaned, and cut to the token budget by relevance."""
+        baseline = text.strip()
+        if self.baseline_chars is not None:
+            baseline = baseline[: self.baseline_chars]
+        lines = self.clean_lines(url_id, text)
+        cleaned = "\n".join(lines)
+        tokens = self.count_tokens(cleaned)
+        if tokens > self.budget:
+            cleaned = self._select(self._chunks(lines))
+            tokens = self.count_tokens(cleaned)
+        self._pages += 1
+        self._baseline_tokens += self.count_tokens(baseline)
+        self._sample_tokens += tokens
+        return cleaned
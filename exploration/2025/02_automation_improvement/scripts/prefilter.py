@@ -0,0 +1,329 @@
+"""Cheap pre-filter cascade ahead of the LLM classifier.
+
+Obvious rejects are decided locally and only the uncertain pages go to the
+LLM:
+
+1. Shell pages: empty, very short, or "page not found" text → exclude.
+2. Domain rules: a blocklist learned from manual verification (hosts whose
+   reviewed URLs were all false positives of a content category, see
+   ``categorize_false_positive`` in 01_manual_verification/compile_tracker.py),
+   seeded with the crowdfunding platforms named in the prompt, plus
+   municipality / government host patterns → exclude.
+3. A small logistic-regression model over keyword scores (FSI terms,
+   news, crowdfunding and government vocabulary, page length) → exclude
+   below ``exclude_below``, include above ``include_above`` (off by
+   default), otherwise escalate.
+
+The reference set is the "All URLs" sheet of
+``manual_verification_results.xlsx`` joined to the scraped text by url_id.
+Training holds out a share of the hosts and reports precision/recall of
+the local decisions on them for a range of thresholds, so the threshold
+can be picked for throughput.
+
+Usage:
+  python prefilter.py --reference reports/2025_01_manual_verification/manual_verification_results.xlsx \\
+      --txt-base Run-03/03--archived/_scraped_text --out prefilter.json
+  python analyse_fsi_filter_improved.py ... --prefilter prefilter.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import pathlib
+import random
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from page_sample import keyword_hits
+from text_pack import list_texts, read_text
+
+# FP categories that can be told from the page itself; wrong-location and
+# duplicate entries need context the page does not carry
+CONTENT_FP_CATEGORIES = frozenset({
+    "FP_MEDIA", "FP_COMMERCIAL", "FP_GOVERNMENT", "FP_BROKEN_LINK", "FP_NON_FSI_ORG", "FP_SUPPORTING_ORG",
+    "FP_OTHER",
+})
+BLOCKABLE_CATEGORIES = frozenset({"FP_MEDIA", "FP_COMMERCIAL", "FP_GOVERNMENT", "FP_NON_FSI_ORG"})
+
+# Fundraising platforms named in the exclusion rules of INSTRUCTIONS
+SEED_BLOCKLIST = {
+    "youbehero.com": "FP_FUNDRAISING",
+    "crowdfunder.co.uk": "FP_FUNDRAISING",
+    "produzionidalbasso.com": "FP_FUNDRAISING",
+    "gofundme.com": "FP_FUNDRAISING",
+    "kickstarter.com": "FP_FUNDRAISING",
+    "indiegogo.com": "FP_FUNDRAISING",
+    "ulule.com": "FP_FUNDRAISING",
+    "kisskissbankbank.com": "FP_FUNDRAISING",
+    "leetchi.com": "FP_FUNDRAISING",
+    "betterplace.org": "FP_FUNDRAISING",
+}
+# Only unambiguous patterns: a match excludes the page outright
+GOVERNMENT_HOST = re.compile(
+    r"(^|\.)gov(\.[a-z]{2})?$|\.gov\.|"
+    r"^(comune|gemeente|stadt|ville|mairie|ayuntamiento|concello|ajuntament|municipio|kommune|kommun|gmina)\."
+)
+
+SHELL_MIN_CHARS = 200
+NOT_FOUND = re.compile(
+    r"page not found|error 404|404 error|404 not found|nicht gefunden|pagina non trovata|página no encontrada|page introuvable|"
+    r"pagina niet gevonden|página não encontrada|strona nie została znaleziona",
+    re.IGNORECASE,
+)
+NEWS_TERMS = re.compile(
+    r"\b(?:news|article|editor|journalist|reporter|subscribe|newsletter|published|posted by|comments?|"
+    r"notizie|articolo|nieuws|artikel|nachrichten|actualités|noticias|notícias)\b",
+    re.IGNORECASE,
+)
+FUNDRAISING_TERMS = re.compile(
+    r"\b(?:crowdfunding|backers?|pledge|raised|fundraiser|campaign|donate now|sostenitori|raccolta fondi|"
+    r"spendenaktion|collecte)\b",
+    re.IGNORECASE,
+)
+GOVERNMENT_TERMS = re.compile(
+    r"\b(?:council|municipality|city hall|mayor|comune|sindaco|gemeente|stadtverwaltung|mairie|ayuntamiento|"
+    r"câmara municipal|regulations|public services)\b",
+    re.IGNORECASE,
+)
+COMMERCE_TERMS = re.compile(
+    r"\b(?:add to cart|checkout|shop|price|prices|menu|book a table|reservation|delivery|€|£)",
+    re.IGNORECASE,
+)
+
+FEATURES = ["log_chars", "fsi_density", "news_density", "fundraising_hits", "government_hits", "commerce_density",
+            "government_host"]
+
+
+def host_of(url_or_id: str) -> str:
+    """Lower-case host without ``www.``, from a URL or a ``<host>__<hash>`` url_id."""
+    s = str(url_or_id).strip().lower()
+    if "://" in s:
+        s = s.split("://", 1)[1]
+    s = s.split("__", 1)[0].split("/", 1)[0].split("?", 1)[0]
+    s = re.sub(r"[:_]\d+$", "", s)  # port (url_ids store ':' as '_')
+    return s[4:] if s.startswith("www.") else s
+
+
+def blocked_category(host: str, blocklist: dict[str, str]) -> str | None:
+    """Category of the blocklisted domain *host* falls under (subdomains included), if any."""
+    parts = host.split(".")
+    for i in range(len(parts) - 1):
+        category = blocklist.get(".".join(parts[i:]))
+        if category:
+            return category
+    if GOVERNMENT_HOST.search(host):
+        return "FP_GOVERNMENT"
+    return None
+
+
+def features(host: str, text: str) -> list[float]:
+    words = max(len(text.split()), 1)
+    return [
+        math.log1p(len(text)),
+        keyword_hits(text) / words * 100,
+        len(NEWS_TERMS.findall(text)) / words * 100,
+        math.log1p(len(FUNDRAISING_TERMS.findall(text))),
+        math.log1p(len(GOVERNMENT_TERMS.findall(text))),
+        len(COMMERCE_TERMS.findall(text)) / words * 100,
+        1.0 if GOVERNMENT_HOST.search(host) else 0.0,
+    ]
+
+
+def is_shell(text: str) -> bool:
+    text = text.strip()
+    return len(text) < SHELL_MIN_CHARS or (len(text) < 2000 and NOT_FOUND.search(text) is not None)
+
+
+# ---------- model ----------
+def fit_logistic(X: np.ndarray, y: np.ndarray, l2: float = 1e-2, epochs: int = 500, lr: float = 0.5) -> np.ndarray:
+    """Weights (bias first) of an L2-regularised logistic regression, by gradient descent."""
+    Xb = np.hstack([np.ones((len(X), 1)), X])
+    w = np.zeros(Xb.shape[1])
+    # balance the classes: false positives are the minority in some rounds
+    pos = max(y.mean(), 1e-6)
+    weights = np.where(y == 1, 0.5 / pos, 0.5 / max(1 - pos, 1e-6))
+    for _ in range(epochs):
+        p = 1 / (1 + np.exp(-(Xb @ w)))
+        grad = Xb.T @ ((p - y) * weights) / len(y) + l2 * np.r_[0, w[1:]]
+        w -= lr * grad
+    return w
+
+
+@dataclass(frozen=True)
+class Decision:
+    decision: str | None  # "include" / "exclude", or None to escalate to the LLM
+    reason: str
+    score: float | None = None  # model probability that the page is an FSI
+
+    @property
+    def confidence(self) -> int:
+        """1..5 on the LLM's scale: 5 for shell and domain rules, else how far the score is from 0.5."""
+        if self.score is None:
+            return 5
+        return max(1, round(1 + 4 * abs(2 * self.score - 1)))
+
+
+class Prefilter:
+    def __init__(self, blocklist: dict[str, str] | None = None, weights: list[float] | None = None,
+                 mean: list[float] | None = None, std: list[float] | None = None,
+                 exclude_below: float = 0.05, include_above: float | None = None):
+        self.blocklist = dict(SEED_BLOCKLIST if blocklist is None else blocklist)
+        self.weights = None if weights is None else np.asarray(weights, dtype=float)
+        self.mean = None if mean is None else np.asarray(mean, dtype=float)
+        self.std = None if std is None else np.asarray(std, dtype=float)
+        self.exclude_below = exclude_below
+        self.include_above = include_above
+
+    # ----- training -----
+    @staticmethod
+    def learn_blocklist(reference: pd.DataFrame) -> dict[str, str]:
+        """Hosts whose reviewed URLs are all false positives of one blockable category."""
+        blocklist = dict(SEED_BLOCKLIST)
+        ref = reference.assign(host=reference["url"].map(host_of))
+        for host, rows in ref.groupby("host"):
+            categories = set(rows["fp_category"])
+            if host and len(categories) == 1 and categories <= BLOCKABLE_CATEGORIES:
+                blocklist[host] = categories.pop()
+        return blocklist
+
+    def fit(self, reference: pd.DataFrame) -> Prefilter:
+        """Learn blocklist and model from reference rows (url, url_id, text, is_valid, fp_category)."""
+        self.blocklist = self.learn_blocklist(reference)
+        X = np.array([features(host_of(u), t) for u, t in zip(reference["url_id"], reference["text"], strict=True)])
+        y = reference["is_valid"].astype(float).to_numpy()
+        self.mean = X.mean(axis=0)
+        self.std = X.std(axis=0) + 1e-9
+        self.weights = fit_logistic((X - self.mean) / self.std, y)
+        return self
+
+    # ----- scoring -----
+    def score(self, host: str, text: str) -> float | None:
+        if self.weights is None:
+            return None
+        x = (np.asarray(features(host, text)) - self.mean) / self.std
+        return float(1 / (1 + np.exp(-(self.weights[0] + x @ self.weights[1:]))))
+
+    def decide(self, url_id: str, text: str) -> Decision:
+        host = host_of(url_id)
+        if is_shell(text):
+            return Decision("exclude", "FP_BROKEN_LINK: empty, very short or not-found page")
+        category = blocked_category(host, self.blocklist)
+        if category:
+            return Decision("exclude", f"{category}: blocklisted domain {host}")
+        p = self.score(host, text)
+        if p is not None and p < self.exclude_below:
+            return Decision("exclude", f"keyword model score {p:.3f} < {self.exclude_below}", p)
+        if p is not None and self.include_above is not None and p > self.include_above:
+            return Decision("include", f"keyword model score {p:.3f} > {self.include_above}", p)
+        return Decision(None, "uncertain", p)
+
+    # ----- persistence -----
+    def save(self, path: str | os.PathLike) -> None:
+        data = {
+            "blocklist": self.blocklist,
+            "features": FEATURES,
+            "weights": None if self.weights is None else self.weights.tolist(),
+            "mean": None if self.mean is None else self.mean.tolist(),
+            "std": None if self.std is None else self.std.tolist(),
+            "exclude_below": self.exclude_below,
+            "include_above": self.include_above,
+        }
+        pathlib.Path(path).write_text(json.dumps(data, indent=2, sort_keys=True), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: str | os.PathLike) -> Prefilter:
+        data = json.loads(pathlib.Path(path).read_text(encoding="utf-8"))
+        if data.get("features") != FEATURES:
+            raise ValueError(f"{path} was trained on other features ({data.get('features')}); retrain it")
+        return cls(data["blocklist"], data["weights"], data["mean"], data["std"],
+                   data["exclude_below"], data["include_above"])
+
+
+# ---------- reference set & evaluation ----------
+def load_reference(xlsx: str | os.PathLike, txt_base: str | os.PathLike) -> pd.DataFrame:
+    """Manually verified URLs with their scraped text (rows without text are dropped)."""
+    from second_filtering import safe_file_stem
+
+    ref = pd.read_excel(xlsx, sheet_name="All URLs")
+    ref = ref[ref["url"].notna()]
+    ref = ref[ref["is_valid"].astype(bool) | ref["fp_category"].isin(CONTENT_FP_CATEGORIES)].copy()
+    ref["url_id"] = ref["url"].astype(str).str.strip().map(safe_file_stem)
+    paths = {url_id: p for _, url_id, p in list_texts(txt_base)}
+    ref = ref[ref["url_id"].isin(paths)].drop_duplicates("url_id").copy()
+    ref["text"] = [read_text(paths[u]) for u in ref["url_id"]]
+    ref["is_valid"] = ref["is_valid"].astype(bool)
+    return ref.reset_index(drop=True)
+
+
+def split_by_host(reference: pd.DataFrame, holdout: float = 0.3, seed: int = 0) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """(train, test), with every host entirely on one side so learned blocklists cannot leak."""
+    hosts = sorted(set(reference["url"].map(host_of)))
+    random.Random(seed).shuffle(hosts)
+    test_hosts = set(hosts[: round(len(hosts) * holdout)])
+    in_test = reference["url"].map(host_of).isin(test_hosts)
+    return reference[~in_test], reference[in_test]
+
+
+def evaluate(prefilter: Prefilter, reference: pd.DataFrame,
+             thresholds: tuple[float, ...] = (0.0, 0.02, 0.05, 0.1, 0.2, 0.3)) -> pd.DataFrame:
+    """Precision/recall of local exclusions per ``exclude_below`` threshold.
+
+    - local_share: pages decided without the LLM (the throughput gain)
+    - exclude_precision: share of local exclusions that were false positives
+    - exclude_recall: share of all false positives excluded locally
+    - valid_lost: valid FSIs excluded locally (never reach the LLM)
+    """
+    rows = []
+    valid = reference["is_valid"].to_numpy()
+    for t in thresholds:
+        pf = Prefilter(prefilter.blocklist, prefilter.weights, prefilter.mean, prefilter.std, t,
+                       prefilter.include_above)
+        decisions = [pf.decide(u, text).decision for u, text in zip(reference["url_id"], reference["text"], strict=True)]
+        excluded = np.array([d == "exclude" for d in decisions])
+        local = np.array([d is not None for d in decisions])
+        rows.append({
+            "exclude_below": t,
+            "local_share": local.mean() if len(local) else 0.0,
+            "exclude_precision": (~valid[excluded]).mean() if excluded.any() else float("nan"),
+            "exclude_recall": excluded[~valid].mean() if (~valid).any() else float("nan"),
+            "valid_lost": int((excluded & valid).sum()),
+        })
+    return pd.DataFrame(rows)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Train the pre-filter cascade on manually verified URLs.")
+    p.add_argument("--reference", type=pathlib.Path, required=True,
+                   help="manual_verification_results.xlsx (compile_tracker.py output)")
+    p.add_argument("--txt-base", type=pathlib.Path, required=True, help="Scraped text folder (city sub-folders)")
+    p.add_argument("--out", type=pathlib.Path, required=True, help="Where to write the trained pre-filter (JSON)")
+    p.add_argument("--holdout", type=float, default=0.3, help="Share of hosts held out for the report (default: 0.3)")
+    p.add_argument("--exclude-below", type=float, default=0.05,
+                   help="Exclude locally when the model score is below this (default: 0.05)")
+    p.add_argument("--include-above", type=float, default=None,
+                   help="Include locally when the model score is above this (default: never)")
+    args = p.parse_args()
+
+    reference = load_reference(args.reference, args.txt_base)
+    if reference.empty:
+        print("❌ No reference URL has scraped text under --txt-base.")
+        return
+    print(f"Reference: {len(reference)} page(s), {int(reference['is_valid'].sum())} valid FSI(s)")
+
+    train, test = split_by_host(reference, args.holdout)
+    report = evaluate(Prefilter(exclude_below=args.exclude_below).fit(train), test)
+    print(f"\nHeld-out hosts ({len(test)} page(s)):")
+    print(report.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+
+    prefilter = Prefilter(exclude_below=args.exclude_below, include_above=args.include_above).fit(reference)
+    prefilter.save(args.out)
+    print(f"\nSaved pre-filter trained on all {len(reference)} page(s) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
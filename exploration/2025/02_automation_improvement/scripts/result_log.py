@@ -0,0 +1,136 @@
+"""Crash-safe, append-only result files for long classification runs.
+
+``ResultLog`` appends CSV rows and flushes + fsyncs each one, so a crash
+loses at most the row being written (a torn last record is cut off when
+the file is reopened, including one cut inside a quoted multi-line field). On open it reads the key columns of the rows already
+written into ``completed``, the set of pages a re-run can skip.
+
+``DeadLetterLog`` appends one JSON line per page that failed for good
+(e.g. after all retries), so a bad page is set aside instead of aborting
+the run. Dead-lettered pages are not in ``completed``, so the next run
+tries them again.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+import pathlib
+import time
+from collections.abc import Sequence
+
+
+def _fsync_append(f, data: str) -> None:
+    f.write(data)
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _cut_torn_line(path: pathlib.Path) -> None:
+    """Drop a partial last line left by a crash mid-write."""
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def _cut_torn_record(path: pathlib.Path) -> None:
+    """Drop a partial last CSV record left by a crash mid-write.
+
+    A record ends at a newline outside quotes. csv doubles quotes inside
+    quoted fields, so that is a newline with an even number of ``"``
+    before it, counted from the start of the file.
+    """
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = pos = quotes = 0
+        for line in data.splitlines(keepends=True):
+            pos += len(line)
+            quotes += line.count(b'"')
+            if line.endswith(b"\n") and quotes % 2 == 0:
+                end = pos
+        if end < len(data):
+            f.truncate(end)
+
+
+class ResultLog:
+    """Append-only CSV of results; ``completed`` holds the keys already written."""
+
+    def __init__(self, path: str | os.PathLike, header: Sequence[str],
+                 key_columns: Sequence[str] = ("city", "url_id"), fresh: bool = False):
+        self.path = pathlib.Path(path)
+        self.header = list(header)
+        self._key_idx = [self.header.index(c) for c in key_columns]
+        self.completed: set[tuple[str, ...]] = set()
+
+        if fresh or not self.path.exists() or self.path.stat().st_size == 0:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "w", newline="", encoding="utf-8")
+            self._append(self.header)
+            return
+
+        _cut_torn_record(self.path)
+        with open(self.path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            existing = next(reader, None)
+            if existing != self.header:
+                raise ValueError(
+                    f"{self.path} has a different header ({existing}); use a new output file or start fresh"
+                )
+            for row in reader:
+                if len(row) == len(self.header):
+                    self.completed.add(self.key(row))
+        self._file = open(self.path, "a", newline="", encoding="utf-8")
+
+    def __enter__(self) -> ResultLog:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def key(self, row: Sequence) -> tuple[str, ...]:
+        return tuple(str(row[i]) for i in self._key_idx)
+
+    def _append(self, row: Sequence) -> None:
+        buf = io.StringIO()
+        csv.writer(buf).writerow(row)
+        _fsync_append(self._file, buf.getvalue())
+
+    def writerow(self, row: Sequence) -> None:
+        """Append *row* durably (same signature as ``csv.writer().writerow``)."""
+        self._append(row)
+        self.completed.add(self.key(row))
+
+
+class DeadLetterLog:
+    """Append-only JSONL of pages that could not be classified."""
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():
+            _cut_torn_line(self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self.count = 0
+
+    def __enter__(self) -> DeadLetterLog:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def add(self, error: Exception | str, **fields) -> None:
+        """Record a failed page; *fields* identify it (city, url_id, file, ...)."""
+        record = dict(fields, error=str(error), time=time.strftime("%Y-%m-%dT%H:%M:%S"))
+        if isinstance(error, Exception):
+            record["error_type"] = type(error).__name__
+        _fsync_append(self._file, json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self.count += 1
@@ -1,8 +1,26 @@
-import os, re, time, random, hashlib, pathlib, argparse
+import argparse
+import asyncio
+import contextlib
+import gzip
+import hashlib
+import os
+import pathlib
+import random
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlparse
+
 import pandas as pd
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse
+from html_text import available_backends, extract_page
+from requests.adapters import HTTPAdapter
+from text_pack import TextPackWriter, text_exists
+
+# what the classifier reads per page (MAX_CHARS_DEFAULT in analyse_fsi_filter_improved.py). Stored
+# text is not cut to it by default: the classifier truncates, and PageSampler ranks the whole page.
+MAX_CHARS_DEFAULT = 12000
 
 # ---------- helpers ----------
 def ensure_dir(path: str) -> None:
@@ -14,28 +32,391 @@ def safe_file_stem(url: str) -> str:
     return f"{host}__{h}"
 
 def extract_visible_text(html: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
-    for tag in soup(["script", "style", "noscript", "template", "svg", "canvas"]):
-        tag.decompose()
-    for tagname in ["nav", "footer", "aside"]:
-        for t in soup.find_all(tagname):
-            t.decompose()
-    text = soup.get_text(separator="\n", strip=True)
-    return re.sub(r"\n{3,}", "\n\n", text)
-
-def fetch(url: str, ua: str, timeout: int):
+    return extract_page(html)[1]
+
+def fetch(url: str, ua: str, timeout: int, session: requests.Session | None = None, validators: dict | None = None):
+    """Returns (status, final_url, html, error, validators); validators holds the ETag/Last-Modified headers.
+
+    Stored `validators` turn the request into a conditional GET, answered with 304 if the page is unchanged.
+    """
+    headers = {"User-Agent": ua}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
     try:
-        r = requests.get(url, headers={"User-Agent": ua}, timeout=timeout)
-        return r.status_code, r.url, r.text, None
+        r = (session or requests).get(url, headers=headers, timeout=timeout)
+        validators = {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+        return r.status_code, r.url, r.text, None, validators
     except requests.RequestException as e:
-        return None, None, None, str(e)
+        return None, None, None, str(e), {}
+
+def is_transient(status, err) -> bool:
+    """Failures worth retrying: network errors, rate limiting and server errors."""
+    return err is not None or status is None or status == 429 or status >= 500
+
+def spool_html(spool_dir: str, url: str, html: str) -> str:
+    """Write raw HTML to the spool, gzip-compressed; returns the spool file path."""
+    path = os.path.join(spool_dir, f"{safe_file_stem(url)}.html.gz")
+    with gzip.open(path, "wt", encoding="utf-8", compresslevel=1) as f:
+        f.write(html)
+    return path
+
+def extract_spooled(path: str, max_chars: int | None, extractor: str) -> tuple[str | None, str]:
+    """Title and visible text of a spooled page (runs in an extractor process)."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return extract_page(f.read(), max_chars, extractor)
+
+# ---------- fetch engine ----------
+# fetch_all lanes per global request slot: lanes sleeping out a host's crawl delay
+# hold no slot, so a few spare lanes keep the slots busy with other hosts
+LANES_PER_SLOT = 4
+
+class HostThrottle:
+    """Per-host politeness: at most `per_host` requests in flight per host, and a
+    random crawl-delay from `pause_range` between requests to the same host.
+    Requests to different hosts do not wait for each other."""
+
+    def __init__(self, pause_range: tuple[float, float], per_host: int = 1):
+        self.pause_range = pause_range
+        self.per_host = per_host
+        self._slots: dict[str, asyncio.Semaphore] = {}
+        self._next_start: dict[str, float] = {}
+
+    @contextlib.asynccontextmanager
+    async def slot(self, host: str):
+        loop = asyncio.get_running_loop()
+        async with self._slots.setdefault(host, asyncio.Semaphore(self.per_host)):
+            # reserve a start time before awaiting, so parallel slots on one host stay spaced
+            now = loop.time()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + random.uniform(*self.pause_range)
+            if start > now:
+                await asyncio.sleep(start - now)
+            try:
+                yield
+            finally:
+                done = loop.time() + random.uniform(*self.pause_range)
+                self._next_start[host] = max(self._next_start[host], done)
+
+def make_session(pool_size: int) -> requests.Session:
+    """Shared session: keep-alive connections are reused across requests to a host."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+async def fetch_all(urls: list[str], ua: str, timeout: int, pause_range: tuple[float, float],
+                    concurrency: int = 16, per_host: int = 1, retries: int = 0, backoff: float = 2.0,
+                    validators: list[dict | None] | None = None, spool_dir: str | None = None,
+                    backlog: asyncio.Semaphore | None = None):
+    """Fetch `urls` concurrently; yields (position, fetch() result) as each finishes.
+
+    At most `concurrency` requests run at once overall, and HostThrottle keeps
+    each host polite. A request only takes a global slot once its host is free.
+    Transient failures are retried up to `retries` times, waiting
+    backoff, 2*backoff, 4*backoff, ... seconds in between. `validators[i]`,
+    if given, makes the request for `urls[i]` conditional.
+
+    URLs are queued per host and worked off by up to `per_host` lanes per
+    host; at most LANES_PER_SLOT * `concurrency` lanes (tasks) exist at once,
+    however many URLs there are.
+
+    With `spool_dir`, the fetch thread writes the HTML to the spool and the
+    result carries the spool path in place of the HTML. With `backlog`, each
+    request takes a slot once its host slot is free (so a host sleeping out
+    its crawl delay holds none) and the consumer releases it once done with
+    the result, so fetching pauses while the consumer is behind.
+    """
+    throttle = HostThrottle(pause_range, per_host)
+    limit = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    queues: dict[str, deque[int]] = {}
+    for i, url in enumerate(urls):
+        queues.setdefault(urlparse(url).netloc.lower(), deque()).append(i)
+    # one ticket per lane to start: every host's first lane before any host's second
+    tickets = deque(host for k in range(per_host) for host, queue in queues.items() if len(queue) > k)
+    results: asyncio.Queue = asyncio.Queue()
+    lanes: set[asyncio.Task] = set()
+
+    with make_session(concurrency) as session, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        async def one(i: int, url: str, host: str):
+            reserved = backlog is None
+            for attempt in range(retries + 1):
+                if attempt:
+                    await asyncio.sleep(backoff * 2 ** (attempt - 1))
+                async with throttle.slot(host):
+                    if not reserved:
+                        await backlog.acquire()
+                        reserved = True
+                    async with limit:
+                        result = await loop.run_in_executor(
+                            pool, fetch, url, ua, timeout, session, validators[i] if validators else None
+                        )
+                if not is_transient(result[0], result[3]):
+                    break
+            status, final_url, html, err, headers = result
+            if spool_dir is not None and html:
+                html = await loop.run_in_executor(pool, spool_html, spool_dir, url, html)
+            return i, (status, final_url, html, err, headers)
+
+        async def lane(host: str) -> None:
+            queue = queues[host]
+            try:
+                while queue:
+                    i = queue.popleft()
+                    results.put_nowait(await one(i, urls[i], host))
+            except Exception as e:
+                results.put_nowait(e)
+
+        def start_lanes(_done: asyncio.Task | None = None) -> None:
+            if _done is not None:
+                lanes.discard(_done)
+            while tickets and len(lanes) < LANES_PER_SLOT * concurrency:
+                host = tickets.popleft()
+                if queues[host]:
+                    task = asyncio.create_task(lane(host))
+                    lanes.add(task)
+                    task.add_done_callback(start_lanes)
+
+        start_lanes()
+        try:
+            for _ in range(len(urls)):
+                item = await results.get()
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            tickets.clear()
+            for t in list(lanes):
+                t.cancel()
+
+# ---------- crawl state ----------
+SUMMARY_COLUMNS = ["row", "url", "final_url", "status", "error", "title", "text_file"]
+
+class CrawlState:
+    """SQLite crawl state for one output directory, keyed by safe_file_stem(url).
+
+    Each outcome is committed as soon as it is recorded, so a crash loses at
+    most the pages in flight. A page is done once it got a non-transient
+    response; failed pages are fetched again on the next run.
+    """
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS pages (
+                stem TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                final_url TEXT,
+                status INTEGER,
+                error TEXT,
+                title TEXT,
+                text_file TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                done INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL
+            )"""
+        )
+        # text_file_for() looks pages up by hash, record() by text file: keep both O(log n) per page
+        self.conn.execute("CREATE INDEX IF NOT EXISTS pages_content_hash ON pages (content_hash)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS pages_text_file ON pages (text_file)")
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def completed(self) -> set[str]:
+        return {stem for (stem,) in self.conn.execute("SELECT stem FROM pages WHERE done = 1")}
+
+    def validators(self) -> dict[str, dict]:
+        """ETag/Last-Modified of done pages whose text is still on disk (or that had none)."""
+        out = {}
+        for stem, etag, last_modified, text_file in self.conn.execute(
+            "SELECT stem, etag, last_modified, text_file FROM pages "
+            "WHERE done = 1 AND (etag IS NOT NULL OR last_modified IS NOT NULL)"
+        ):
+            if text_file is None or text_exists(text_file):
+                out[stem] = {"etag": etag, "last_modified": last_modified}
+        return out
+
+    def text_file_for(self, content_hash: str) -> str | None:
+        """An existing text file already holding text with this hash."""
+        for (text_file,) in self.conn.execute(
+            "SELECT text_file FROM pages WHERE content_hash = ? AND text_file IS NOT NULL", (content_hash,)
+        ):
+            if text_exists(text_file):
+                return text_file
+        return None
+
+    def unchanged(self, url: str) -> None:
+        """Record a 304: the stored outcome stays valid."""
+        self.conn.execute(
+            "UPDATE pages SET attempts = attempts + 1, updated_at = ? WHERE stem = ?",
+            (time.time(), safe_file_stem(url)),
+        )
+        self.conn.commit()
+
+    def record(self, url: str, final_url, status, error, title, text_file, validators: dict, content_hash) -> None:
+        self.conn.execute(
+            """INSERT INTO pages (stem, url, final_url, status, error, title, text_file,
+                                  etag, last_modified, content_hash, attempts, done, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?)
+               ON CONFLICT(stem) DO UPDATE SET
+                   url = excluded.url, final_url = excluded.final_url, status = excluded.status,
+                   error = excluded.error, title = excluded.title, text_file = excluded.text_file,
+                   etag = excluded.etag, last_modified = excluded.last_modified,
+                   content_hash = excluded.content_hash, attempts = pages.attempts + 1,
+                   done = excluded.done, updated_at = excluded.updated_at""",
+            (safe_file_stem(url), url, final_url, status, error, title, text_file,
+             validators.get("etag"), validators.get("last_modified"), content_hash,
+             int(not is_transient(status, error)), time.time()),
+        )
+        if text_file is not None:
+            # Pages linked to this file by hash no longer match it once it is rewritten: fetch them again
+            self.conn.execute(
+                "UPDATE pages SET done = 0 WHERE text_file = ? AND stem != ? AND content_hash IS NOT ?",
+                (text_file, safe_file_stem(url), content_hash),
+            )
+        self.conn.commit()
+
+    def summary(self, urls: list[tuple[int, str]]) -> list[dict]:
+        """scrape_summary.csv rows for (row, url) pairs, in input order; unrecorded URLs are left out."""
+        rows = {}
+        for stem, final_url, status, error, title, text_file in self.conn.execute(
+            "SELECT stem, final_url, status, error, title, text_file FROM pages"
+        ):
+            rows[stem] = {"final_url": final_url, "status": status, "error": error,
+                          "title": title, "text_file": text_file}
+        out = []
+        for row_idx, url in urls:
+            page = rows.get(safe_file_stem(url))
+            if page is not None:
+                out.append({"row": int(row_idx), "url": url, **page})
+        return out
 
 # ---------- core ----------
-def process_excel(excel_path: str, output_base: str, ua: str, timeout: int, pause_range: tuple[float, float]):
+async def scrape_urls(urls: list[tuple[int, str]], out_dir: str, ua: str, timeout: int,
+                      pause_range: tuple[float, float], state: CrawlState, concurrency: int = 16,
+                      per_host: int = 1, retries: int = 2, backoff: float = 2.0,
+                      revalidate: bool = False, max_chars: int | None = None,
+                      extractor: str = "auto", extract_workers: int = 0, queue_size: int = 256,
+                      store: str = "txt") -> list[dict]:
+    """Fetch (row, url) pairs not yet done in `state`, save visible text and record each outcome.
+
+    With `revalidate`, done pages are fetched again as conditional GETs; a 304
+    keeps the stored outcome without parsing. Text whose hash matches a text
+    file already on disk (a mirror or redirect target) is not written again:
+    the page's text_file points at the existing file. Title and text come
+    from one parse; with `max_chars` it stops after that many characters of
+    text (by default the full text is kept).
+
+    Fetching and extraction form a pipeline: fetch threads spool compressed
+    HTML to <out_dir>/_spool, and `extract_workers` processes (0 = this
+    process) turn spooled pages into text. At most `queue_size` fetched pages
+    wait for extraction; beyond that fetching pauses.
+
+    With store="pack", text goes to the city's compressed text pack
+    (text_pack.py) instead of one .txt file per page.
+
+    Returns the summary rows for all pairs, in input order, rebuilt from `state`.
+    """
+    completed = set() if revalidate else state.completed()
+    todo = list(dict.fromkeys(url for _, url in urls if safe_file_stem(url) not in completed))
+    if len(todo) < len(urls):
+        print(f"  {len(urls) - len(todo)} URL(s) already done, {len(todo)} to fetch.")
+    known = state.validators() if revalidate else {}
+
+    spool_dir = os.path.join(out_dir, "_spool")
+    ensure_dir(spool_dir)
+    backlog = asyncio.Semaphore(queue_size)
+    loop = asyncio.get_running_loop()
+    counts = {"done": 0, "unchanged": 0, "linked": 0}
+
+    async def finish(url: str, status, final_url, spooled, err, validators, extractors, pack) -> None:
+        try:
+            stem = safe_file_stem(url)
+            if status == 304 and stem in known:
+                state.unchanged(url)
+                counts["unchanged"] += 1
+                return
+
+            txt_path = os.path.join(out_dir, f"{stem}.txt")
+            title, text, content_hash = None, None, None
+            if err is None and status and spooled:
+                try:
+                    if extractors is None:
+                        title, text = extract_spooled(spooled, max_chars, extractor)
+                    else:
+                        title, text = await loop.run_in_executor(extractors, extract_spooled,
+                                                                 spooled, max_chars, extractor)
+                except Exception as e:  # recorded as a failure, so the page is fetched again next run
+                    err = f"extraction failed: {e!r}"
+                else:
+                    os.remove(spooled)
+                if text:
+                    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+                    existing = state.text_file_for(content_hash)
+                    if existing is not None:
+                        txt_path = existing
+                        counts["linked"] += existing != os.path.join(out_dir, f"{stem}.txt")
+                    elif pack is not None:
+                        txt_path = pack.add(stem, text, content_hash)
+                    else:
+                        with open(txt_path, "w", encoding="utf-8") as f:
+                            f.write(text)
+
+            state.record(url, final_url, status, err, title, txt_path if text else None, validators, content_hash)
+        finally:
+            counts["done"] += 1
+            print(f"  [{counts['done']}/{len(todo)}] {url}")
+            backlog.release()
+
+    extractors = ProcessPoolExecutor(max_workers=extract_workers) if extract_workers > 0 else None
+    pack = TextPackWriter(out_dir) if store == "pack" else None
+    pending = set()
+    try:
+        async for i, (status, final_url, spooled, err, validators) in fetch_all(
+            todo, ua, timeout, pause_range, concurrency, per_host, retries, backoff,
+            [known.get(safe_file_stem(url)) for url in todo], spool_dir, backlog,
+        ):
+            task = asyncio.create_task(finish(todo[i], status, final_url, spooled, err, validators,
+                                              extractors, pack))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        await asyncio.gather(*pending)
+    finally:
+        if extractors is not None:
+            extractors.shutdown(cancel_futures=True)
+        if pack is not None:
+            pack.close()
+    with contextlib.suppress(OSError):
+        os.rmdir(spool_dir)  # only once every spooled page was extracted
+
+    if counts["unchanged"] or counts["linked"]:
+        print(f"  {counts['unchanged']} unchanged (304), {counts['linked']} linked to identical text.")
+    return state.summary(urls)
+
+def process_excel(excel_path: str, output_base: str, ua: str, timeout: int, pause_range: tuple[float, float],
+                  concurrency: int = 16, per_host: int = 1, retries: int = 2, backoff: float = 2.0,
+                  fresh: bool = False, revalidate: bool = False, max_chars: int | None = None,
+                  extractor: str = "auto", extract_workers: int = 0, queue_size: int = 256,
+                  store: str = "txt"):
     city_name = pathlib.Path(excel_path).stem.replace("_results", "")
     out_dir = os.path.join(output_base, city_name)
     ensure_dir(out_dir)
     summary_csv = os.path.join(out_dir, "scrape_summary.csv")
+    state_db = os.path.join(out_dir, "crawl_state.sqlite")
+    if fresh:
+        for suffix in ("", "-wal", "-shm"):
+            pathlib.Path(state_db + suffix).unlink(missing_ok=True)
 
     # robust Excel load (keeps your previous behaviour)
     try:
@@ -68,38 +449,15 @@ def process_excel(excel_path: str, output_base: str, ua: str, timeout: int, paus
         return
 
     print(f"[{city_name}] {len(urls)} URL(s).")
-    summary = []
-
-    for i, (row_idx, url) in enumerate(urls, 1):
-        print(f"  [{i}/{len(urls)}] {url}")
-        status, final_url, html, err = fetch(url, ua=ua, timeout=timeout)
-
-        stem = safe_file_stem(url)
-        txt_path = os.path.join(out_dir, f"{stem}.txt")
-
-        title, text = None, None
-        if err is None and status and html:
-            soup = BeautifulSoup(html, "html.parser")
-            if soup.title and soup.title.string:
-                title = soup.title.string.strip()
-            text = extract_visible_text(html)
-            with open(txt_path, "w", encoding="utf-8") as f:
-                f.write(text)
-
-        summary.append(
-            {
-                "row": int(row_idx),
-                "url": url,
-                "final_url": final_url,
-                "status": status,
-                "error": err,
-                "title": title,
-                "text_file": txt_path if text else None,
-            }
-        )
-        time.sleep(random.uniform(*pause_range))
+    state = CrawlState(state_db)
+    try:
+        summary = asyncio.run(scrape_urls(urls, out_dir, ua, timeout, pause_range, state,
+                                          concurrency, per_host, retries, backoff, revalidate,
+                                          max_chars, extractor, extract_workers, queue_size, store))
+    finally:
+        state.close()
 
-    pd.DataFrame(summary).to_csv(summary_csv, index=False)
+    pd.DataFrame(summary, columns=SUMMARY_COLUMNS).to_csv(summary_csv, index=False)
     print(f"  ✓ Saved: {summary_csv}")
 
 def main():
@@ -113,8 +471,28 @@ def main():
                    help="Output directory for scraped text; defaults to <base-dir>/_scraped_text")
     # networking
     p.add_argument("--timeout", type=int, default=20, help="Request timeout (seconds)")
-    p.add_argument("--pause-min", type=float, default=1.0, help="Min pause between requests (s)")
-    p.add_argument("--pause-max", type=float, default=2.0, help="Max pause between requests (s)")
+    p.add_argument("--pause-min", type=float, default=1.0, help="Min pause between requests to one host (s)")
+    p.add_argument("--pause-max", type=float, default=2.0, help="Max pause between requests to one host (s)")
+    p.add_argument("--concurrency", type=int, default=16, help="Max requests in flight overall")
+    p.add_argument("--per-host", type=int, default=1, help="Max requests in flight per host")
+    p.add_argument("--retries", type=int, default=2, help="Retries per URL after a transient failure")
+    p.add_argument("--backoff", type=float, default=2.0, help="First retry delay (s); doubles per retry")
+    p.add_argument("--fresh", action="store_true",
+                   help="Ignore crawl_state.sqlite and fetch every URL again")
+    p.add_argument("--revalidate", action="store_true",
+                   help="Re-check done URLs with conditional GETs (If-None-Match/If-Modified-Since)")
+    # extraction
+    p.add_argument("--max-chars", type=int, default=0,
+                   help="Keep only the first N characters of page text; 0 (default) keeps everything. "
+                        f"The classifier reads the first {MAX_CHARS_DEFAULT} itself")
+    p.add_argument("--extractor", choices=["auto"] + available_backends(), default="auto",
+                   help="HTML-to-text backend (auto: lxml if installed, else stream)")
+    p.add_argument("--extract-workers", type=int, default=os.cpu_count() or 1,
+                   help="Processes turning spooled HTML into text; 0 extracts in the fetching process")
+    p.add_argument("--queue-size", type=int, default=256,
+                   help="Max fetched pages waiting for extraction before fetching pauses")
+    p.add_argument("--store", choices=["txt", "pack"], default="txt",
+                   help="Write one .txt per page, or a compressed pages.pack per city (see text_pack.py)")
     p.add_argument("--user-agent", type=str,
                    default=("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
                             "Python-requests/BS4 (CULTIVATE research; contact: hyunjicho@tcd.ie)"),
@@ -134,7 +512,10 @@ def main():
     print(f"Found {len(excel_files)} Excel file(s) in {base_dir}\n")
     for xlf in excel_files:
         print(f"Processing: {pathlib.Path(xlf).name}")
-        process_excel(xlf, str(output_base), args.user_agent, args.timeout, pause_range)
+        process_excel(xlf, str(output_base), args.user_agent, args.timeout, pause_range,
+                      args.concurrency, args.per_host, args.retries, args.backoff, args.fresh,
+                      args.revalidate, args.max_chars or None, args.extractor,
+                      args.extract_workers, args.queue_size, args.store)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,90 @@
+"""Tests for the single-pass HTML-to-text extractors against the BeautifulSoup reference."""
+
+from __future__ import annotations
+
+import random
+
+import pytest
+
+from html_text import available_backends, extract_page, get_extractor
+
+_TAGS = ["div", "p", "span", "a", "nav", "footer", "aside", "script", "style", "svg", "ul", "li", "h1", "noscript"]
+_WORDS = ["food", "sharing", "Fairteiler", "café", "&amp;", "&lt;x&gt;", "  ", "\n\n\n\n", "Über uns", "&nbsp;"]
+
+
+def _fragment(rng: random.Random, depth: int) -> str:
+    out = []
+    for _ in range(rng.randint(1, 4)):
+        r = rng.random()
+        if r < 0.4 or depth > 4:
+            out.append(" ".join(rng.choice(_WORDS) for _ in range(rng.randint(1, 6))))
+        elif r < 0.5:
+            out.append(rng.choice(["<br>", "<img src='x.png'>", "<!-- c -->", "<hr/>", "<path d='1'/>"]))
+        else:
+            tag = rng.choice(_TAGS)
+            if tag in ("script", "style"):
+                out.append(f"<{tag}>var x = '<p>'; {rng.choice(_WORDS)}</{tag}>")
+            else:
+                close = "" if rng.random() < 0.1 else f"</{tag}>"
+                out.append(f"<{tag} class='c'>{_fragment(rng, depth + 1)}{close}")
+    return "".join(out)
+
+
+def _pages(seed: int, n: int = 400) -> list[str]:
+    rng = random.Random(seed)
+    titles = ["", "<title>Food &amp; Co </title>", "<title></title>", "<title> </title>"]
+    return [
+        f"<!DOCTYPE html><html><head>{rng.choice(titles)}<meta charset='utf-8'></head>"
+        f"<body>{_fragment(rng, 0)}</body></html>"
+        for _ in range(n)
+    ]
+
+
+def test_stream_matches_bs4_exactly() -> None:
+    for html in _pages(seed=1):
+        assert extract_page(html, backend="stream") == extract_page(html, backend="bs4")
+
+
+@pytest.mark.parametrize("max_chars", [1, 10, 100])
+def test_budget_returns_the_same_prefix(max_chars: int) -> None:
+    for html in _pages(seed=2, n=200):
+        title, text = extract_page(html, backend="bs4")
+        assert extract_page(html, max_chars, backend="stream") == (title, text[:max_chars])
+
+
+def test_stream_stops_early_on_long_pages() -> None:
+    html = "<html><body>" + "<p>food sharing</p>" * 200_000 + "<p>END</p></body></html>"
+    title, text = extract_page(html, 1000, backend="stream")
+    assert title is None
+    assert len(text) == 1000
+    assert "END" not in text
+
+
+def test_hidden_subtrees_and_title() -> None:
+    html = (
+        "<html><head><title> Tafel e.V. </title><style>p{}</style></head><body>"
+        "<nav>Menu</nav><p>We share <b>food</b>.</p><svg><text>logo</text></svg>"
+        "<aside>ads</aside><footer>Impressum</footer><script>x()</script></body></html>"
+    )
+    assert extract_page(html, backend="stream") == ("Tafel e.V.", "Tafel e.V.\nWe share\nfood\n.")
+
+
+def test_unclosed_hidden_tag_is_closed_by_parent_end_tag() -> None:
+    html = "<div><nav>menu</div><p>visible</p>"
+    assert extract_page(html, backend="stream") == extract_page(html, backend="bs4") == (None, "visible")
+
+
+@pytest.mark.skipif("lxml" not in available_backends(), reason="lxml not installed")
+def test_lxml_matches_bs4_on_well_formed_pages() -> None:
+    html = (
+        "<!DOCTYPE html><html><head><title>Food &amp; Co</title></head><body><nav><a>Home</a></nav>"
+        "<div><h1>Community fridge</h1><p>Open daily<br>9&ndash;17</p><!-- x --><p>Bring &amp; take</p></div>"
+        "<footer>Imprint</footer></body></html>"
+    )
+    assert extract_page(html, backend="lxml") == extract_page(html, backend="bs4")
+    assert extract_page(html, 12, backend="lxml") == extract_page(html, 12, backend="bs4")
+
+
+def test_unknown_backend() -> None:
+    with pytest.raises(ValueError, match="Unknown extraction backend"):
+        get_extractor("regex")
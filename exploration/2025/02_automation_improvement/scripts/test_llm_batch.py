@@ -0,0 +1,119 @@
+"""Tests for batch-job classification, using the local folder backend."""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+
+import pytest
+
+from llm_batch import LocalBatchBackend, chunk_lines, parse_output_line, request_line, run_batches
+
+
+def _echo(body: dict) -> dict:
+    text = body["messages"][1]["content"].rsplit("TEXT:\n", 1)[1]
+    if text == "boom":
+        raise ValueError("model error")
+    content = json.dumps({"decision": "include", "confidence": 4, "organisation_name": text})
+    return {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]}
+
+
+def _lines(texts):
+    return [request_line(f"id{i}", "gpt-test", [{"role": "system", "content": "s"},
+                                               {"role": "user", "content": f"i\n\n---\nTEXT:\n{t}"}], 0.1)
+            for i, t in enumerate(texts)]
+
+
+def test_chunks_respect_request_and_byte_limits() -> None:
+    lines = ["x" * 9] * 5  # 10 bytes each with the newline
+    assert [len(c) for c in chunk_lines(lines, max_requests=2)] == [2, 2, 1]
+    assert [len(c) for c in chunk_lines(lines, max_bytes=30)] == [3, 2]
+    with pytest.raises(ValueError, match="batch limit"):
+        list(chunk_lines(["x" * 50], max_bytes=30))
+
+
+def test_parse_output_line_errors() -> None:
+    ok = {"custom_id": "a", "response": {"status_code": 200,
+                                         "body": {"choices": [{"message": {"content": '{"decision": "exclude"}'}}]}}}
+    assert parse_output_line(json.dumps(ok)) == ("a", {"decision": "exclude"}, None)
+    failed = {"custom_id": "b", "response": None, "error": {"code": "x", "message": "expired"}}
+    assert parse_output_line(json.dumps(failed)) == ("b", None, "expired")
+    garbled = {"custom_id": "c", "response": {"status_code": 200,
+                                              "body": {"choices": [{"message": {"content": "not json"}}]}}}
+    assert parse_output_line(json.dumps(garbled))[2].startswith("Unparseable")
+
+
+def test_run_batches_joins_results_across_chunks(tmp_path) -> None:
+    backend = LocalBatchBackend(tmp_path / "jobs", _echo)
+    out = list(run_batches(backend, _lines(["a", "boom", "c", "d", "e"]), tmp_path / "work", max_requests=2))
+
+    assert len(list((tmp_path / "jobs").iterdir())) == 3
+    by_id = {custom_id: (result, error) for custom_id, result, error in out}
+    assert by_id["id0"][0]["organisation_name"] == "a"
+    assert by_id["id4"][0]["organisation_name"] == "e"
+    assert by_id["id1"][0] is None and "model error" in by_id["id1"][1]
+
+
+def test_rerun_resumes_submitted_jobs(tmp_path) -> None:
+    backend = LocalBatchBackend(tmp_path / "jobs")  # no handler: jobs wait for output.jsonl
+    polls = []
+
+    def finish_jobs(seconds: float) -> None:
+        polls.append(seconds)
+        for job in (tmp_path / "jobs").iterdir():
+            LocalBatchBackend(tmp_path / "jobs", _echo).status(job.name)
+
+    out = list(run_batches(backend, _lines(["a", "b"]), tmp_path / "work", poll_interval=5, sleep=finish_jobs))
+    assert polls == [5] and len(out) == 2
+
+    submitted = []
+    backend.submit = submitted.append
+    again = run_batches(backend, _lines(["a", "b"]), tmp_path / "work")
+    assert sorted(result["organisation_name"] for _, result, _ in again) == ["a", "b"]
+    assert submitted == []
+
+
+def test_requests_missing_from_output_are_errors(tmp_path) -> None:
+    def expire_jobs(seconds: float) -> None:
+        for job in (tmp_path / "jobs").iterdir():
+            (job / "output.jsonl").write_text("", encoding="utf-8")
+
+    out = list(run_batches(LocalBatchBackend(tmp_path / "jobs"), _lines(["a", "b"]), tmp_path / "work",
+                           sleep=expire_jobs))
+    assert out == [("id0", None, "No output (batch completed)"), ("id1", None, "No output (batch completed)")]
+
+
+def test_classify_files_batch_joins_rows_by_url_id(tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    import analyse_fsi_filter_improved as analyse
+    from llm_cache import ResponseCache
+
+    files = []
+    for i, text in enumerate(["alpha", "", "beta", "alpha", "boom"]):
+        p = tmp_path / "cork" / f"h__{i}.txt"
+        p.parent.mkdir(exist_ok=True)
+        p.write_text(text, encoding="utf-8")
+        files.append(("cork", p.stem, p))
+
+    calls = []
+
+    def handler(body: dict) -> dict:
+        calls.append(body)
+        return _echo(body)
+
+    cache = ResponseCache(tmp_path / "cache.sqlite", "v1")
+    backend = LocalBatchBackend(tmp_path / "jobs", handler)
+    out = io.StringIO()
+    failed = analyse.classify_files_batch(files, backend, tmp_path / "work", 12000, csv.writer(out), cache)
+
+    rows = sorted(csv.reader(io.StringIO(out.getvalue())), key=lambda r: r[2])
+    assert failed == 1
+    assert [r[2] for r in rows] == ["h__0", "h__1", "h__2", "h__3"]
+    assert [r[5] for r in rows] == ["alpha", "", "beta", "alpha"]
+    assert len(calls) == 3  # duplicate text is sent once, the empty page not at all
+
+    # second run: everything but the failure comes from the cache
+    failed = analyse.classify_files_batch(files, backend, tmp_path / "work", 12000, csv.writer(io.StringIO()), cache)
+    assert failed == 1
+    assert len(calls) == 4
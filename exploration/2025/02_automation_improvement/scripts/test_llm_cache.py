@@ -0,0 +1,84 @@
+"""Tests for the persistent LLM response cache."""
+
+from __future__ import annotations
+
+import pytest
+
+from llm_cache import ResponseCache, cache_key, prompt_version
+
+
+def _key(text: str, **overrides) -> str:
+    parts = {"model": "gpt-test", "temperature": 0.1, "system": "system", "instructions": "instructions"}
+    parts.update(overrides)
+    return cache_key(text=text, **parts)
+
+
+def test_key_covers_every_input() -> None:
+    base = _key("page")
+    assert _key("page") == base
+    assert len({base, _key("other"), _key("page", model="gpt-other"), _key("page", temperature=0.0),
+                _key("page", system="x"), _key("page", instructions="x")}) == 6
+
+
+def test_hits_and_misses_are_counted(tmp_path) -> None:
+    cache = ResponseCache(tmp_path / "cache.sqlite", "v1")
+    assert cache.get(_key("page")) is None
+    cache.put(_key("page"), {"decision": "include", "reasons": ["café"]})
+    assert cache.get(_key("page")) == {"decision": "include", "reasons": ["café"]}
+
+    stats = cache.stats
+    assert (stats.hits, stats.misses, stats.size) == (1, 1, 1)
+    assert stats.hit_rate == 0.5
+
+
+def test_entries_persist_across_runs(tmp_path) -> None:
+    path = tmp_path / "cache.sqlite"
+    cache = ResponseCache(path, "v1")
+    cache.put(_key("page"), {"decision": "exclude"})
+    cache.close()
+
+    cache = ResponseCache(path, "v1")
+    assert len(cache) == 1
+    assert cache.get(_key("page")) == {"decision": "exclude"}
+
+
+def test_new_prompt_version_invalidates(tmp_path) -> None:
+    path = tmp_path / "cache.sqlite"
+    cache = ResponseCache(path, prompt_version("system", "instructions"))
+    cache.put(_key("page"), {"decision": "exclude"})
+    cache.close()
+
+    cache = ResponseCache(path, prompt_version("system", "new instructions"))
+    assert len(cache) == 0
+    assert cache.get(_key("page")) is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path) -> None:
+    cache = ResponseCache(tmp_path / "cache.sqlite", "v1", capacity=2)
+    cache.put(_key("a"), {"n": 1})
+    cache.put(_key("b"), {"n": 2})
+    cache.get(_key("a"))  # b is now the least recently used
+    cache.put(_key("c"), {"n": 3})
+
+    assert cache.get(_key("b")) is None
+    assert cache.get(_key("a")) == {"n": 1}
+    assert cache.get(_key("c")) == {"n": 3}
+    assert (cache.stats.size, cache.stats.evictions) == (2, 1)
+
+
+def test_capacity_is_applied_when_reopening_smaller(tmp_path) -> None:
+    path = tmp_path / "cache.sqlite"
+    cache = ResponseCache(path, "v1")
+    for text in "abcd":
+        cache.put(_key(text), {"text": text})
+    cache.close()
+
+    cache = ResponseCache(path, "v1", capacity=2)
+    assert len(cache) == 2
+    assert cache.get(_key("d")) == {"text": "d"}
+    assert cache.get(_key("a")) is None
+
+
+def test_capacity_must_be_positive(tmp_path) -> None:
+    with pytest.raises(ValueError, match="capacity"):
+        ResponseCache(tmp_path / "cache.sqlite", "v1", capacity=0)
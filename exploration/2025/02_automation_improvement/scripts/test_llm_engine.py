@@ -0,0 +1,330 @@
+"""Tests for the concurrent classification engine, against a local mock OpenAI-compatible server."""
+
+from __future__ import annotations
+
+import asyncio
+import csv
+import io
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from llm_engine import ClassificationEngine, RateLimiter, parse_pack_reply, retry_after
+from openai import AsyncOpenAI
+
+_LATENCY = 0.2
+
+
+class _MockOpenAI(BaseHTTPRequestHandler):
+    """POST /v1/chat/completions: echoes the page text back as the organisation name.
+
+    Packed requests get one result per document, except for url_ids in ``server.pack_drop``.
+    Texts in ``server.slow`` take five times as long; the first ``server.empty`` replies have no content.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self) -> None:
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = body["messages"][1]["content"]
+        docs = re.findall(r"=== url_id: (\S+) ===\n(.*?)(?=\n\n=== url_id|\Z)", prompt, re.S)
+        text = f"{len(docs)} docs" if docs else prompt.rsplit("TEXT:\n", 1)[1]
+        with server.lock:
+            server.calls.append(text)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            throttle = server.rate_limited > 0
+            server.rate_limited -= throttle
+            empty = not throttle and server.empty > 0
+            server.empty -= empty
+        try:
+            if throttle:
+                self._send(429, {"error": {"message": "rate limited", "type": "requests"}}, {"retry-after-ms": "50"})
+                return
+            time.sleep(_LATENCY * (5 if text in server.slow else 1))
+            content = json.dumps({"decision": "include", "confidence": 4, "organisation_name": text})
+            if empty:
+                content = None
+            elif docs:
+                content = json.dumps({"results": [
+                    {"url_id": doc_id, "decision": "include", "confidence": 4, "organisation_name": doc}
+                    for doc_id, doc in docs if doc_id not in server.pack_drop
+                ]})
+            self._send(200, {
+                "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120},
+            })
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _send(self, status: int, payload: dict, headers: dict | None = None) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def mock_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _MockOpenAI)
+    server.lock = threading.Lock()
+    server.calls, server.in_flight, server.max_in_flight, server.rate_limited = [], 0, 0, 0
+    server.pack_drop, server.slow, server.empty = set(), set(), 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _engine(server, **kwargs) -> ClassificationEngine:
+    client = AsyncOpenAI(api_key="test", base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", max_retries=0)
+    kwargs.setdefault("backoff_base", 0.05)
+    return ClassificationEngine(client, "gpt-test", "system", "instructions", **kwargs)
+
+
+async def _collect(engine, items):
+    return [item async for item in engine.classify_all(items)]
+
+
+async def _collect_all(engine, items):
+    return [item async for item in engine.classify_all(items, return_exceptions=True)]
+
+
+def test_requests_run_concurrently_up_to_the_limit(mock_server) -> None:
+    engine = _engine(mock_server, concurrency=4)
+    start = time.monotonic()
+    results = asyncio.run(_collect(engine, [(i, f"page {i}") for i in range(12)]))
+    elapsed = time.monotonic() - start
+
+    assert sorted(key for key, _ in results) == list(range(12))
+    assert all(result["organisation_name"] == f"page {key}" for key, result in results)
+    assert mock_server.max_in_flight == 4
+    assert elapsed < 12 * _LATENCY / 2
+
+
+def test_rate_limit_errors_are_retried_and_slow_the_limiter(mock_server) -> None:
+    mock_server.rate_limited = 3
+    engine = _engine(mock_server, concurrency=2)
+    results = asyncio.run(_collect(engine, [(i, f"page {i}") for i in range(4)]))
+
+    assert len(results) == 4
+    assert len(mock_server.calls) == 7
+    assert engine.limiter.scale < 1.0
+
+
+def test_failure_after_retries_is_raised(mock_server) -> None:
+    mock_server.rate_limited = 100
+    engine = _engine(mock_server, concurrency=1, max_retries=2, backoff_base=0.01)
+    with pytest.raises(RuntimeError, match="failed after 2 retries"):
+        asyncio.run(_collect(engine, [(0, "page")]))
+
+
+def test_empty_completions_are_retried(mock_server) -> None:
+    mock_server.empty = 1
+    engine = _engine(mock_server, concurrency=1, backoff_base=0.01)
+    results = asyncio.run(_collect(engine, [(0, "page")]))
+
+    assert results == [(0, {"decision": "include", "confidence": 4, "organisation_name": "page"})]
+    assert len(mock_server.calls) == 2
+
+
+def test_no_backoff_after_the_last_attempt(mock_server, monkeypatch) -> None:
+    mock_server.rate_limited = 100
+    engine = _engine(mock_server, concurrency=1, max_retries=3, backoff_base=0.01)
+    backoffs = []
+    monkeypatch.setattr(engine, "_backoff", lambda attempt: backoffs.append(attempt) or 0.0)
+    with pytest.raises(RuntimeError):
+        asyncio.run(_collect(engine, [(0, "page")]))
+    assert backoffs == [1, 2]
+
+
+def test_items_are_consumed_lazily(mock_server) -> None:
+    consumed = []
+
+    def items():
+        for i in range(10):
+            consumed.append(i)
+            yield i, f"page {i}"
+
+    async def first() -> int:
+        async for _ in _engine(mock_server, concurrency=2).classify_all(items()):
+            return len(consumed)
+
+    # each worker holds one finished and one new item if both finish before the first is read
+    assert asyncio.run(first()) <= 4
+
+
+def test_limiter_waits_for_request_budget(monkeypatch) -> None:
+    now = [0.0]
+    limiter = RateLimiter(rpm=60, tpm=1_000_000, clock=lambda: now[0])
+    slept = []
+
+    async def fake_sleep(seconds: float) -> None:
+        slept.append(seconds)
+        now[0] += seconds
+
+    async def run() -> None:
+        for _ in range(62):
+            await limiter.acquire(10)
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    asyncio.run(run())
+    # 60 requests fit in the initial bucket; each further one waits a second
+    assert slept == pytest.approx([1.0, 1.0])
+
+
+def test_limiter_penalty_and_recovery() -> None:
+    limiter = RateLimiter(rpm=100, tpm=10_000, recovery=0.25)
+    limiter.penalize()
+    limiter.penalize()
+    assert limiter.rpm == pytest.approx(25)
+    limiter.reward()
+    assert limiter.tpm == pytest.approx(5_000)
+    for _ in range(10):
+        limiter.reward()
+    assert limiter.scale == 1.0
+
+
+def test_retry_after_header() -> None:
+    class _Err(Exception):
+        class response:
+            headers = {"retry-after": "3"}
+
+    assert retry_after(_Err()) == 3.0
+    assert retry_after(ValueError()) is None
+
+
+def test_classify_files_writes_a_row_per_page(mock_server, tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    import analyse_fsi_filter_improved as analyse
+
+    files = []
+    for i, text in enumerate(["alpha", "", "gamma", "delta"]):
+        p = tmp_path / "cork" / f"h__{i}.txt"
+        p.parent.mkdir(exist_ok=True)
+        p.write_text(text, encoding="utf-8")
+        files.append(("cork", p.stem, p))
+
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(analyse.CSV_HEADER)
+    mock_server.slow = {"alpha"}
+    failed = asyncio.run(analyse.classify_files(files, _engine(mock_server, concurrency=3), 12000, writer))
+
+    rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+    # rows are written as they arrive, not held back behind the slow first page
+    assert rows[-1]["url_id"] == "h__0"
+    rows.sort(key=lambda r: r["url_id"])
+    assert [r["organisation_name"] for r in rows] == ["alpha", "", "gamma", "delta"]
+    assert rows[1]["decision"] == "exclude"
+    assert failed == 0
+    assert sorted(mock_server.calls) == ["alpha", "delta", "gamma"]
+
+
+def test_cached_results_skip_the_api(mock_server, tmp_path) -> None:
+    from llm_cache import ResponseCache
+
+    cache = ResponseCache(tmp_path / "cache.sqlite", "v1")
+    items = [(0, "alpha"), (1, "beta"), (2, "alpha"), (3, "alpha")]
+    first = asyncio.run(_collect(_engine(mock_server, concurrency=4, cache=cache), items))
+    # duplicates classified at the same time share one request
+    assert sorted(mock_server.calls) == ["alpha", "beta"]
+
+    second = asyncio.run(_collect(_engine(mock_server, concurrency=4, cache=cache), items))
+    assert len(mock_server.calls) == 2
+    assert sorted(first) == sorted(second)
+    assert cache.stats.hits == 4
+
+
+def test_failures_can_be_yielded_instead_of_raised(mock_server) -> None:
+    mock_server.rate_limited = 2
+    engine = _engine(mock_server, concurrency=1, max_retries=2, backoff_base=0.01)
+    results = dict(asyncio.run(_collect_all(engine, [(0, "bad"), (1, "good")])))
+
+    assert isinstance(results[0], RuntimeError)
+    assert results[1]["organisation_name"] == "good"
+
+
+def test_result_rows_keep_model_text_on_one_line(monkeypatch, tmp_path) -> None:
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    import analyse_fsi_filter_improved as analyse
+
+    result = {"decision": "include", "organisation_name": "Food\nHub", "evidence_quotes": ["a\r\nb", "c"],
+              "notes": "line one\nline two"}
+    row = analyse.result_row("cork", tmp_path / "h.txt", "h", result)
+    assert row[5] == "Food Hub"
+    assert row[-2:] == ["a b | c", "line one line two"]
+
+
+def test_classify_files_dead_letters_failures_and_carries_on(mock_server, tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    import analyse_fsi_filter_improved as analyse
+    from result_log import DeadLetterLog, ResultLog
+
+    files = []
+    for i, text in enumerate(["alpha", "beta"]):
+        p = tmp_path / "cork" / f"h__{i}.txt"
+        p.parent.mkdir(exist_ok=True)
+        p.write_text(text, encoding="utf-8")
+        files.append(("cork", p.stem, p))
+
+    mock_server.rate_limited = 2  # the first page exhausts its retries
+    engine = _engine(mock_server, concurrency=1, max_retries=2, backoff_base=0.01)
+    with ResultLog(tmp_path / "out.csv", analyse.CSV_HEADER) as log, \
+            DeadLetterLog(tmp_path / "failed.jsonl") as dead:
+        failed = asyncio.run(analyse.classify_files(files, engine, 12000, log, dead))
+        assert failed == 1
+        assert log.completed == {("cork", "h__1")}
+        assert dead.count == 1
+
+    with ResultLog(tmp_path / "out.csv", analyse.CSV_HEADER) as log:
+        todo = [f for f in files if (f[0], f[1]) not in log.completed]
+    assert [url_id for _, url_id, _ in todo] == ["h__0"]
+
+
+def test_short_texts_are_packed_into_one_request(mock_server) -> None:
+    engine = _engine(mock_server, concurrency=2, pack_tokens=100, pack_max_docs=3)
+    items = [(i, f"page {i}") for i in range(5)] + [(5, "long page " * 200)]
+    results = dict(asyncio.run(_collect(engine, items)))
+
+    assert sorted(mock_server.calls) == ["2 docs", "3 docs", "long page " * 200]
+    assert all(results[i]["organisation_name"] == f"page {i}" for i in range(5))
+    assert (engine.packed_requests, engine.packed_docs, engine.pack_fallbacks) == (2, 5, 0)
+
+
+def test_documents_missing_from_a_packed_reply_are_classified_alone(mock_server) -> None:
+    mock_server.pack_drop = {"b"}
+    engine = _engine(mock_server, concurrency=1, pack_tokens=100)
+    items = [("a", "page a"), ("b", "page b"), ("c", "page c")]
+    results = dict(asyncio.run(_collect(engine, items)))
+
+    assert {key: r["organisation_name"] for key, r in results.items()} == {"a": "page a", "b": "page b", "c": "page c"}
+    assert sorted(mock_server.calls) == ["3 docs", "page b"]
+    assert engine.pack_fallbacks == 1
+
+
+def test_parse_pack_reply_rejects_unknown_repeated_and_invalid_entries() -> None:
+    reply = {"results": [
+        {"url_id": "a", "decision": "include"},
+        {"url_id": "b", "decision": "maybe"},
+        {"url_id": "c", "decision": "exclude"},
+        {"url_id": "c", "decision": "include"},
+        {"url_id": "zzz", "decision": "exclude"},
+        "junk",
+    ]}
+    assert parse_pack_reply(reply, ["a", "b", "c"]) == {"a": {"decision": "include"}}
+    assert parse_pack_reply([{"url_id": "a"}], ["a"]) == {}
@@ -0,0 +1,80 @@
+"""Tests for token-budgeted classifier samples."""
+
+from __future__ import annotations
+
+import pytest
+
+from page_sample import GAP, PageSampler, available_tokenizers, get_tokenizer, keyword_hits
+
+NAV = "Home\nAbout us\nContact\nCookie settings"
+
+
+def _sampler(**kwargs) -> PageSampler:
+    kwargs.setdefault("tokenizer", "regex")
+    return PageSampler(**kwargs)
+
+
+def test_site_boilerplate_and_repeated_lines_are_dropped() -> None:
+    pages = [
+        ("example.org__1", f"{NAV}\nWe run a community fridge.\nOpen daily."),
+        ("example.org__2", f"{NAV}\nOur volunteers cook free meals."),
+        ("other.org__1", f"{NAV}\nSeed library."),
+    ]
+    sampler = _sampler().fit(pages)
+
+    assert sampler.sample("example.org__1", pages[0][1] + "\nOpen daily.") == "We run a community fridge.\nOpen daily."
+    # a single page from another site has nothing to compare against
+    assert sampler.sample("other.org__1", pages[2][1]).startswith("Home")
+    assert sampler.stats.boilerplate_lines == 4
+
+
+def test_identical_pages_keep_their_text() -> None:
+    text = "Food bank\nOpening hours"
+    sampler = _sampler().fit([("a.org__1", text), ("a.org__2", text)])
+    assert sampler.sample("a.org__1", text) == text
+
+
+def test_long_pages_keep_first_and_relevant_chunks_within_budget() -> None:
+    intro = "Welcome to Stadtteil e.V."
+    filler = [f"Opening statement number {i} about parking and local history." for i in range(40)]
+    relevant = "Our food sharing fridge redistributes surplus food; volunteers donate meals."
+    text = "\n".join([intro, *filler[:20], relevant, *filler[20:]])
+    sampler = _sampler(budget=60, chunk_tokens=20)
+
+    sample = sampler.sample("x.org__1", text)
+    count = get_tokenizer("regex")
+    assert count(sample) <= 60
+    assert sample.startswith(intro)
+    assert relevant in sample
+    assert GAP in sample
+    assert sampler.stats.saved_per_page > 0
+
+
+def test_first_chunk_is_cut_to_fit_rather_than_left_out() -> None:
+    intro = "Stadtteil " + " ".join(f"intro{i}" for i in range(22))
+    relevant = "food sharing volunteers donate surplus meals"
+    history = " ".join(f"history{i}" for i in range(17))
+    # the first chunk alone is over budget, the relevant one would fit
+    sample = _sampler(budget=30, chunk_tokens=40).sample("x.org__1", "\n".join([intro, relevant, history]))
+    assert sample.startswith("Stadtteil intro0")
+    assert get_tokenizer("regex")(sample) <= 30
+
+
+def test_overlong_lines_are_split_into_chunks() -> None:
+    line = " ".join(["word"] * 500) + " food bank volunteers"
+    sample = _sampler(budget=50, chunk_tokens=20).sample("x.org__1", line)
+    assert get_tokenizer("regex")(sample) <= 50
+
+
+def test_keyword_hits_match_word_starts() -> None:
+    assert keyword_hits("Foodsharing und Lebensmittel teilen") == 3
+    assert keyword_hits("seafood") == 0
+
+
+def test_tokenizer_selection() -> None:
+    assert "regex" in available_tokenizers()
+    assert get_tokenizer("regex")("Hello, world!") == 4
+    with pytest.raises(ValueError, match="Unknown tokenizer"):
+        get_tokenizer("nope")
+    with pytest.raises(ValueError, match="budget"):
+        PageSampler(budget=0, tokenizer="regex")
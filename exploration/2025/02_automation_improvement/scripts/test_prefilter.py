@@ -0,0 +1,133 @@
+"""Tests for the pre-filter cascade."""
+
+from __future__ import annotations
+
+import pandas as pd
+import pytest
+
+from prefilter import Decision, Prefilter, blocked_category, evaluate, host_of, load_reference, split_by_host
+from second_filtering import safe_file_stem
+
+FSI_TEXT = ("Our community fridge shares surplus food every day. Volunteers collect donations from local "
+            "shops and cook free meals for the neighbourhood. Join our food sharing garden and seed library. ")
+NEWS_TEXT = ("News article published by our editor. Subscribe to the newsletter for more news. The reporter "
+             "visited a food bank; comments are open below this article. Posted by the editorial team. ")
+SHOP_TEXT = ("Add to cart. Checkout. Shop our menu, prices from €9, delivery and reservation online. "
+             "Book a table at our restaurant. Shop gift cards, price list and delivery areas. ")
+
+
+def _reference(n: int = 12) -> pd.DataFrame:
+    rows = []
+    for i in range(n):
+        for kind, text, valid, category in [
+            ("fsi", FSI_TEXT, True, "VALID"),
+            ("news", NEWS_TEXT, False, "FP_MEDIA"),
+            ("shop", SHOP_TEXT, False, "FP_COMMERCIAL"),
+        ]:
+            url = f"https://www.{kind}{i}.org/page"
+            rows.append({"url": url, "url_id": safe_file_stem(url), "text": text * 3,
+                         "is_valid": valid, "fp_category": category})
+    return pd.DataFrame(rows)
+
+
+def test_host_of_urls_and_url_ids() -> None:
+    assert host_of("https://www.Example.org:8080/a?b") == "example.org"
+    assert host_of(safe_file_stem("http://example.org:8080/x")) == "example.org"
+    assert host_of("example.org__abc123") == "example.org"
+
+
+def test_blocklist_covers_subdomains_and_government_hosts() -> None:
+    blocklist = {"irishtimes.com": "FP_MEDIA"}
+    assert blocked_category("food.irishtimes.com", blocklist) == "FP_MEDIA"
+    assert blocked_category("comune.milano.it", blocklist) == "FP_GOVERNMENT"
+    assert blocked_category("citizensinformation.gov.ie", blocklist) == "FP_GOVERNMENT"
+    assert blocked_category("cityharvest.org", blocklist) is None
+
+
+def test_learned_blocklist_only_takes_hosts_without_valid_pages() -> None:
+    ref = pd.DataFrame({
+        "url": ["https://news.ie/a", "https://news.ie/b", "https://mixed.org/a", "https://mixed.org/b",
+                "https://gone.org/"],
+        "fp_category": ["FP_MEDIA", "FP_MEDIA", "FP_MEDIA", "VALID", "FP_BROKEN_LINK"],
+    })
+    blocklist = Prefilter.learn_blocklist(ref)
+    assert blocklist["news.ie"] == "FP_MEDIA"
+    assert "mixed.org" not in blocklist and "gone.org" not in blocklist
+    assert blocklist["gofundme.com"] == "FP_FUNDRAISING"
+
+
+def test_cascade_decides_obvious_cases_and_escalates_the_rest(tmp_path) -> None:
+    prefilter = Prefilter(blocklist={}).fit(_reference())
+    assert prefilter.decide("x.org__1", "Error 404: page not found").decision == "exclude"
+    assert prefilter.decide("gofundme.com__1", FSI_TEXT * 3).decision == "exclude"
+    assert prefilter.decide("new.org__1", NEWS_TEXT * 3).decision == "exclude"
+    assert prefilter.decide("new.org__2", FSI_TEXT * 3).decision is None
+
+    prefilter.save(tmp_path / "prefilter.json")
+    loaded = Prefilter.load(tmp_path / "prefilter.json")
+    assert loaded.score("new.org", FSI_TEXT * 3) == pytest.approx(prefilter.score("new.org", FSI_TEXT * 3))
+
+
+def test_confidence_follows_the_rule_or_model_score() -> None:
+    assert Decision("exclude", "FP_BROKEN_LINK: empty page").confidence == 5
+    assert Decision("exclude", "keyword model score 0.010 < 0.05", 0.01).confidence == 5
+    assert Decision("exclude", "keyword model score 0.200 < 0.3", 0.2).confidence == 3
+    assert Decision("include", "keyword model score 0.600 > 0.55", 0.6).confidence == 2
+
+
+def test_split_keeps_hosts_on_one_side_and_evaluation_reports_thresholds() -> None:
+    ref = _reference()
+    train, test = split_by_host(ref, holdout=0.3)
+    assert not set(train["url"].map(host_of)) & set(test["url"].map(host_of))
+
+    report = evaluate(Prefilter(blocklist={}).fit(train), test, thresholds=(0.0, 0.5))
+    assert list(report["exclude_below"]) == [0.0, 0.5]
+    assert report.loc[1, "exclude_precision"] == 1.0
+    assert report.loc[1, "exclude_recall"] == 1.0
+    assert report.loc[1, "valid_lost"] == 0
+    assert report.loc[0, "local_share"] == 0.0
+
+
+def test_load_reference_joins_verified_urls_to_scraped_text(tmp_path) -> None:
+    urls = ["https://fridge.org/", "https://paper.ie/story", "https://elsewhere.com/", "https://dup.org/"]
+    pd.DataFrame({
+        "url": urls,
+        "is_valid": [True, False, False, False],
+        "fp_category": ["VALID", "FP_MEDIA", "FP_MEDIA", "FP_DUPLICATE"],
+    }).to_excel(tmp_path / "results.xlsx", sheet_name="All URLs", index=False)
+    (tmp_path / "txt" / "cork").mkdir(parents=True)
+    for url in urls[:2] + urls[3:]:
+        (tmp_path / "txt" / "cork" / f"{safe_file_stem(url)}.txt").write_text(f"text of {url}", encoding="utf-8")
+
+    ref = load_reference(tmp_path / "results.xlsx", tmp_path / "txt")
+    assert list(ref["url"]) == urls[:2]
+    assert list(ref["text"]) == [f"text of {u}" for u in urls[:2]]
+
+
+def test_classifier_skips_pages_decided_locally(tmp_path, monkeypatch) -> None:
+    import csv
+    import io
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    import analyse_fsi_filter_improved as analyse
+    from llm_batch import LocalBatchBackend
+    from test_llm_batch import _echo
+
+    files = []
+    for url_id, text in [("fridge.org__1", FSI_TEXT * 3), ("gofundme.com__1", FSI_TEXT * 3), ("x.org__1", "404")]:
+        p = tmp_path / "cork" / f"{url_id}.txt"
+        p.parent.mkdir(exist_ok=True)
+        p.write_text(text, encoding="utf-8")
+        files.append(("cork", url_id, p))
+
+    sent = []
+    backend = LocalBatchBackend(tmp_path / "jobs", lambda body: sent.append(body) or _echo(body))
+    out = io.StringIO()
+    analyse.classify_files_batch(files, backend, tmp_path / "work", 12000, csv.writer(out),
+                                 prefilter=Prefilter())
+
+    rows = {r[2]: r for r in csv.reader(io.StringIO(out.getvalue()))}
+    assert len(sent) == 1
+    assert rows["gofundme.com__1"][3] == "exclude" and "Pre-filter" in rows["gofundme.com__1"][9]
+    assert rows["x.org__1"][3] == "exclude"
+    assert rows["gofundme.com__1"][4] == "5"
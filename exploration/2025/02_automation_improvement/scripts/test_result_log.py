@@ -0,0 +1,74 @@
+"""Tests for the append-only result and dead-letter logs."""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from result_log import DeadLetterLog, ResultLog
+
+HEADER = ["city", "file", "url_id", "decision"]
+
+
+def test_rows_are_appended_and_completed_on_reopen(tmp_path) -> None:
+    path = tmp_path / "out" / "results.csv"
+    with ResultLog(path, HEADER) as log:
+        log.writerow(["cork", "a.txt", "a", "include"])
+        assert log.completed == {("cork", "a")}
+
+    with ResultLog(path, HEADER) as log:
+        assert log.completed == {("cork", "a")}
+        log.writerow(["cork", "b.txt", "b", "exclude"])
+
+    assert path.read_text(encoding="utf-8").splitlines() == [
+        "city,file,url_id,decision", "cork,a.txt,a,include", "cork,b.txt,b,exclude",
+    ]
+
+
+def test_torn_last_line_is_dropped(tmp_path) -> None:
+    path = tmp_path / "results.csv"
+    path.write_text("city,file,url_id,decision\ncork,a.txt,a,include\ncork,b.t", encoding="utf-8")
+    with ResultLog(path, HEADER) as log:
+        assert log.completed == {("cork", "a")}
+        log.writerow(["cork", "b.txt", "b", "exclude"])
+    assert path.read_text(encoding="utf-8").endswith("include\ncork,b.txt,b,exclude\n")
+
+
+def test_record_torn_inside_a_multi_line_field_is_dropped(tmp_path) -> None:
+    path = tmp_path / "results.csv"
+    with ResultLog(path, HEADER) as log:
+        log.writerow(["cork", "a.txt", "a", "include\nsecond line"])
+        log.writerow(["cork", "b.txt", "b", "exclude\nnotes cut here\nand here"])
+    data = path.read_bytes()
+    path.write_bytes(data[: data.index(b"notes cut here") + len(b"notes cut here\r\n")])
+
+    with ResultLog(path, HEADER) as log:
+        assert log.completed == {("cork", "a")}
+        log.writerow(["cork", "c.txt", "c", "include"])
+        log.writerow(["cork", "d.txt", "d", "exclude"])
+    with ResultLog(path, HEADER) as log:
+        assert log.completed == {("cork", "a"), ("cork", "c"), ("cork", "d")}
+
+
+def test_other_header_is_refused_unless_fresh(tmp_path) -> None:
+    path = tmp_path / "results.csv"
+    path.write_text("something,else\n1,2\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="different header"):
+        ResultLog(path, HEADER)
+    with ResultLog(path, HEADER, fresh=True) as log:
+        assert log.completed == set()
+    assert path.read_text(encoding="utf-8") == "city,file,url_id,decision\n"
+
+
+def test_dead_letters_are_appended(tmp_path) -> None:
+    path = tmp_path / "failed.jsonl"
+    with DeadLetterLog(path) as dead:
+        dead.add(RuntimeError("gave up"), city="cork", url_id="a")
+    with DeadLetterLog(path) as dead:
+        dead.add("HTTP 500", city="cork", url_id="b")
+        assert dead.count == 1
+
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [(r["url_id"], r["error"]) for r in records] == [("a", "gave up"), ("b", "HTTP 500")]
+    assert records[0]["error_type"] == "RuntimeError"
@@ -0,0 +1,354 @@
+"""Tests for the concurrent scraper, run against local stand-in HTTP servers."""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+from second_filtering import (
+    MAX_CHARS_DEFAULT,
+    CrawlState,
+    HostThrottle,
+    fetch_all,
+    process_excel,
+    safe_file_stem,
+)
+from text_pack import read_text
+
+_DELAY = 0.2
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        self.server.hits.append((self.path, time.monotonic()))
+        if self.path.startswith("/cached"):
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.send_header("ETag", '"v1"')
+                self.end_headers()
+                return
+            body, status = b"<html><head><title>cached</title></head><body>same page</body></html>", 200
+        elif self.path.startswith("/mirror"):
+            body, status = b"<html><head><title>mirror</title></head><body>shared text</body></html>", 200
+        elif self.path.startswith("/long"):
+            body, status = f"<html><body><p>{'food sharing ' * 2000}</p></body></html>".encode(), 200
+        elif self.path.startswith("/missing"):
+            body, status = b"nope", 404
+        elif self.path.startswith("/down") or (
+            self.path.startswith("/flaky") and sum(p == self.path for p, _ in self.server.hits) <= 2
+        ):
+            body, status = b"busy", 503
+        else:
+            time.sleep(_DELAY)
+            page = self.path.strip("/")
+            body = f"<html><head><title>{page}</title></head><body><nav>menu</nav><p>text {page}</p></body></html>"
+            body, status = body.encode(), 200
+        self.send_response(status)
+        if self.path.startswith("/cached"):
+            self.send_header("ETag", '"v1"')
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def servers():
+    """Two local servers on different ports, i.e. two hosts."""
+    running = []
+    for _ in range(2):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        server.hits = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        running.append(server)
+    yield running
+    for server in running:
+        server.shutdown()
+        server.server_close()
+
+
+def _base(server) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+async def _collect(urls, **kwargs):
+    return [item async for item in fetch_all(urls, "test-agent", 5, **kwargs)]
+
+
+def test_fetch_all_returns_every_url_once(servers) -> None:
+    urls = [f"{_base(servers[i % 2])}/p{i}" for i in range(8)] + [f"{_base(servers[0])}/missing"]
+    results = asyncio.run(_collect(urls, pause_range=(0.0, 0.0), concurrency=4, per_host=2))
+
+    assert sorted(i for i, _ in results) == list(range(len(urls)))
+    by_pos = dict(results)
+    assert by_pos[0][0] == 200 and "text p0" in by_pos[0][2]
+    assert by_pos[len(urls) - 1][0] == 404
+
+
+def test_hosts_are_fetched_in_parallel_but_each_host_is_spaced(servers) -> None:
+    pause = 0.3
+    urls = [f"{_base(s)}/p{i}" for i in range(3) for s in servers]
+    start = time.monotonic()
+    asyncio.run(_collect(urls, pause_range=(pause, pause), concurrency=8, per_host=1))
+    elapsed = time.monotonic() - start
+
+    for server in servers:
+        times = sorted(t for _, t in server.hits)
+        assert len(times) == 3
+        # Next request starts only after the previous one finished plus the pause
+        assert all(b - a >= _DELAY + pause - 0.05 for a, b in itertools.pairwise(times))
+    # Serial fetching with a pause after each request would take 6 * (delay + pause)
+    assert elapsed < 6 * (_DELAY + pause) * 0.75
+
+
+def test_global_concurrency_limit(servers) -> None:
+    urls = [f"{_base(servers[0])}/p{i}" for i in range(6)]
+    start = time.monotonic()
+    asyncio.run(_collect(urls, pause_range=(0.0, 0.0), concurrency=2, per_host=6))
+    assert time.monotonic() - start >= 3 * _DELAY - 0.05
+
+
+def test_throttle_reserves_spacing_for_parallel_slots() -> None:
+    throttle = HostThrottle((0.1, 0.1), per_host=3)
+    starts = []
+
+    async def enter() -> None:
+        async with throttle.slot("example.org"):
+            starts.append(time.monotonic())
+
+    async def run() -> None:
+        await asyncio.gather(*(enter() for _ in range(3)))
+
+    asyncio.run(run())
+    starts.sort()
+    assert all(b - a >= 0.09 for a, b in itertools.pairwise(starts))
+
+
+def test_process_excel_output_layout(servers, tmp_path) -> None:
+    urls = [f"{_base(servers[0])}/a", f"{_base(servers[1])}/b", f"{_base(servers[0])}/missing", "not a url"]
+    excel = tmp_path / "cork_results.xlsx"
+    pd.DataFrame({"URL": urls}).to_excel(excel, index=False)
+
+    process_excel(str(excel), str(tmp_path / "out"), "test-agent", 5, (0.0, 0.0), concurrency=4)
+
+    out_dir = tmp_path / "out" / "cork"
+    summary = pd.read_csv(out_dir / "scrape_summary.csv")
+    assert list(summary.columns) == ["row", "url", "final_url", "status", "error", "title", "text_file"]
+    assert summary["row"].tolist() == [0, 1, 2]
+    assert summary["title"].tolist()[:2] == ["a", "b"]
+    assert summary["status"].tolist() == [200, 200, 404]
+
+    text_file = summary.loc[0, "text_file"]
+    assert os.path.basename(text_file) == f"{safe_file_stem(urls[0])}.txt"
+    with open(text_file, encoding="utf-8") as f:
+        assert f.read() == "a\ntext a"
+
+
+def test_transient_failures_are_retried_with_backoff(servers) -> None:
+    urls = [f"{_base(servers[0])}/flaky", f"{_base(servers[0])}/missing"]
+    results = dict(asyncio.run(_collect(urls, pause_range=(0.0, 0.0), retries=2, backoff=0.1)))
+
+    assert results[0][0] == 200
+    assert results[1][0] == 404
+    flaky = [t for p, t in servers[0].hits if p == "/flaky"]
+    assert len(flaky) == 3
+    assert flaky[2] - flaky[1] >= 0.2 - 0.05
+    assert sum(p == "/missing" for p, _ in servers[0].hits) == 1
+
+
+def test_rerun_skips_done_urls_and_retries_failures(servers, tmp_path) -> None:
+    urls = [f"{_base(servers[0])}/a", f"{_base(servers[1])}/down", f"{_base(servers[0])}/missing"]
+    excel = tmp_path / "cork_results.xlsx"
+    pd.DataFrame({"URL": urls}).to_excel(excel, index=False)
+    out_dir = tmp_path / "out" / "cork"
+
+    process_excel(str(excel), str(tmp_path / "out"), "test-agent", 5, (0.0, 0.0), retries=0)
+    first = pd.read_csv(out_dir / "scrape_summary.csv")
+    assert first["status"].tolist() == [200, 503, 404]
+
+    for server in servers:
+        server.hits.clear()
+    process_excel(str(excel), str(tmp_path / "out"), "test-agent", 5, (0.0, 0.0), retries=0)
+
+    assert servers[0].hits == []
+    assert [p for p, _ in servers[1].hits] == ["/down"]
+    pd.testing.assert_frame_equal(pd.read_csv(out_dir / "scrape_summary.csv"), first)
+
+    state = CrawlState(str(out_dir / "crawl_state.sqlite"))
+    try:
+        attempts = dict(state.conn.execute("SELECT url, attempts FROM pages"))
+        content_hash = state.conn.execute("SELECT content_hash FROM pages WHERE url = ?", (urls[0],)).fetchone()[0]
+    finally:
+        state.close()
+    assert attempts == {urls[0]: 1, urls[1]: 2, urls[2]: 1}
+    assert content_hash is not None
+
+
+def test_summary_is_rebuilt_after_a_crash(servers, tmp_path) -> None:
+    urls = [f"{_base(servers[0])}/a", f"{_base(servers[1])}/b"]
+    excel = tmp_path / "cork_results.xlsx"
+    pd.DataFrame({"URL": urls}).to_excel(excel, index=False)
+    out_dir = tmp_path / "out" / "cork"
+    out_dir.mkdir(parents=True)
+
+    # A crashed run left one page in the state store and no summary
+    state = CrawlState(str(out_dir / "crawl_state.sqlite"))
+    state.record(urls[0], urls[0], 200, None, "a", None, {"etag": '"x"'}, None)
+    state.close()
+
+    process_excel(str(excel), str(tmp_path / "out"), "test-agent", 5, (0.0, 0.0))
+
+    assert servers[0].hits == []
+    summary = pd.read_csv(out_dir / "scrape_summary.csv")
+    assert summary["url"].tolist() == urls
+    assert summary["title"].tolist() == ["a", "b"]
+
+
+def test_revalidate_sends_validators_and_keeps_304_pages(servers, tmp_path) -> None:
+    urls = [f"{_base(servers[0])}/cached", f"{_base(servers[1])}/b"]
+    excel = tmp_path / "cork_results.xlsx"
+    pd.DataFrame({"URL": urls}).to_excel(excel, index=False)
+    out_dir = tmp_path / "out" / "cork"
+
+    process_excel(str(excel), str(tmp_path / "out"), "test-agent", 5, (0.0, 0.0))
+    first = pd.read_csv(out_dir / "scrape_summary.csv")
+    text_file = first.loc[0, "text_file"]
+    mtime = os.path.getmtime(text_file)
+
+    for server in servers:
+        server.hits.clear()
+    process_excel(str(excel), str(tmp_path / "out"), "test-agent", 5, (0.0, 0.0), revalidate=True)
+
+    # Both pages are asked again; /b has no validators and is fetched normally
+    assert [p for p, _ in servers[0].hits] == ["/cached"]
+    assert [p for p, _ in servers[1].hits] == ["/b"]
+    assert os.path.getmtime(text_file) == mtime
+    pd.testing.assert_frame_equal(pd.read_csv(out_dir / "scrape_summary.csv"), first)
+
+
+def test_identical_text_is_linked_not_rewritten(servers, tmp_path) -> None:
+    urls = [f"{_base(servers[0])}/mirror-a", f"{_base(servers[1])}/mirror-b", f"{_base(servers[0])}/a"]
+    excel = tmp_path / "cork_results.xlsx"
+    pd.DataFrame({"URL": urls}).to_excel(excel, index=False)
+    out_dir = tmp_path / "out" / "cork"
+
+    process_excel(str(excel), str(tmp_path / "out"), "test-agent", 5, (0.0, 0.0), concurrency=1)
+
+    summary = pd.read_csv(out_dir / "scrape_summary.csv")
+    assert summary.loc[0, "text_file"] == summary.loc[1, "text_file"]
+    assert summary.loc[2, "text_file"] != summary.loc[0, "text_file"]
+    assert len(list(out_dir.glob("*.txt"))) == 2
+
+
+def test_extractor_processes_and_bounded_queue(servers, tmp_path) -> None:
+    urls = [f"{_base(servers[i % 2])}/p{i}" for i in range(6)] + [f"{_base(servers[0])}/missing"]
+    excel = tmp_path / "cork_results.xlsx"
+    pd.DataFrame({"URL": urls}).to_excel(excel, index=False)
+
+    process_excel(str(excel), str(tmp_path / "a"), "test-agent", 5, (0.0, 0.0), concurrency=4)
+    process_excel(str(excel), str(tmp_path / "b"), "test-agent", 5, (0.0, 0.0), concurrency=4,
+                  extract_workers=2, queue_size=1)
+
+    inline = pd.read_csv(tmp_path / "a" / "cork" / "scrape_summary.csv")
+    pooled = pd.read_csv(tmp_path / "b" / "cork" / "scrape_summary.csv")
+    pd.testing.assert_frame_equal(inline.drop(columns="text_file"), pooled.drop(columns="text_file"))
+    assert pooled["title"].tolist()[:6] == [f"p{i}" for i in range(6)]
+    assert not (tmp_path / "b" / "cork" / "_spool").exists()
+
+
+def test_backlog_pauses_fetching_until_results_are_released(servers, tmp_path) -> None:
+    urls = [f"{_base(servers[i % 2])}/p{i}" for i in range(4)]
+
+    async def run() -> list[str]:
+        backlog = asyncio.Semaphore(2)
+        spooled = []
+        async for _, (_, _, path, _, _) in fetch_all(
+            urls, "test-agent", 5, (0.0, 0.0), concurrency=4, per_host=4,
+            spool_dir=str(tmp_path), backlog=backlog,
+        ):
+            spooled.append(path)
+            if len(spooled) == 2:
+                await asyncio.sleep(3 * _DELAY)
+                # Nothing released yet: the other two requests have not started
+                assert sum(len(s.hits) for s in servers) == 2
+                for _ in range(2):
+                    backlog.release()
+        return spooled
+
+    spooled = asyncio.run(run())
+    assert len(spooled) == 4
+    assert all(path.endswith(".html.gz") and os.path.exists(path) for path in spooled)
+
+
+def test_backlog_slots_are_not_held_through_a_hosts_crawl_delay(servers) -> None:
+    busy, other = _base(servers[0]), _base(servers[1])
+    urls = [f"{busy}/a{i}" for i in range(4)] + [f"{other}/b{i}" for i in range(2)]
+
+    async def run() -> None:
+        backlog = asyncio.Semaphore(2)
+        async for _ in fetch_all(urls, "test-agent", 5, (0.3, 0.3), concurrency=4, per_host=1, backlog=backlog):
+            backlog.release()
+
+    start = time.monotonic()
+    asyncio.run(run())
+    # The other host starts at once instead of queueing behind the busy host's sleepers
+    assert min(t for _, t in servers[1].hits) - start < _DELAY
+
+
+def test_lanes_are_created_lazily(servers) -> None:
+    urls = [f"{_base(servers[i % 2])}/missing{i}" for i in range(40)]
+
+    async def run() -> int:
+        most = 0
+        async for _ in fetch_all(urls, "test-agent", 5, (0.0, 0.0), concurrency=1, per_host=1):
+            most = max(most, len(asyncio.all_tasks()))
+        return most
+
+    # one lane per host (and the running task), not one task per URL
+    assert asyncio.run(run()) <= 3
+
+
+def test_crawl_state_indexes_lookup_columns(tmp_path) -> None:
+    state = CrawlState(str(tmp_path / "state.sqlite"))
+    indexed = {name for (name,) in state.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    state.close()
+    assert {"pages_content_hash", "pages_text_file"} <= indexed
+
+
+def test_full_page_text_is_stored_by_default(servers, tmp_path) -> None:
+    excel = tmp_path / "cork_results.xlsx"
+    pd.DataFrame({"URL": [f"{_base(servers[0])}/long"]}).to_excel(excel, index=False)
+
+    process_excel(str(excel), str(tmp_path / "out"), "test-agent", 5, (0.0, 0.0))
+
+    summary = pd.read_csv(tmp_path / "out" / "cork" / "scrape_summary.csv")
+    text = read_text(summary.loc[0, "text_file"])
+    assert len(text) > MAX_CHARS_DEFAULT
+    assert text == ("food sharing " * 2000).strip()
+
+
+def test_pack_store_replaces_loose_files(servers, tmp_path) -> None:
+    urls = [f"{_base(servers[0])}/a", f"{_base(servers[1])}/mirror-a", f"{_base(servers[0])}/mirror-b"]
+    excel = tmp_path / "cork_results.xlsx"
+    pd.DataFrame({"URL": urls}).to_excel(excel, index=False)
+    out_dir = tmp_path / "out" / "cork"
+
+    process_excel(str(excel), str(tmp_path / "out"), "test-agent", 5, (0.0, 0.0), concurrency=1, store="pack")
+
+    assert list(out_dir.glob("*.txt")) == []
+    summary = pd.read_csv(out_dir / "scrape_summary.csv")
+    assert os.path.basename(summary.loc[0, "text_file"]) == f"{safe_file_stem(urls[0])}.txt"
+    assert read_text(summary.loc[0, "text_file"]) == "a\ntext a"
+    assert summary.loc[1, "text_file"] == summary.loc[2, "text_file"]
+    assert read_text(summary.loc[2, "text_file"]) == "mirror\nshared text"
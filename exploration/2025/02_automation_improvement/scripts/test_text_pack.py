@@ -0,0 +1,154 @@
+"""Tests for the compressed, content-addressed text pack."""
+
+from __future__ import annotations
+
+import csv
+import gzip
+import os
+import pathlib
+import sqlite3
+
+from text_pack import (
+    INDEX_NAME,
+    PACK_NAME,
+    TextPack,
+    TextPackWriter,
+    iter_texts,
+    list_texts,
+    pack_directory,
+    read_text,
+    text_exists,
+)
+
+
+def test_random_access_and_streaming(tmp_path) -> None:
+    texts = {f"host{i}__{i:010x}": f"Community fridge {i}\n" * (i + 1) for i in range(20)}
+    with TextPackWriter(tmp_path) as pack:
+        paths = {url_id: pack.add(url_id, text) for url_id, text in texts.items()}
+
+    with TextPack(tmp_path) as pack:
+        assert len(pack) == 20
+        assert pack["host7__0000000007"] == texts["host7__0000000007"]
+        assert dict(iter(pack)) == texts
+    for url_id, path in paths.items():
+        assert pathlib.Path(path).stem == url_id
+        assert text_exists(path)
+        assert read_text(path) == texts[url_id]
+    assert not text_exists(str(tmp_path / PACK_NAME / "other.txt"))
+
+    # The pack is a plain multi-member gzip stream
+    assert gzip.decompress((tmp_path / PACK_NAME).read_bytes()).decode() == "".join(texts.values())
+
+
+def test_identical_text_is_stored_once(tmp_path) -> None:
+    with TextPackWriter(tmp_path) as pack:
+        pack.add("a__1", "shared text")
+        size = (tmp_path / PACK_NAME).stat().st_size
+        pack.add("b__2", "shared text")
+        assert (tmp_path / PACK_NAME).stat().st_size == size
+        pack.add("a__1", "shared text")
+    assert len((tmp_path / INDEX_NAME).read_text().splitlines()) == 2
+
+    with TextPack(tmp_path) as pack:
+        assert pack["a__1"] == pack["b__2"] == "shared text"
+
+
+def test_reopened_writer_appends_and_last_entry_wins(tmp_path) -> None:
+    with TextPackWriter(tmp_path) as pack:
+        pack.add("a__1", "old")
+    with TextPackWriter(tmp_path) as pack:
+        pack.add("a__1", "new")
+        pack.add("b__2", "old")
+    with TextPack(tmp_path) as pack:
+        assert pack["a__1"] == "new"
+        assert pack["b__2"] == "old"
+
+
+def test_torn_index_line_is_ignored(tmp_path) -> None:
+    with TextPackWriter(tmp_path) as pack:
+        pack.add("a__1", "text")
+    with open(tmp_path / INDEX_NAME, "a", encoding="utf-8") as f:
+        f.write("b__2\tdeadbeef\t12")
+    assert dict(iter(TextPack(tmp_path))) == {"a__1": "text"}
+
+
+def test_compatibility_readers_cover_packed_and_loose(tmp_path) -> None:
+    (tmp_path / "cork").mkdir()
+    (tmp_path / "lyon").mkdir()
+    with TextPackWriter(tmp_path / "cork") as pack:
+        pack.add("x__2", "packed")
+    (tmp_path / "cork" / "x__1.txt").write_text("loose", encoding="utf-8")
+    (tmp_path / "lyon" / "y__1.txt").write_text("lyon", encoding="utf-8")
+
+    assert list(iter_texts(tmp_path)) == [("cork", "x__2", "packed"), ("cork", "x__1", "loose"), ("lyon", "y__1", "lyon")]
+    listed = list_texts(tmp_path)
+    assert [(city, url_id) for city, url_id, _ in listed] == [("cork", "x__2"), ("cork", "x__1"), ("lyon", "y__1")]
+    assert [read_text(path) for _, _, path in listed] == ["packed", "loose", "lyon"]
+
+
+def test_pack_directory_rewrites_summary_paths(tmp_path) -> None:
+    city = tmp_path / "cork"
+    city.mkdir()
+    loose = city / "x__1.txt"
+    loose.write_text("page text", encoding="utf-8")
+    with open(city / "scrape_summary.csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["row", "url", "text_file"])
+        w.writerow([0, "https://x", str(loose)])
+        w.writerow([1, "https://y", ""])
+
+    assert pack_directory(city, remove_txt=True) == 1
+    assert not loose.exists()
+    with open(city / "scrape_summary.csv", newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert read_text(rows[0]["text_file"]) == "page text"
+    assert rows[1]["text_file"] == ""
+
+
+def test_pack_directory_matches_absolute_paths_from_a_relative_city_dir(tmp_path, monkeypatch) -> None:
+    city = tmp_path / "cork"
+    city.mkdir()
+    for name in ["x__1", "x__2", "x__3"]:
+        (city / f"{name}.txt").write_text(f"text {name}", encoding="utf-8")
+    with open(city / "scrape_summary.csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["row", "url", "text_file"])
+        w.writerow([0, "https://x/1", str(city / "x__1.txt")])
+        w.writerow([1, "https://x/2", str(city / "x__1.txt")])  # linked to identical text
+        w.writerow([2, "https://x/3", os.path.join("elsewhere", "cork", "x__3.txt")])  # can't be resolved
+    conn = sqlite3.connect(city / "crawl_state.sqlite")
+    conn.execute("CREATE TABLE pages (stem TEXT PRIMARY KEY, text_file TEXT)")
+    conn.executemany("INSERT INTO pages VALUES (?, ?)", [("x__1", str(city / "x__1.txt")), ("x__2", str(city / "x__2.txt"))])
+    conn.commit()
+    conn.close()
+
+    monkeypatch.chdir(tmp_path)
+    assert pack_directory("cork", remove_txt=True) == 3
+
+    with open(city / "scrape_summary.csv", newline="", encoding="utf-8") as f:
+        text_files = [row["text_file"] for row in csv.DictReader(f)]
+    assert text_files[:2] == [str(city / PACK_NAME / "x__1.txt")] * 2
+    assert read_text(text_files[0]) == "text x__1"
+    conn = sqlite3.connect(city / "crawl_state.sqlite")
+    stored = dict(conn.execute("SELECT stem, text_file FROM pages"))
+    conn.close()
+    assert stored == {"x__1": str(city / PACK_NAME / "x__1.txt"), "x__2": str(city / PACK_NAME / "x__2.txt")}
+    # Rewritten files are removed; one a row may still name is kept
+    assert sorted(p.name for p in city.glob("*.txt")) == ["x__3.txt"]
+
+
+def test_index_growth_is_read_incrementally(tmp_path) -> None:
+    with TextPackWriter(tmp_path) as pack:
+        first = pack.add("x__1", "one")
+        assert read_text(first) == "one"
+        second = pack.add("x__2", "two")
+        assert read_text(second) == "two"
+    with open(tmp_path / INDEX_NAME, "a", encoding="utf-8") as f:
+        f.write("x__3\tabc")  # a line still being written
+    assert not text_exists(str(tmp_path / PACK_NAME / "x__3.txt"))
+    with open(tmp_path / INDEX_NAME, "a", encoding="utf-8") as f:
+        f.write("\n")  # the torn line ends; it is skipped, the next entry is whole
+    with TextPackWriter(tmp_path) as pack:
+        third = pack.add("x__3", "three")
+    assert read_text(third) == "three"
+    assert read_text(first) == "one"
@@ -0,0 +1,305 @@
+"""Compressed, content-addressed store for scraped page text.
+
+One pack per city folder replaces the loose ``<url_id>.txt`` files:
+
+- ``pages.pack``: each distinct text once, as its own gzip member, so
+  ``zcat pages.pack`` streams every text and any member can be read alone;
+- ``pages.pack.idx``: one tab-separated line per entry,
+  ``url_id, sha256 of the text, offset, length``. It is append-only; the
+  last line for a url_id wins.
+
+Texts are keyed by their SHA-256: adding text that is already packed only
+adds an index line pointing at the existing member. A blob is written and
+flushed before its index line, so a crash can at most leave unreferenced
+bytes at the end of the pack.
+
+Pages in a pack are addressed with the path ``<city>/pages.pack/<url_id>.txt``
+(the scrape_summary.csv ``text_file`` value), so ``Path(text_file).stem``
+is still the url_id. :func:`read_text`, :func:`list_texts` and
+:func:`iter_texts` accept packed and loose ``.txt`` pages alike.
+
+Usage (pack the loose .txt files of every city folder under a base):
+  python text_pack.py Run-03/03--archived/_scraped_text [--remove-txt]
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import csv
+import gzip
+import hashlib
+import os
+import pathlib
+import sqlite3
+from collections.abc import Iterator
+from typing import NamedTuple
+
+PACK_NAME = "pages.pack"
+INDEX_NAME = "pages.pack.idx"
+
+
+class Entry(NamedTuple):
+    content_hash: str
+    offset: int
+    length: int
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _read_index_from(index: pathlib.Path, entries: dict[str, Entry], start: int = 0) -> int:
+    """Add the complete index lines from byte *start* on to *entries*; returns the offset read up to."""
+    with open(index, "rb") as f:
+        f.seek(start)
+        for line in f:
+            if not line.endswith(b"\n"):  # a line still being written (or torn by a crash)
+                break
+            start += len(line)
+            parts = line.decode("utf-8").rstrip("\n").split("\t")
+            if len(parts) == 4:  # a torn line from a crash is ignored
+                entries[parts[0]] = Entry(parts[1], int(parts[2]), int(parts[3]))
+    return start
+
+
+def _read_index(directory: pathlib.Path) -> dict[str, Entry]:
+    entries: dict[str, Entry] = {}
+    index = directory / INDEX_NAME
+    if index.exists():
+        _read_index_from(index, entries)
+    return entries
+
+
+class TextPack:
+    """Random access (``pack[url_id]``) and sequential streaming over one city's pack."""
+
+    def __init__(self, directory: str | os.PathLike):
+        self.directory = pathlib.Path(directory)
+        self.entries = _read_index(self.directory)
+        self._files = contextlib.ExitStack()  # every open file, closed together by close()
+        self._file = None
+
+    def __enter__(self) -> TextPack:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._files.close()
+        self._file = None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, url_id: str) -> bool:
+        return url_id in self.entries
+
+    def path_for(self, url_id: str) -> str:
+        return str(self.directory / PACK_NAME / f"{url_id}.txt")
+
+    def _read(self, entry: Entry) -> str:
+        if self._file is None:
+            self._file = self._files.enter_context((self.directory / PACK_NAME).open("rb"))
+        self._file.seek(entry.offset)
+        return gzip.decompress(self._file.read(entry.length)).decode("utf-8")
+
+    def __getitem__(self, url_id: str) -> str:
+        return self._read(self.entries[url_id])
+
+    def __iter__(self) -> Iterator[tuple[str, str]]:
+        """(url_id, text) for every entry, in pack order; shared texts are decompressed once."""
+        by_offset: dict[int, list[str]] = {}
+        for url_id, entry in self.entries.items():
+            by_offset.setdefault(entry.offset, []).append(url_id)
+        for offset in sorted(by_offset):
+            url_ids = by_offset[offset]
+            text = self._read(self.entries[url_ids[0]])
+            for url_id in url_ids:
+                yield url_id, text
+
+
+class TextPackWriter(TextPack):
+    """Append texts to one city's pack; identical texts are stored once."""
+
+    def __init__(self, directory: str | os.PathLike, compresslevel: int = 6):
+        super().__init__(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.compresslevel = compresslevel
+        self._by_hash = {entry.content_hash: entry for entry in self.entries.values()}
+        self._pack = self._files.enter_context((self.directory / PACK_NAME).open("ab"))
+        self._index = self._files.enter_context((self.directory / INDEX_NAME).open("a", encoding="utf-8"))
+
+    def add(self, url_id: str, text: str, content_hash: str | None = None) -> str:
+        """Store *text* under *url_id*; returns the page's ``text_file`` path."""
+        content_hash = content_hash or text_hash(text)
+        entry = self._by_hash.get(content_hash)
+        if entry is None:
+            blob = gzip.compress(text.encode("utf-8"), compresslevel=self.compresslevel, mtime=0)
+            self._pack.seek(0, os.SEEK_END)
+            entry = Entry(content_hash, self._pack.tell(), len(blob))
+            self._pack.write(blob)
+            self._pack.flush()
+            self._by_hash[content_hash] = entry
+        if self.entries.get(url_id) != entry:
+            self._index.write(f"{url_id}\t{entry.content_hash}\t{entry.offset}\t{entry.length}\n")
+            self._index.flush()
+            self.entries[url_id] = entry
+        return self.path_for(url_id)
+
+
+# ---------- compatibility readers ----------
+def _split_pack_path(path: pathlib.Path) -> tuple[pathlib.Path, str] | None:
+    if path.parent.name == PACK_NAME:
+        return path.parent.parent, path.stem
+    return None
+
+
+_index_cache: dict[pathlib.Path, tuple[int, dict[str, Entry]]] = {}
+
+
+def _current_index(directory: pathlib.Path) -> dict[str, Entry]:
+    """The pack index of *directory*; when the index file has grown, only the new lines are read."""
+    index = directory / INDEX_NAME
+    try:
+        size = index.stat().st_size
+    except FileNotFoundError:
+        return {}
+    read_to, entries = _index_cache.get(directory, (0, {}))
+    if size < read_to:  # replaced by a smaller index: start over
+        read_to, entries = 0, {}
+    if size > read_to:
+        read_to = _read_index_from(index, entries, read_to)
+    _index_cache[directory] = (read_to, entries)
+    return entries
+
+
+def text_exists(text_file: str) -> bool:
+    """Whether a ``text_file`` value (packed or loose) points at stored text."""
+    path = pathlib.Path(text_file)
+    packed = _split_pack_path(path)
+    if packed is None:
+        return path.exists()
+    directory, url_id = packed
+    return url_id in _current_index(directory)
+
+
+def read_text(text_file: str | os.PathLike) -> str:
+    """Text behind a ``text_file`` value, packed or loose."""
+    path = pathlib.Path(text_file)
+    packed = _split_pack_path(path)
+    if packed is None:
+        return path.read_text(encoding="utf-8", errors="ignore")
+    directory, url_id = packed
+    entry = _current_index(directory)[url_id]
+    with open(directory / PACK_NAME, "rb") as f:
+        f.seek(entry.offset)
+        return gzip.decompress(f.read(entry.length)).decode("utf-8")
+
+
+def list_texts(base: str | os.PathLike) -> list[tuple[str, str, pathlib.Path]]:
+    """(city, url_id, path) for every page one level below *base*, packed or loose, sorted."""
+    out = []
+    for city_dir in sorted(p for p in pathlib.Path(base).iterdir() if p.is_dir()):
+        pack = TextPack(city_dir)
+        seen = set(pack.entries)
+        out += [(city_dir.name, url_id, pathlib.Path(pack.path_for(url_id))) for url_id in sorted(seen)]
+        out += [(city_dir.name, p.stem, p) for p in sorted(city_dir.glob("*.txt")) if p.stem not in seen]
+    return out
+
+
+def iter_texts(base: str | os.PathLike) -> Iterator[tuple[str, str, str]]:
+    """Stream (city, url_id, text) for every page one level below *base*, packed or loose."""
+    for city_dir in sorted(p for p in pathlib.Path(base).iterdir() if p.is_dir()):
+        with TextPack(city_dir) as pack:
+            yield from ((city_dir.name, url_id, text) for url_id, text in pack)
+            seen = set(pack.entries)
+        for p in sorted(city_dir.glob("*.txt")):
+            if p.stem not in seen:
+                yield city_dir.name, p.stem, p.read_text(encoding="utf-8", errors="ignore")
+
+
+def _packed_path(text_file: str, stems: set[str], city_dir: pathlib.Path) -> str | None:
+    """Pack path for a loose ``text_file`` value in *city_dir* whose stem was packed, else None.
+
+    Values are compared by resolved folder, since the scraper may have stored
+    them absolute or relative to another working directory. The packed path
+    keeps the value's own form.
+    """
+    if not text_file:
+        return None
+    path = pathlib.Path(text_file)
+    if path.suffix != ".txt" or path.stem not in stems or _split_pack_path(path) is not None:
+        return None
+    if path.parent.resolve() != city_dir:
+        return None
+    return str(path.parent / PACK_NAME / path.name)
+
+
+def pack_directory(city_dir: str | os.PathLike, remove_txt: bool = False) -> int:
+    """Move a city folder's loose .txt files into its pack; returns how many were packed.
+
+    text_file values in scrape_summary.csv and crawl_state.sqlite that point at
+    a packed file are rewritten to its packed path. With *remove_txt*, a .txt
+    file is deleted only if no row still names it after the rewrite.
+    """
+    city_dir = pathlib.Path(city_dir)
+    files = sorted(city_dir.glob("*.txt"))
+    with TextPackWriter(city_dir) as pack:
+        for p in files:
+            pack.add(p.stem, p.read_text(encoding="utf-8"))
+    stems = {p.stem for p in files}
+    resolved = city_dir.resolve()
+    still_named: set[str] = set()  # file names of rows left pointing at a loose file
+
+    summary = city_dir / "scrape_summary.csv"
+    if files and summary.exists():
+        with open(summary, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        if rows and "text_file" in rows[0]:
+            for row in rows:
+                new = _packed_path(row["text_file"], stems, resolved)
+                if new is not None:
+                    row["text_file"] = new
+                elif row["text_file"] and _split_pack_path(pathlib.Path(row["text_file"])) is None:
+                    still_named.add(pathlib.Path(row["text_file"]).name)
+            with open(summary, "w", newline="", encoding="utf-8") as f:
+                w = csv.DictWriter(f, fieldnames=list(rows[0]))
+                w.writeheader()
+                w.writerows(rows)
+    state = city_dir / "crawl_state.sqlite"
+    if files and state.exists():
+        conn = sqlite3.connect(state)
+        with conn:
+            updates = []
+            for stem, text_file in conn.execute("SELECT stem, text_file FROM pages WHERE text_file IS NOT NULL"):
+                new = _packed_path(text_file, stems, resolved)
+                if new is not None:
+                    updates.append((new, stem))
+                elif _split_pack_path(pathlib.Path(text_file)) is None:
+                    still_named.add(pathlib.Path(text_file).name)
+            conn.executemany("UPDATE pages SET text_file = ? WHERE stem = ?", updates)
+        conn.close()
+
+    if remove_txt:
+        for p in files:
+            if p.name not in still_named:
+                p.unlink()
+    return len(files)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Pack loose scraped .txt files into per-city text packs.")
+    p.add_argument("base", type=pathlib.Path, help="Folder with one sub-folder of .txt files per city")
+    p.add_argument("--remove-txt", action="store_true", help="Delete the .txt files once packed")
+    args = p.parse_args()
+
+    for city_dir in sorted(d for d in args.base.iterdir() if d.is_dir()):
+        n = pack_directory(city_dir, args.remove_txt)
+        if n:
+            print(f"[{city_dir.name}] packed {n} file(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Column and text normalization shared by the duplication scripts.
+
+Import after the project root is on ``sys.path``.
+"""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+
+import pandas as pd
+
+from scripts.normalize import normalize_urls
+
+
+def normalise_columns(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df.columns = [c.strip().lower() for c in df.columns]
+    rename_map = {
+        "country": "country",
+        "city": "city",
+        "name": "name",
+        "organisation": "name",
+        "organization": "name",
+        "title": "name",
+        "url": "url",
+        "website": "url",
+        "link": "url",
+    }
+    df = df.rename(columns={c: rename_map.get(c, c) for c in df.columns})
+    return df
+
+
+def clean_text(x: object) -> str:
+    if pd.isna(x):
+        return ""
+    x = str(x).strip()
+    x = unicodedata.normalize("NFKC", x)
+    x = x.casefold()
+    x = re.sub(r"\s+", " ", x)
+    x = re.sub(r"[’'`´]", "'", x)
+    x = re.sub(r"[^\w\s']", " ", x)
+    x = re.sub(r"\s+", " ", x).strip()
+    return x
+
+
+def add_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """Add ``country__key``, ``city__key``, ``name__key`` and ``url__key``."""
+    df = df.copy()
+    for col in ["country", "city", "name"]:
+        df[f"{col}__key"] = df[col].map(clean_text)
+    df["url__key"] = normalize_urls(df["url"]) if "url" in df.columns else ""
+    return df
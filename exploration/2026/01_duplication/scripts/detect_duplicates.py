@@ -1,9 +1,6 @@
 from __future__ import annotations
 
-import re
 import sys
-import unicodedata
-from difflib import SequenceMatcher
 from pathlib import Path
 
 import pandas as pd
@@ -13,30 +10,22 @@ _PROJECT_ROOT = str(Path(__file__).resolve().parents[4])
 if _PROJECT_ROOT not in sys.path:
     sys.path.insert(0, _PROJECT_ROOT)
 
+from dedup_keys import clean_text, normalise_columns
+from scripts.blocking import blocking_recall, near_duplicate_pairs
+from scripts.dedup_clusters import (
+    UnionFind,
+    assign_cluster_ids,
+    load_cluster_ids,
+    record_key,
+    save_cluster_ids,
+)
 from scripts.io import read_csv_robust
-from scripts.normalize import normalize_url
+from scripts.normalize import normalize_urls
 
 sharecity_path = Path("sharecity200-export-1768225380870.csv")
 
 df_share = read_csv_robust(sharecity_path)
 
-def normalise_columns(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    df.columns = [c.strip().lower() for c in df.columns]
-    rename_map = {
-        "country": "country",
-        "city": "city",
-        "name": "name",
-        "organisation": "name",
-        "organization": "name",
-        "title": "name",
-        "url": "url",
-        "website": "url",
-        "link": "url",
-    }
-    df = df.rename(columns={c: rename_map.get(c, c) for c in df.columns})
-    return df
-
 df_share = normalise_columns(df_share)
 
 # --- required columns for key-based duplication ---
@@ -48,18 +37,6 @@ for r in required:
             f"Columns: {list(df_share.columns)}"
         )
 
-def clean_text(x: object) -> str:
-    if pd.isna(x):
-        return ""
-    x = str(x).strip()
-    x = unicodedata.normalize("NFKC", x)     
-    x = x.casefold()                         
-    x = re.sub(r"\s+", " ", x)               
-    x = re.sub(r"[’'`´]", "'", x)            
-    x = re.sub(r"[^\w\s']", " ", x)          
-    x = re.sub(r"\s+", " ", x).strip()
-    return x
-
 for col in ["country", "city", "name"]:
     df_share[f"{col}__key"] = df_share[col].map(clean_text)
 
@@ -92,7 +69,7 @@ print("Saved:")
 print("  duplicates_sharecity_by_key.csv")
 
 if "url" in df_share.columns:
-    df_share["url__key"] = df_share["url"].map(normalize_url)
+    df_share["url__key"] = normalize_urls(df_share["url"])
 
     df_share["city_country_url_key"] = (
         df_share["country__key"] + " | " +
@@ -123,53 +100,113 @@ if "url" in df_share.columns:
 else:
     print("No 'url' column found, skipped URL duplicates check.")
 
-def similarity(a: str, b: str) -> float:
-    return SequenceMatcher(None, a, b).ratio()
-
 FUZZY_THRESHOLD = 0.92
-MAX_GROUP_SIZE = 400        
-MAX_RESULTS_PER_GROUP = 200 
+BLOCKING_RECALL_SAMPLE = 500
 
 near_dups = []
 
 for (cty, city), g in df_share.groupby(["country__key", "city__key"], dropna=False):
-    g = g.copy()
     if len(g) < 2:
         continue
-    if len(g) > MAX_GROUP_SIZE:
-        continue
 
     names = g["name__key"].tolist()
     idxs = g.index.tolist()
 
-    found = 0
-    for i in range(len(names)):
-        for j in range(i + 1, len(names)):
-            if names[i] == names[j]:
-                continue 
-            s = similarity(names[i], names[j])
-            if s >= FUZZY_THRESHOLD:
-                near_dups.append({
-                    "country__key": cty,
-                    "city__key": city,
-                    "row_i": idxs[i],
-                    "row_j": idxs[j],
-                    "name_i": df_share.loc[idxs[i], "name"],
-                    "name_j": df_share.loc[idxs[j], "name"],
-                    "similarity": s,
-                    "match_key_i": df_share.loc[idxs[i], "match_key"],
-                    "match_key_j": df_share.loc[idxs[j], "match_key"],
-                })
-                found += 1
-                if found >= MAX_RESULTS_PER_GROUP:
-                    break
-        if found >= MAX_RESULTS_PER_GROUP:
-            break
-
-df_near = pd.DataFrame(near_dups).sort_values("similarity", ascending=False)
+    # (i, j) order of the original nested loop, so ties keep their output order
+    for i, j, s in sorted(near_duplicate_pairs(names, FUZZY_THRESHOLD)):
+        if names[i] == names[j]:
+            continue
+        near_dups.append({
+            "country__key": cty,
+            "city__key": city,
+            "row_i": idxs[i],
+            "row_j": idxs[j],
+            "name_i": df_share.loc[idxs[i], "name"],
+            "name_j": df_share.loc[idxs[j], "name"],
+            "similarity": s,
+            "match_key_i": df_share.loc[idxs[i], "match_key"],
+            "match_key_j": df_share.loc[idxs[j], "match_key"],
+        })
+
+# Blocking is lossless by construction; check it against exhaustive scoring
+# on a sample of the largest country+city group.
+largest = max(
+    (g["name__key"].tolist() for _, g in df_share.groupby(["country__key", "city__key"], dropna=False)),
+    key=len,
+    default=[],
+)
+report = blocking_recall(largest, FUZZY_THRESHOLD, sample_size=BLOCKING_RECALL_SAMPLE)
+print(
+    f"\nBlocking check ({report.sample_size} names): recall {report.recall:.1%}, "
+    f"{report.candidate_pairs}/{report.all_pairs} pairs scored "
+    f"({report.reduction_ratio:.1%} skipped)"
+)
+
+df_near = pd.DataFrame(near_dups)
 if len(df_near) > 0:
+    df_near = df_near.sort_values("similarity", ascending=False)
     df_near.to_csv("near_duplicates_sharecity_fuzzy.csv", index=False, encoding="utf-8-sig")
     print("\nSaved fuzzy near-duplicates (if any):")
     print("  near_duplicates_sharecity_fuzzy.csv")
 else:
     print("\nNo fuzzy near-duplicates found at the current threshold.")
+
+# --- clusters: merge key, URL and fuzzy matches into connected components ---
+CLUSTER_IDS_PATH = Path("dedup_cluster_ids.csv")
+
+if "url__key" not in df_share.columns:
+    df_share["url__key"] = ""
+df_share["record_key"] = [
+    record_key(c, ci, n, u)
+    for c, ci, n, u in zip(df_share["country__key"], df_share["city__key"], df_share["name__key"], df_share["url__key"])
+]
+
+uf = UnionFind(df_share.index)
+edges = []
+for col, strategy, rows in [
+    ("match_key", "key", df_share),
+    ("city_country_url_key", "url", df_share[df_share["url__key"].ne("")]),
+]:
+    if col not in rows.columns:
+        continue
+    for members in rows.groupby(col, sort=False).groups.values():
+        for other in members[1:]:
+            edges.append((members[0], other, strategy))
+edges += [(d["row_i"], d["row_j"], "fuzzy") for d in near_dups]
+
+for a, b, _ in edges:
+    uf.union(a, b)
+
+strategies = {}
+for a, _, strategy in edges:
+    strategies.setdefault(uf.find(a), set()).add(strategy)
+
+# Rows with the same record_key share a match_key, so they are always in
+# one component; IDs are assigned per record_key.
+key_by_row = df_share["record_key"].to_dict()
+components = [list(dict.fromkeys(key_by_row[i] for i in rows)) for rows in uf.groups()]
+previous_ids = load_cluster_ids(CLUSTER_IDS_PATH)
+cluster_ids = assign_cluster_ids(components, previous_ids)
+
+df_share["cluster_id"] = df_share["record_key"].map(cluster_ids)
+df_share["cluster_size"] = df_share.groupby("cluster_id")["record_key"].transform("size")
+df_share["match_strategies"] = [
+    "|".join(sorted(strategies.get(uf.find(i), ()))) for i in df_share.index
+]
+
+out_cols = [c for c in ["country", "city", "name", "url"] if c in df_share.columns]
+df_clusters = df_share.sort_values(["cluster_id", "record_key"])[
+    ["cluster_id", "record_key", "cluster_size", "match_strategies"] + out_cols
+]
+df_clusters.to_csv("duplicate_clusters_sharecity.csv", index=False, encoding="utf-8-sig")
+save_cluster_ids(cluster_ids, CLUSTER_IDS_PATH)
+
+reused = sum(1 for k, cid in cluster_ids.items() if previous_ids.get(k) == cid)
+multi = df_clusters.loc[df_clusters["cluster_size"] > 1, "cluster_id"].nunique()
+print(
+    f"\nClusters: {df_clusters['cluster_id'].nunique()} "
+    f"({multi} with duplicates), {reused}/{len(cluster_ids)} record keys kept their previous ID"
+)
+print("Saved:")
+print("  duplicate_clusters_sharecity.csv")
+print(f"  {CLUSTER_IDS_PATH}")
@@ -0,0 +1,136 @@
+"""Incremental deduplication against the last accepted gold set.
+
+Build the index once from the accepted snapshot, then check each new
+export; only records not already in the index are scored:
+
+    python incremental_dedup.py build gold_fsi_200226.csv
+    python incremental_dedup.py check sharecity200-export-1768225380870.csv
+    python incremental_dedup.py check new_export.csv --update   # accept the delta
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# Allow imports from project root
+_PROJECT_ROOT = str(Path(__file__).resolve().parents[4])
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
+
+from dedup_keys import add_keys, normalise_columns  # noqa: E402
+from scripts.dedup_clusters import record_key  # noqa: E402
+from scripts.dedup_index import DedupIndex  # noqa: E402
+from scripts.io import read_csv_robust  # noqa: E402
+
+REQUIRED = ["country", "city", "name"]
+
+
+def load_records(path: Path) -> pd.DataFrame:
+    df = normalise_columns(read_csv_robust(path))
+    missing = [c for c in REQUIRED if c not in df.columns]
+    if missing:
+        raise KeyError(f"{path} is missing columns: {missing}. Columns: {list(df.columns)}")
+    return add_keys(df)
+
+
+def _keys(df: pd.DataFrame) -> list[tuple[str, str, str, str]]:
+    return list(zip(df["country__key"], df["city__key"], df["name__key"], df["url__key"], strict=True))
+
+
+def _ref(df: pd.DataFrame, i: object, keys: tuple[str, str, str, str]) -> str:
+    """The record's ``id``, else its record key; row numbers change when the file is re-ordered."""
+    return str(df.at[i, "id"]) if "id" in df.columns else record_key(*keys)
+
+
+def _record_id(df: pd.DataFrame, i: object) -> str:
+    """The record's ``id`` if the export has one; without it an edited record is a new one."""
+    return str(df.at[i, "id"]) if "id" in df.columns else ""
+
+
+def build(args: argparse.Namespace) -> None:
+    df = load_records(args.gold)
+    index = DedupIndex(threshold=args.threshold)
+    for i, k in zip(df.index, _keys(df), strict=True):
+        index.add(*k, ref=_ref(df, i, k))
+    index.save(args.index)
+    print(f"Indexed {len(index)} records from {args.gold} -> {args.index}")
+
+
+def check(args: argparse.Namespace) -> None:
+    start = time.perf_counter()
+    index = DedupIndex.load(args.index, threshold=args.threshold)
+    df = load_records(args.export)
+
+    keys = _keys(df)
+    # Decide the delta before indexing any of it, so exact repeats inside
+    # the export are still reported as duplicates of each other.
+    is_new = [record_key(*k) not in index for k in keys]
+
+    rows = []
+    for i, k, new in zip(df.index, keys, is_new, strict=True):
+        if not new:
+            continue
+        # An edited record keeps its id: skip and replace its own earlier version
+        record_id = _record_id(df, i)
+        for m in index.match(*k, ref=record_id):
+            rows.append({
+                "row": i,
+                "ref": _ref(df, i, k),
+                "country": df.at[i, "country"],
+                "city": df.at[i, "city"],
+                "name": df.at[i, "name"],
+                "url": df.at[i, "url"] if "url" in df.columns else "",
+                "strategy": m.strategy,
+                "similarity": m.similarity,
+                "matched_ref": m.matched_ref,
+                "record_key": m.record_key,
+                "matched_key": m.matched_key,
+            })
+        # Later rows of the export are also checked against this one
+        index.add(*k, ref=_ref(df, i, k), replace=bool(record_id))
+
+    out = pd.DataFrame(rows)
+    out.to_csv(args.out, index=False, encoding="utf-8-sig")
+    if args.update:
+        index.save(args.index)
+
+    elapsed = time.perf_counter() - start
+    delta = sum(is_new)
+    print(f"Rows: {len(df)}, new or modified: {delta}, unchanged: {len(df) - delta}")
+    print(f"Matches: {len(out)} -> {args.out} ({elapsed:.1f}s)")
+    if args.update:
+        print(f"Index updated: {args.index} ({len(index)} records)")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Deduplicate only new or modified records against an indexed gold set.")
+    parser.add_argument("--index", type=Path, default=Path("dedup_index.json"), help="Index file (default: dedup_index.json)")
+    parser.add_argument("--threshold", type=float, default=0.92, help="Fuzzy name threshold (default: 0.92)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Index an accepted gold snapshot")
+    p_build.add_argument("gold", type=Path, help="CSV with country, city, name and optional url/id columns")
+    p_build.set_defaults(func=build)
+
+    p_check = sub.add_parser("check", help="Match new or modified records of an export against the index")
+    p_check.add_argument("export", type=Path, help="Export CSV to check")
+    p_check.add_argument("--out", type=Path, default=Path("incremental_duplicates.csv"), help="Output CSV")
+    p_check.add_argument(
+        "--update", action="store_true", help="Add the export's new records to the index (edited ids replace their old entry)"
+    )
+    p_check.set_defaults(func=check)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,74 +2,155 @@
 """
 Azure Blob Storage Sync Script
 Sync files between local directory and Azure Blob Storage
+
+One authenticated client (credential + HTTP connection pool) is created per
+process and shared by every transfer. Bulk commands (download-all,
+upload-dir) run up to AZURE_SYNC_WORKERS files at a time; blobs larger than
+one block are moved in parallel blocks/ranges (AZURE_SYNC_BLOCK_CONCURRENCY
+per blob). Aggregate throughput is reported at the end.
+
+Set AZURE_STORAGE_CONNECTION_STRING instead of AZURE_STORAGE_ACCOUNT_NAME to
+use key/SAS auth or a local emulator such as Azurite.
 """
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from functools import cache
 from pathlib import Path
 
-from azure.identity import DefaultAzureCredential
-from azure.storage.blob import BlobServiceClient
+import requests
+from azure.core.pipeline.transport import RequestsTransport
+from azure.storage.blob import BlobServiceClient, ContainerClient
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 
 # Load environment variables
 load_dotenv()
 
 # Configuration from environment variables
 STORAGE_ACCOUNT_NAME = os.getenv("AZURE_STORAGE_ACCOUNT_NAME")
+CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
 CONTAINER_NAME = os.getenv("AZURE_CONTAINER_NAME", "cultivatedata")
 LOCAL_BASE_DIR = Path(os.getenv("AZURE_LOCAL_SYNC_DIR", "./data_azure_sync"))
-
-if not STORAGE_ACCOUNT_NAME:
-    raise RuntimeError(
-        "❌ AZURE_STORAGE_ACCOUNT_NAME not found. "
-        "Please create a .env file from .env.example and set your Azure Storage Account name."
+WORKERS = int(os.getenv("AZURE_SYNC_WORKERS", "8"))                      # files in flight
+BLOCK_CONCURRENCY = int(os.getenv("AZURE_SYNC_BLOCK_CONCURRENCY", "4"))  # blocks in flight per large blob
+BLOCK_SIZE = 8 * 1024 * 1024  # blobs above this are split into blocks / ranged reads
+
+@dataclass(frozen=True)
+class TransferStats:
+    files: int
+    failed: int
+    bytes: int
+    seconds: float
+
+    @property
+    def mb_per_s(self) -> float:
+        if self.seconds <= 0:
+            return 0.0
+        return self.bytes / 1024 / 1024 / self.seconds
+
+    def __str__(self) -> str:
+        return (f"{self.files} file(s), {self.bytes / 1024 / 1024:.1f} MB in {self.seconds:.1f}s "
+                f"({self.mb_per_s:.1f} MB/s), {self.failed} failed")
+
+def make_transport(pool_size: int) -> RequestsTransport:
+    """HTTP transport whose connection pool fits every concurrent request, so connections are reused"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return RequestsTransport(session=session, session_owner=False)
+
+@cache
+def get_blob_service_client() -> BlobServiceClient:
+    """Get the authenticated blob service client (created once, shared by all transfers)"""
+    options = dict(
+        transport=make_transport(WORKERS * BLOCK_CONCURRENCY),
+        max_block_size=BLOCK_SIZE,
+        max_single_put_size=BLOCK_SIZE,
+        max_single_get_size=BLOCK_SIZE,
+        max_chunk_get_size=BLOCK_SIZE,
     )
+    if CONNECTION_STRING:
+        return BlobServiceClient.from_connection_string(CONNECTION_STRING, **options)
+    if not STORAGE_ACCOUNT_NAME:
+        raise RuntimeError(
+            "❌ AZURE_STORAGE_ACCOUNT_NAME not found. "
+            "Please create a .env file from .env.example and set your Azure Storage Account name."
+        )
+    from azure.identity import DefaultAzureCredential
 
-def get_blob_service_client() -> BlobServiceClient:
-    """Get authenticated blob service client"""
     account_url = f"https://{STORAGE_ACCOUNT_NAME}.blob.core.windows.net"
-    credential = DefaultAzureCredential()
-    return BlobServiceClient(account_url, credential=credential)
+    return BlobServiceClient(account_url, credential=DefaultAzureCredential(), **options)
 
-def download_blob(blob_name: str, local_path: Path) -> None:
-    """Download a single blob to local file"""
-    print(f"Downloading: {blob_name} -> {local_path}")
+def get_container_client() -> ContainerClient:
+    return get_blob_service_client().get_container_client(CONTAINER_NAME)
 
-    blob_service_client = get_blob_service_client()
-    blob_client = blob_service_client.get_blob_client(
-        container=CONTAINER_NAME,
-        blob=blob_name
-    )
+def download_blob(blob_name: str, local_path: Path, container_client: ContainerClient | None = None,
+                  verbose: bool = True) -> int:
+    """Download a single blob to local file; returns bytes written"""
+    if verbose:
+        print(f"Downloading: {blob_name} -> {local_path}")
+
+    container_client = container_client or get_container_client()
+    blob_client = container_client.get_blob_client(blob_name)
 
     # Create parent directory if needed
     local_path.parent.mkdir(parents=True, exist_ok=True)
 
-    # Download
-    with open(local_path, "wb") as file:
-        download_stream = blob_client.download_blob()
-        file.write(download_stream.readall())
+    # Download: ranged reads in parallel for large blobs, streamed to a temporary
+    # sibling that replaces local_path only when complete (a failure keeps the old copy)
+    part_path = local_path.with_name(f".{local_path.name}.part")
+    try:
+        with open(part_path, "wb") as file:
+            size = blob_client.download_blob(max_concurrency=BLOCK_CONCURRENCY).readinto(file)
+        part_path.replace(local_path)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
 
-    print(f"✓ Downloaded: {local_path}")
+    if verbose:
+        print(f"✓ Downloaded: {local_path}")
+    return size
 
-def upload_blob(local_path: Path, blob_name: str) -> None:
-    """Upload a local file to blob"""
-    print(f"Uploading: {local_path} -> {blob_name}")
+def upload_blob(local_path: Path, blob_name: str, container_client: ContainerClient | None = None,
+                verbose: bool = True) -> int:
+    """Upload a local file to blob; returns bytes uploaded"""
+    if verbose:
+        print(f"Uploading: {local_path} -> {blob_name}")
 
-    blob_service_client = get_blob_service_client()
-    blob_client = blob_service_client.get_blob_client(
-        container=CONTAINER_NAME,
-        blob=blob_name
-    )
+    container_client = container_client or get_container_client()
+    blob_client = container_client.get_blob_client(blob_name)
 
-    # Upload
+    # Upload: staged blocks in parallel for large files
+    size = local_path.stat().st_size
     with open(local_path, "rb") as file:
-        blob_client.upload_blob(file, overwrite=True)
-
-    print(f"✓ Uploaded: {blob_name}")
+        blob_client.upload_blob(file, length=size, overwrite=True, max_concurrency=BLOCK_CONCURRENCY)
+
+    if verbose:
+        print(f"✓ Uploaded: {blob_name}")
+    return size
+
+def transfer_all(transfer, jobs: list[tuple], workers: int = WORKERS) -> TransferStats:
+    """Run transfer(*job) for each job on a bounded thread pool"""
+    start = time.monotonic()
+    total = failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(transfer, *job, verbose=False): job for job in jobs}
+        for future in as_completed(futures):
+            source, target = futures[future][:2]
+            try:
+                total += future.result()
+                print(f"✓ {source} -> {target}")
+            except Exception as e:
+                failed += 1
+                print(f"✗ {source} -> {target}: {e}")
+    return TransferStats(len(jobs) - failed, failed, total, time.monotonic() - start)
 
 def list_blobs(prefix: str = "") -> None:
     """List all blobs in container with optional prefix"""
-    blob_service_client = get_blob_service_client()
-    container_client = blob_service_client.get_container_client(CONTAINER_NAME)
+    container_client = get_container_client()
 
     print(f"\nBlobs in container '{CONTAINER_NAME}' (prefix: '{prefix}'):")
     print("-" * 80)
@@ -81,31 +162,35 @@ def list_blobs(prefix: str = "") -> None:
 
     print("-" * 80)
 
-def download_all(prefix: str = "", local_dir: Path | None = None) -> None:
+def download_all(prefix: str = "", local_dir: Path | None = None, workers: int = WORKERS) -> TransferStats:
     """Download all blobs with given prefix"""
     if local_dir is None:
         local_dir = LOCAL_BASE_DIR
 
-    blob_service_client = get_blob_service_client()
-    container_client = blob_service_client.get_container_client(CONTAINER_NAME)
-
+    container_client = get_container_client()
     blobs = container_client.list_blobs(name_starts_with=prefix)
+    jobs = [(blob.name, local_dir / blob.name, container_client) for blob in blobs]
 
-    for blob in blobs:
-        local_path = local_dir / blob.name
-        download_blob(blob.name, local_path)
+    stats = transfer_all(download_blob, jobs, workers)
+    print(f"Downloaded {stats}")
+    return stats
 
-def upload_directory(local_dir: str | Path, blob_prefix: str = "") -> None:
+def upload_directory(local_dir: str | Path, blob_prefix: str = "", workers: int = WORKERS) -> TransferStats:
     """Upload entire directory to blob storage"""
     local_dir = Path(local_dir)
+    container_client = get_container_client()
 
+    jobs = []
     for local_path in local_dir.rglob("*"):
         if local_path.is_file():
             # Calculate relative path
-            relative_path = local_path.relative_to(local_dir)
+            relative_path = local_path.relative_to(local_dir).as_posix()
             blob_name = f"{blob_prefix}/{relative_path}".lstrip("/")
+            jobs.append((local_path, blob_name, container_client))
 
-            upload_blob(local_path, blob_name)
+    stats = transfer_all(upload_blob, jobs, workers)
+    print(f"Uploaded {stats}")
+    return stats
 
 def main() -> None:
     """Main function with example usage"""
@@ -126,6 +211,8 @@ Examples:
   python azure_blob_sync.py upload ./automation.csv raw/source_data/automation.csv
   python azure_blob_sync.py download-all raw/source_data
   python azure_blob_sync.py upload-dir ./data_reviewed data_reviewed
+
+Bulk commands transfer AZURE_SYNC_WORKERS files at a time (default 8).
         """)
         return
 
@@ -148,12 +235,14 @@ Examples:
 
         elif command == "download-all":
             prefix = sys.argv[2] if len(sys.argv) > 2 else ""
-            download_all(prefix)
+            if download_all(prefix).failed:
+                sys.exit(1)
 
         elif command == "upload-dir":
             local_dir = sys.argv[2]
             blob_prefix = sys.argv[3] if len(sys.argv) > 3 else ""
-            upload_directory(local_dir, blob_prefix)
+            if upload_directory(local_dir, blob_prefix).failed:
+                sys.exit(1)
 
         else:
             print(f"Unknown command: {command}")
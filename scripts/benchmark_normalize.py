@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Benchmark batch URL normalization against the ``Series.apply`` path.
+
+Generates a synthetic URL column shaped like one pipeline iteration
+(~210,000 URLs with many repeats across cities and runs) and reports
+rows/sec for ``apply(normalize_url)`` versus ``normalize_urls``, and for
+a warm ``UrlNormalizationCache`` (a second session over the same URLs).
+
+Usage:
+  python scripts/benchmark_normalize.py
+  python scripts/benchmark_normalize.py --rows 50000 --distinct 10000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from scripts.normalize import (
+    UrlNormalizationCache,
+    extract_domain,
+    extract_domains,
+    normalize_url,
+    normalize_urls,
+)
+
+_HOSTS = ["foodsharing.de", "facebook.com", "instagram.com", "olioex.com", "too-good-to-go.org"]
+_SEGMENTS = ["about", "kontakt", "events", "fairteiler", "projects", "Über-uns", "food-bank"]
+
+
+def make_urls(rows: int, distinct: int, seed: int = 0) -> pd.Series:
+    """Build a column of *rows* URLs drawn from *distinct* messy variants."""
+    rng = random.Random(seed)
+    pool = []
+    for i in range(distinct):
+        scheme = rng.choice(["https://", "http://", "HTTPS://WWW.", "www.", ""])
+        host = f"{rng.choice(_HOSTS)}" if rng.random() < 0.5 else f"initiative-{i}.eu"
+        path = "/".join(rng.sample(_SEGMENTS, rng.randint(0, 3)))
+        tail = rng.choice(["", "/", "?ref=abc", "#team", "'", "  "])
+        pool.append(f"  {scheme}{host}/{path}{tail}")
+    pool.append(None)
+    pool.append(float("nan"))
+    return pd.Series([rng.choice(pool) for _ in range(rows)], dtype=object)
+
+
+def _time(fn: Callable[[], pd.Series], repeat: int) -> tuple[float, pd.Series]:
+    best = float("inf")
+    out = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark batch URL normalization")
+    parser.add_argument("--rows", type=int, default=210_000, help="Rows in the synthetic column")
+    parser.add_argument("--distinct", type=int, default=40_000, help="Distinct URL variants")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing repeats (best is reported)")
+    args = parser.parse_args()
+
+    urls = make_urls(args.rows, args.distinct)
+    print(f"rows={len(urls)} distinct={urls.nunique()}")
+
+    cases = [
+        ("normalize_url", lambda: urls.apply(normalize_url), lambda: normalize_urls(urls)),
+        ("extract_domain", lambda: urls.apply(extract_domain), lambda: extract_domains(urls)),
+    ]
+    for name, apply_fn, batch_fn in cases:
+        t_apply, expected = _time(apply_fn, args.repeat)
+        t_batch, actual = _time(batch_fn, args.repeat)
+        if not expected.equals(actual):
+            print(f"{name}: batch output differs from apply path", file=sys.stderr)
+            return 1
+        print(
+            f"{name:15s} apply {len(urls) / t_apply:12,.0f} rows/s   "
+            f"batch {len(urls) / t_batch:12,.0f} rows/s   "
+            f"speed-up {t_apply / t_batch:5.1f}x"
+        )
+
+    cache = UrlNormalizationCache(capacity=args.distinct + 2)
+    cache.normalize_urls(urls)
+    t_warm, _ = _time(lambda: cache.normalize_urls(urls), args.repeat)
+    stats = cache.stats
+    print(
+        f"{'warm cache':15s} {len(urls) / t_warm:12,.0f} rows/s   "
+        f"hit rate {stats.hit_rate:.1%} ({stats.hits:,} hits, {stats.misses:,} misses)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
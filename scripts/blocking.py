@@ -0,0 +1,239 @@
+"""Candidate-pair blocking for fuzzy near-duplicate detection.
+
+A q-gram inverted index emits only the pairs whose
+``SequenceMatcher.ratio()`` *can* reach the threshold, so the exact scorer
+in :mod:`scripts.similarity` runs on a small fraction of all pairs.
+
+The filter is lossless. difflib's ratio is ``2M / T`` with ``M`` the size
+of the matching blocks and ``T = len(a) + len(b)``. Adjacent blocks are
+always separated by at least one unmatched character, so there are at most
+``T - 2M + 1`` blocks, and a block of length ``L`` shares ``L - q + 1``
+q-grams. Hence two strings share at least ``M - (q - 1)(T - 2M + 1)``
+q-grams (multiset), which is evaluated at the smallest ``M`` that meets
+the threshold and combined with prefix filtering. Pairs whose bound is
+<= 0 (very short strings) are compared by length alone.
+"""
+
+from __future__ import annotations
+
+import math
+import random
+from collections import defaultdict
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from dataclasses import dataclass
+
+from scripts.similarity import RatioScorer, similar_pairs
+
+
+def qgram_counts(key: str, q: int) -> dict[str, int]:
+    """Multiset of the overlapping q-grams of *key* (no padding)."""
+    counts: dict[str, int] = {}
+    for i in range(len(key) - q + 1):
+        gram = key[i : i + q]
+        counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+def _min_matches(total: int, threshold: float) -> int:
+    """Smallest integer M with ``2.0 * M / total >= threshold``."""
+    m = max(0, math.ceil(threshold * total / 2))
+    while m > 0 and 2.0 * (m - 1) / total >= threshold:
+        m -= 1
+    while 2.0 * m / total < threshold:
+        m += 1
+    return m
+
+
+class QGramIndex:
+    """Inverted q-gram lists with length, prefix and count filtering.
+
+    Keys are added incrementally; :meth:`candidates` returns the ids of
+    already-indexed keys that could reach *threshold* against a new key.
+
+    Only a prefix of each key's q-grams is indexed (AllPairs-style prefix
+    filtering): if two multisets must share ``t`` q-grams, their first
+    ``n - t + 1`` q-grams under any fixed global order must intersect.
+    Ordering rare q-grams first keeps the posting lists short, so pass
+    *gram_frequencies* (e.g. from :func:`gram_frequencies`) when the keys
+    are known up front. Unknown q-grams are treated as the rarest.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        q: int = 3,
+        gram_frequencies: Mapping[str, int] | None = None,
+    ) -> None:
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError(f"threshold must be in (0, 1], got {threshold}")
+        if q < 1:
+            raise ValueError(f"q must be >= 1, got {q}")
+        self.threshold = threshold
+        self.q = q
+        self._frequencies = dict(gram_frequencies or {})
+        self._postings: dict[tuple[str, int], list[int]] = defaultdict(list)
+        self._by_length: dict[int, list[int]] = defaultdict(list)
+        self._lengths: list[int] = []
+        self._counts: list[dict[str, int]] = []
+        self._min_need: dict[int, int | None] = {}
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def _required_overlap(self, la: int, lb: int) -> int | None:
+        """Minimum shared q-grams for a pair of lengths, or None if impossible."""
+        total = la + lb
+        if total == 0:
+            return 0
+        m = _min_matches(total, self.threshold)
+        if m > min(la, lb):
+            return None
+        return m - (self.q - 1) * (total - 2 * m + 1)
+
+    def _partner_lengths(self, length: int) -> range:
+        """Lengths that can pass the length filter against *length*."""
+        return range(0, int(length * (2 - self.threshold) / self.threshold) + 2)
+
+    def _min_positive_need(self, length: int) -> int | None:
+        """Smallest positive required overlap over all partner lengths."""
+        if length not in self._min_need:
+            needs = [
+                need
+                for lb in self._partner_lengths(length)
+                if (need := self._required_overlap(length, lb)) is not None and need > 0
+            ]
+            self._min_need[length] = min(needs) if needs else None
+        return self._min_need[length]
+
+    def _prefix(self, counts: dict[str, int], length: int) -> list[tuple[str, int]]:
+        need = self._min_positive_need(length)
+        size = sum(counts.values())
+        if need is None or need > size:
+            return []
+        tokens = sorted(
+            ((gram, k) for gram, count in counts.items() for k in range(count)),
+            key=lambda tok: (self._frequencies.get(tok[0], 0), tok),
+        )
+        return tokens[: size - need + 1]
+
+    def add(self, key: str) -> int:
+        """Index *key* and return its id (insertion order, from 0)."""
+        key_id = len(self._lengths)
+        counts = qgram_counts(key, self.q)
+        self._lengths.append(len(key))
+        self._counts.append(counts)
+        self._by_length[len(key)].append(key_id)
+        for token in self._prefix(counts, len(key)):
+            self._postings[token].append(key_id)
+        return key_id
+
+    def candidates(self, key: str) -> list[int]:
+        """Ids of indexed keys that may score >= ``threshold`` with *key*."""
+        la = len(key)
+        required: dict[int, int] = {}
+        result: set[int] = set()
+        for lb in self._by_length:
+            need = self._required_overlap(la, lb)
+            if need is None:
+                continue
+            if need <= 0:
+                result.update(self._by_length[lb])
+            else:
+                required[lb] = need
+
+        if required:
+            counts = qgram_counts(key, self.q)
+            probed: set[int] = set()
+            for token in self._prefix(counts, la):
+                probed.update(self._postings.get(token, ()))
+            for other_id in probed:
+                need = required.get(self._lengths[other_id])
+                if need is None:
+                    continue
+                other_counts = self._counts[other_id]
+                shared = sum(min(counts[gram], other_counts[gram]) for gram in counts.keys() & other_counts.keys())
+                if shared >= need:
+                    result.add(other_id)
+        return sorted(result)
+
+
+def gram_frequencies(keys: Iterable[str], q: int = 3) -> dict[str, int]:
+    """Number of *keys* containing each q-gram (for rare-first ordering)."""
+    frequencies: dict[str, int] = defaultdict(int)
+    for key in keys:
+        for gram in qgram_counts(key, q):
+            frequencies[gram] += 1
+    return dict(frequencies)
+
+
+def candidate_pairs(keys: Sequence[str], threshold: float = 0.92, q: int = 3) -> Iterator[tuple[int, int]]:
+    """Yield ``(i, j)`` with ``i < j`` for every pair that may reach *threshold*."""
+    index = QGramIndex(threshold=threshold, q=q, gram_frequencies=gram_frequencies(keys, q))
+    for j, key in enumerate(keys):
+        for i in index.candidates(key):
+            yield i, j
+        index.add(key)
+
+
+def near_duplicate_pairs(
+    keys: Sequence[str],
+    threshold: float = 0.92,
+    q: int = 3,
+    backend: str = "auto",
+) -> Iterator[tuple[int, int, float]]:
+    """Blocked equivalent of :func:`scripts.similarity.similar_pairs`.
+
+    Yields the same ``(i, j, ratio)`` triples (``ratio`` computed as
+    ``SequenceMatcher(None, keys[i], keys[j])``) without comparing all pairs.
+    """
+    scorer = RatioScorer(backend)
+    for i, j in candidate_pairs(keys, threshold=threshold, q=q):
+        s = scorer.score(keys[i], keys[j], cutoff=threshold)
+        if s >= threshold:
+            yield i, j, s
+
+
+@dataclass(frozen=True)
+class BlockingReport:
+    sample_size: int
+    all_pairs: int
+    candidate_pairs: int
+    true_pairs: int
+    found_pairs: int
+
+    @property
+    def recall(self) -> float:
+        if self.true_pairs == 0:
+            return 1.0
+        return self.found_pairs / self.true_pairs
+
+    @property
+    def reduction_ratio(self) -> float:
+        """Share of all pairs the index did not need to score."""
+        if self.all_pairs == 0:
+            return 0.0
+        return 1.0 - self.candidate_pairs / self.all_pairs
+
+
+def blocking_recall(
+    keys: Sequence[str],
+    threshold: float = 0.92,
+    q: int = 3,
+    sample_size: int = 500,
+    seed: int = 0,
+) -> BlockingReport:
+    """Compare blocked candidates with exhaustive scoring on a random sample."""
+    keys = list(keys)
+    if len(keys) > sample_size:
+        keys = random.Random(seed).sample(keys, sample_size)
+
+    truth = {(i, j) for i, j, _ in similar_pairs(keys, threshold)}
+    candidates = set(candidate_pairs(keys, threshold=threshold, q=q))
+    n = len(keys)
+    return BlockingReport(
+        sample_size=n,
+        all_pairs=n * (n - 1) // 2,
+        candidate_pairs=len(candidates),
+        true_pairs=len(truth),
+        found_pairs=len(truth & candidates),
+    )
@@ -0,0 +1,133 @@
+"""Duplicate clustering with cluster IDs that persist across runs.
+
+Pairwise matches from every strategy (exact key, URL, fuzzy name) are
+merged into connected components with a union-find structure, so
+transitive duplicates (A~B by URL, B~C by name) land in one cluster.
+
+Cluster IDs are carried over from the previous run's assignment file,
+keyed by :func:`record_key`. A record whose country, city, name or URL
+keys are unchanged keeps its cluster ID unless its cluster merges with
+another; new or edited records either join an existing cluster or get a
+fresh ID. The components themselves are rebuilt from the full set of
+matches each run; only the IDs are incremental.
+"""
+
+from __future__ import annotations
+
+import csv
+import hashlib
+import re
+from collections import Counter, defaultdict
+from collections.abc import Hashable, Iterable, Mapping, Sequence
+from pathlib import Path
+
+CLUSTER_ID_PREFIX = "CL"
+_CLUSTER_ID_RE = re.compile(rf"^{CLUSTER_ID_PREFIX}(\d+)$")
+
+
+class UnionFind:
+    """Disjoint sets with path halving and union by size."""
+
+    def __init__(self, items: Iterable[Hashable] = ()) -> None:
+        self._parent: dict[Hashable, Hashable] = {}
+        self._size: dict[Hashable, int] = {}
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self._parent
+
+    def add(self, item: Hashable) -> None:
+        if item not in self._parent:
+            self._parent[item] = item
+            self._size[item] = 1
+
+    def find(self, item: Hashable) -> Hashable:
+        parent = self._parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, a: Hashable, b: Hashable) -> Hashable:
+        """Merge the sets of *a* and *b* (adding either if unseen); return the root."""
+        self.add(a)
+        self.add(b)
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return root_a
+        if self._size[root_a] < self._size[root_b]:
+            root_a, root_b = root_b, root_a
+        self._parent[root_b] = root_a
+        self._size[root_a] += self._size.pop(root_b)
+        return root_a
+
+    def groups(self) -> list[list[Hashable]]:
+        """Components in first-seen order, each in insertion order."""
+        members: dict[Hashable, list[Hashable]] = defaultdict(list)
+        for item in self._parent:
+            members[self.find(item)].append(item)
+        return list(members.values())
+
+
+def record_key(country_key: str, city_key: str, name_key: str, url_key: str = "") -> str:
+    """Stable identity of a record, derived from its normalized keys."""
+    raw = "\x1f".join([country_key, city_key, name_key, url_key])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _format_cluster_id(number: int) -> str:
+    return f"{CLUSTER_ID_PREFIX}{number:06d}"
+
+
+def assign_cluster_ids(
+    components: Sequence[Sequence[str]],
+    previous: Mapping[str, str] | None = None,
+) -> dict[str, str]:
+    """Map every record key in *components* to a cluster ID.
+
+    Each component inherits the previous ID held by most of its members
+    (ties go to the lower ID). A previous ID is reused by at most one
+    component; larger components claim first, so when an old cluster
+    splits, its biggest part keeps the ID. Remaining components get new
+    IDs numbered after the highest previous one.
+    """
+    previous = previous or {}
+    numbers = [int(m.group(1)) for cid in previous.values() if (m := _CLUSTER_ID_RE.match(cid))]
+    next_number = max(numbers, default=0) + 1
+
+    order = sorted(range(len(components)), key=lambda c: (-len(components[c]), min(components[c], default="")))
+    claimed: set[str] = set()
+    assignment: dict[str, str] = {}
+    for c in order:
+        members = components[c]
+        votes = Counter(previous[key] for key in members if key in previous)
+        ranked = sorted(votes.items(), key=lambda kv: (-kv[1], kv[0]))
+        cluster_id = next((cid for cid, _ in ranked if cid not in claimed), None)
+        if cluster_id is None:
+            cluster_id = _format_cluster_id(next_number)
+            next_number += 1
+        claimed.add(cluster_id)
+        for key in members:
+            assignment[key] = cluster_id
+    return assignment
+
+
+def load_cluster_ids(path: str | Path) -> dict[str, str]:
+    """Read ``record_key -> cluster_id`` from a previous run (empty if absent)."""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with path.open(newline="", encoding="utf-8") as fh:
+        return {row["record_key"]: row["cluster_id"] for row in csv.DictReader(fh)}
+
+
+def save_cluster_ids(assignment: Mapping[str, str], path: str | Path) -> None:
+    """Write ``record_key -> cluster_id`` for the next run, sorted by key."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["record_key", "cluster_id"])
+        for key in sorted(assignment):
+            writer.writerow([key, assignment[key]])
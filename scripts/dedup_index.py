@@ -0,0 +1,214 @@
+"""On-disk duplicate index for incremental deduplication.
+
+The index stores the normalized keys of an accepted record set (e.g. the
+last gold snapshot): country, city and name keys plus the normalized URL.
+A new export is deduplicated by matching only the records whose
+:func:`scripts.dedup_clusters.record_key` is not in the index, so the cost
+scales with the delta rather than with the whole export.
+
+Matching mirrors ``detect_duplicates.py``; all strategies stay within one
+country + city:
+
+- ``key``: same name key;
+- ``url``: same non-empty normalized URL;
+- ``fuzzy``: different name keys with ``SequenceMatcher`` ratio >= threshold.
+
+Name signatures (the q-gram index from :mod:`scripts.blocking`) are built
+lazily, only for the country + city groups the delta touches.
+
+Records can carry a caller ``ref`` (e.g. the gold ``id``). An edited
+record gets a new record key but keeps its ref: :meth:`DedupIndex.match`
+does not report it as a duplicate of its own earlier version, and
+``add(..., replace=True)`` swaps that version out instead of keeping both.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from collections import defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from scripts.blocking import QGramIndex, gram_frequencies
+from scripts.dedup_clusters import record_key
+from scripts.normalize import NORMALIZATION_VERSION
+from scripts.similarity import RatioScorer
+
+INDEX_VERSION = 1
+
+
+@dataclass(frozen=True)
+class IndexedRecord:
+    record_key: str
+    country_key: str
+    city_key: str
+    name_key: str
+    url_key: str = ""
+    ref: str = ""  # caller's identifier, e.g. the gold ``id``
+
+
+@dataclass(frozen=True)
+class DedupMatch:
+    """A new record matched to an indexed one by one strategy."""
+
+    record_key: str
+    matched_key: str
+    matched_ref: str
+    strategy: str
+    similarity: float
+
+
+@dataclass
+class _Group:
+    """Records of one country + city; ids are positions in ``records``."""
+
+    records: list[IndexedRecord] = field(default_factory=list)
+    removed: set[int] = field(default_factory=set)  # replaced ids, kept so positions stay valid
+    by_name: dict[str, list[int]] = field(default_factory=lambda: defaultdict(list))
+    by_url: dict[str, list[int]] = field(default_factory=lambda: defaultdict(list))
+    names: QGramIndex | None = None
+
+
+class DedupIndex:
+    """Normalized keys of accepted records, grouped by country + city."""
+
+    def __init__(self, threshold: float = 0.92, q: int = 3, backend: str = "auto") -> None:
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError(f"threshold must be in (0, 1], got {threshold}")
+        self.threshold = threshold
+        self.q = q
+        self._scorer = RatioScorer(backend)
+        self._groups: dict[tuple[str, str], _Group] = {}
+        self._keys: set[str] = set()
+        self._by_ref: dict[str, tuple[tuple[str, str], int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._keys
+
+    def _names(self, group: _Group) -> QGramIndex:
+        if group.names is None:
+            keys = [r.name_key for r in group.records]
+            group.names = QGramIndex(self.threshold, self.q, gram_frequencies(keys, self.q))
+            for name in keys:
+                group.names.add(name)
+        return group.names
+
+    def add(
+        self,
+        country_key: str,
+        city_key: str,
+        name_key: str,
+        url_key: str = "",
+        ref: str = "",
+        replace: bool = False,
+    ) -> str:
+        """Index a record and return its record key (no-op if already indexed).
+
+        With *replace*, an indexed record holding the same non-empty *ref*
+        under another key (an earlier version of this record) is removed.
+        """
+        key = record_key(country_key, city_key, name_key, url_key)
+        if replace and ref and ref in self._by_ref:
+            group_key, rid = self._by_ref[ref]
+            if self._groups[group_key].records[rid].record_key != key:
+                self._remove(group_key, rid)
+        if key in self._keys:
+            return key
+        self._keys.add(key)
+        group = self._groups.setdefault((country_key, city_key), _Group())
+        rid = len(group.records)
+        group.records.append(IndexedRecord(key, country_key, city_key, name_key, url_key, ref))
+        group.by_name[name_key].append(rid)
+        if url_key:
+            group.by_url[url_key].append(rid)
+        if group.names is not None:
+            group.names.add(name_key)
+        if ref:
+            self._by_ref.setdefault(ref, ((country_key, city_key), rid))
+        return key
+
+    def _remove(self, group_key: tuple[str, str], rid: int) -> None:
+        group = self._groups[group_key]
+        record = group.records[rid]
+        group.removed.add(rid)
+        group.by_name[record.name_key].remove(rid)
+        if record.url_key:
+            group.by_url[record.url_key].remove(rid)
+        self._keys.discard(record.record_key)
+        if self._by_ref.get(record.ref) == (group_key, rid):
+            del self._by_ref[record.ref]
+
+    def match(
+        self, country_key: str, city_key: str, name_key: str, url_key: str = "", ref: str = ""
+    ) -> list[DedupMatch]:
+        """Indexed records in the same country + city that duplicate this one.
+
+        Indexed records with the same non-empty *ref* are earlier versions
+        of this record, not duplicates, and are skipped.
+        """
+        group = self._groups.get((country_key, city_key))
+        if group is None:
+            return []
+        key = record_key(country_key, city_key, name_key, url_key)
+        found: list[tuple[int, str, float]] = [(rid, "key", 1.0) for rid in group.by_name.get(name_key, ())]
+        if url_key:
+            found += [(rid, "url", 1.0) for rid in group.by_url.get(url_key, ())]
+        for rid in self._names(group).candidates(name_key):
+            if rid in group.removed:
+                continue
+            other = group.records[rid].name_key
+            if other == name_key:
+                continue
+            s = self._scorer.score(other, name_key, cutoff=self.threshold)
+            if s >= self.threshold:
+                found.append((rid, "fuzzy", s))
+        return [
+            DedupMatch(key, group.records[rid].record_key, group.records[rid].ref, strategy, s)
+            for rid, strategy, s in found
+            if not (ref and group.records[rid].ref == ref)
+        ]
+
+    def records(self) -> Iterable[IndexedRecord]:
+        for group in self._groups.values():
+            for rid, record in enumerate(group.records):
+                if rid not in group.removed:
+                    yield record
+
+    def save(self, path: str | Path) -> None:
+        """Write the index to JSON (temporary sibling, then renamed into place)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "index_version": INDEX_VERSION,
+            "normalization_version": NORMALIZATION_VERSION,
+            "records": [[r.country_key, r.city_key, r.name_key, r.url_key, r.ref] for r in self.records()],
+        }
+        tmp_path = path.with_name(path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as fh:
+            json.dump(payload, fh, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str | Path, threshold: float = 0.92, q: int = 3, backend: str = "auto") -> DedupIndex:
+        """Read an index written by :meth:`save`.
+
+        Raises ``ValueError`` if it was built under a different index or URL
+        normalization version; its keys would not match freshly computed ones.
+        """
+        with Path(path).open("r", encoding="utf-8") as fh:
+            payload = json.load(fh)
+        versions = (payload.get("index_version"), payload.get("normalization_version"))
+        if versions != (INDEX_VERSION, NORMALIZATION_VERSION):
+            raise ValueError(
+                f"{path} was built with index/normalization version {versions}, "
+                f"expected {(INDEX_VERSION, NORMALIZATION_VERSION)}; rebuild it"
+            )
+        index = cls(threshold=threshold, q=q, backend=backend)
+        for country_key, city_key, name_key, url_key, ref in payload["records"]:
+            index.add(country_key, city_key, name_key, url_key, ref)
+        return index
@@ -9,8 +9,49 @@ instead of re-implementing the logic.
 
 from __future__ import annotations
 
+import json
+import os
 import re
 import unicodedata
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+# Bump whenever normalize_url / extract_domain output changes, so caches
+# persisted by an older version are discarded instead of served.
+NORMALIZATION_VERSION = 1
+
+# Precompiled patterns shared by the scalar and batch code paths. The scheme
+# and ``www.`` prefixes are fused into one anchored pattern; the remaining
+# steps stay separate because their order matters (e.g. a trailing ``/'``).
+_SCHEME_WWW_RE = re.compile(r"^(?:https?://)?(?:www\.)?", re.IGNORECASE)
+_QUERY_FRAGMENT_RE = re.compile(r"[?#].*$")
+_TRAILING_SLASH_RE = re.compile(r"/+$")
+_TRAILING_QUOTE_RE = re.compile(r"'+$")
+_WHITESPACE_RE = re.compile(r"\s+")
+_PATH_RE = re.compile(r"/.*$")
+_QUERY_FRAGMENT_START_RE = re.compile(r"[?#]")
+
+
+def _clean_input(url: object) -> str:
+    """Return ``str(url).strip()``, or an empty string for *None* / *NaN*."""
+    if url is None:
+        return ""
+
+    # Handle pandas NaN / numpy NaN without importing pandas
+    try:
+        if url != url:  # NaN != NaN
+            return ""
+    except (TypeError, ValueError):
+        pass
+
+    return str(url).strip()
 
 
 def normalize_url(url: object) -> str:
@@ -28,27 +69,16 @@ def normalize_url(url: object) -> str:
 
     Returns an empty string for *None*, *NaN*, or blank inputs.
     """
-    if url is None:
-        return ""
-
-    # Handle pandas NaN / numpy NaN without importing pandas
-    try:
-        if url != url:  # NaN != NaN
-            return ""
-    except (TypeError, ValueError):
-        pass
-
-    s = str(url).strip()
+    s = _clean_input(url)
     if not s:
         return ""
 
     s = unicodedata.normalize("NFKC", s)
-    s = re.sub(r"^https?://", "", s, flags=re.IGNORECASE)
-    s = re.sub(r"^www\.", "", s, flags=re.IGNORECASE)
-    s = re.sub(r"[?#].*$", "", s)
-    s = re.sub(r"/+$", "", s)
-    s = re.sub(r"'+$", "", s)
-    s = re.sub(r"\s+", "", s)
+    s = _SCHEME_WWW_RE.sub("", s)
+    s = _QUERY_FRAGMENT_RE.sub("", s)
+    s = _TRAILING_SLASH_RE.sub("", s)
+    s = _TRAILING_QUOTE_RE.sub("", s)
+    s = _WHITESPACE_RE.sub("", s)
     return s.casefold()
 
 
@@ -64,21 +94,381 @@ def extract_domain(url: object) -> str:
 
     Returns an empty string for *None*, *NaN*, or blank inputs.
     """
-    if url is None:
-        return ""
-
-    try:
-        if url != url:
-            return ""
-    except (TypeError, ValueError):
-        pass
-
-    s = str(url).strip()
+    s = _clean_input(url)
     if not s:
         return ""
 
     s = unicodedata.normalize("NFKC", s)
-    s = re.sub(r"^https?://", "", s, flags=re.IGNORECASE)
-    s = re.sub(r"^www\.", "", s, flags=re.IGNORECASE)
-    s = re.sub(r"/.*$", "", s)
+    s = _SCHEME_WWW_RE.sub("", s)
+    s = _PATH_RE.sub("", s)
     return s.casefold()
+
+
+# ---------------------------------------------------------------------------
+# Batch (column) API
+# ---------------------------------------------------------------------------
+
+
+def _normalize_str(s: str) -> str:
+    """Fused :func:`normalize_url` kernel for a ``str`` value.
+
+    Skips NFKC for ASCII input (a no-op there) and replaces the anchored
+    regexes with plain string operations when the value has no newline,
+    where ``.*$`` and ``/+$`` reduce to a cut and an ``rstrip``.
+    """
+    s = s.strip()
+    if not s.isascii():
+        s = unicodedata.normalize("NFKC", s)
+    s = _SCHEME_WWW_RE.sub("", s)
+    if "\n" in s:
+        s = _QUERY_FRAGMENT_RE.sub("", s)
+        s = _TRAILING_SLASH_RE.sub("", s)
+        s = _TRAILING_QUOTE_RE.sub("", s)
+    else:
+        match = _QUERY_FRAGMENT_START_RE.search(s)
+        if match:
+            s = s[: match.start()]
+        s = s.rstrip("/").rstrip("'")
+    return "".join(s.split()).casefold()
+
+
+def _domain_str(s: str) -> str:
+    """Fused :func:`extract_domain` kernel for a ``str`` value."""
+    s = s.strip()
+    if not s.isascii():
+        s = unicodedata.normalize("NFKC", s)
+    s = _SCHEME_WWW_RE.sub("", s)
+    if "\n" in s:
+        s = _PATH_RE.sub("", s)
+    else:
+        s = s.partition("/")[0]
+    return s.casefold()
+
+
+def _as_object_series(values: Iterable[object]) -> pd.Series:
+    import pandas as pd
+
+    if isinstance(values, pd.Series):
+        return values.astype(object)
+    if not isinstance(values, (list, tuple)) and not hasattr(values, "dtype"):
+        values = list(values)
+    return pd.Series(values, dtype=object)
+
+
+def _apply_distinct(
+    values: Iterable[object],
+    scalar_fn: Callable[[object], object],
+    str_fn: Callable[[str], object],
+) -> tuple[pd.Series, np.ndarray]:
+    """Run *str_fn* once per distinct string and broadcast the result.
+
+    Non-string cells (None, NaN, numbers, ...) are rare and fall back to
+    *scalar_fn* so the output matches the scalar function exactly. Returns
+    the input as an object Series (for its index/name) and the results.
+    """
+    import numpy as np
+    import pandas as pd
+
+    series = _as_object_series(values)
+    result = np.empty(len(series), dtype=object)
+
+    raw = series.to_numpy(dtype=object)
+    is_str = np.fromiter((isinstance(v, str) for v in raw), dtype=bool, count=len(raw))
+
+    if is_str.any():
+        codes, uniques = pd.factorize(raw[is_str])
+        converted = np.empty(len(uniques), dtype=object)
+        converted[:] = [str_fn(v) for v in uniques]
+        result[is_str] = converted[codes]
+    if not is_str.all():
+        fallback = np.empty(int((~is_str).sum()), dtype=object)
+        fallback[:] = [scalar_fn(v) for v in raw[~is_str]]
+        result[~is_str] = fallback
+
+    return series, result
+
+
+def _map_batch(
+    values: Iterable[object],
+    scalar_fn: Callable[[object], str],
+    str_fn: Callable[[str], str],
+) -> pd.Series:
+    import pandas as pd
+
+    series, result = _apply_distinct(values, scalar_fn, str_fn)
+    return pd.Series(result, index=series.index, name=series.name)
+
+
+def normalize_urls(values: Iterable[object]) -> pd.Series:
+    """Vectorised :func:`normalize_url` for a whole column.
+
+    Accepts a pandas Series, a NumPy object array or any iterable, and
+    returns a Series of the same length (keeping the index of a Series
+    input). Repeated URLs are factorized so each distinct value is
+    normalized once by a fused kernel, and the output is identical to
+    ``values.apply(normalize_url)``.
+    """
+    return _map_batch(values, normalize_url, _normalize_str)
+
+
+def extract_domains(values: Iterable[object]) -> pd.Series:
+    """Vectorised :func:`extract_domain` for a whole column.
+
+    Same input and output contract as :func:`normalize_urls`.
+    """
+    return _map_batch(values, extract_domain, _domain_str)
+
+
+# ---------------------------------------------------------------------------
+# Single-pass parsing
+# ---------------------------------------------------------------------------
+
+# Second-level labels under which registrations happen one level deeper
+# (``foodbank.org.uk`` rather than ``org.uk``). Deliberately small: this is a
+# grouping key for matching, not a full Public Suffix List.
+_MULTI_LABEL_SUFFIXES = frozenset(
+    {
+        "ac.uk", "co.uk", "gov.uk", "ltd.uk", "me.uk", "net.uk", "nhs.uk", "org.uk", "plc.uk", "sch.uk",
+        "ac.at", "co.at", "gv.at", "or.at",
+        "com.cy", "org.cy",
+        "com.es", "gob.es", "nom.es", "org.es",
+        "com.gr", "gov.gr", "org.gr",
+        "co.hu", "org.hu",
+        "com.mt", "org.mt",
+        "com.pl", "net.pl", "org.pl",
+        "com.pt", "gov.pt", "org.pt",
+        "com.tr", "org.tr",
+    }
+)
+
+
+class UrlParts(NamedTuple):
+    """Everything the matching code derives from one source URL."""
+
+    url_norm: str
+    domain: str
+    path_segments: tuple[str, ...]
+    path_seg_1: str | None
+    registrable_domain: str
+
+
+_EMPTY_PARTS = UrlParts("", "", (), None, "")
+
+
+def registrable_domain(domain: str) -> str:
+    """Reduce a domain from :func:`extract_domain` to its registrable part.
+
+    Drops any port and subdomains, keeping one label below the public
+    suffix (``events.foodsharing.de`` -> ``foodsharing.de``,
+    ``www.foodbank.org.uk:443`` -> ``foodbank.org.uk``). IP addresses and
+    single-label hosts are returned without the port.
+    """
+    host = domain.rsplit(":", 1)[0] if domain.count(":") == 1 else domain
+    host = host.rstrip(".")
+    labels = host.split(".")
+    if len(labels) <= 2 or all(label.isdigit() for label in labels):
+        return host
+    keep = 3 if ".".join(labels[-2:]) in _MULTI_LABEL_SUFFIXES else 2
+    return ".".join(labels[-keep:])
+
+
+def _parse_str(s: str) -> UrlParts:
+    """Fused :func:`parse_url` kernel for a ``str`` value."""
+    s = s.strip()
+    if not s:
+        return _EMPTY_PARTS
+    if not s.isascii():
+        s = unicodedata.normalize("NFKC", s)
+    s = _SCHEME_WWW_RE.sub("", s)
+
+    if "\n" in s:
+        domain = _PATH_RE.sub("", s).casefold()
+        s = _QUERY_FRAGMENT_RE.sub("", s)
+        s = _TRAILING_SLASH_RE.sub("", s)
+        s = _TRAILING_QUOTE_RE.sub("", s)
+    else:
+        domain = s.partition("/")[0].casefold()
+        match = _QUERY_FRAGMENT_START_RE.search(s)
+        if match:
+            s = s[: match.start()]
+        s = s.rstrip("/").rstrip("'")
+    url_norm = "".join(s.split()).casefold()
+
+    _, sep, path = url_norm.partition("/")
+    segments = tuple(seg for seg in path.split("/") if seg) if sep else ()
+    return UrlParts(
+        url_norm=url_norm,
+        domain=domain,
+        path_segments=segments,
+        path_seg_1=segments[0] if segments else None,
+        registrable_domain=registrable_domain(domain),
+    )
+
+
+def parse_url(url: object) -> UrlParts:
+    """Normalize a URL and split it into its matching keys in one pass.
+
+    ``url_norm`` equals :func:`normalize_url` and ``domain`` equals
+    :func:`extract_domain`; ``path_segments`` are the non-empty ``/``
+    segments after the domain of ``url_norm`` and ``path_seg_1`` the first
+    of them (or *None*). *None*, *NaN* and blank inputs give empty parts.
+    """
+    s = _clean_input(url)
+    if not s:
+        return _EMPTY_PARTS
+    return _parse_str(s)
+
+
+def parse_urls(values: Iterable[object]) -> pd.DataFrame:
+    """Columnar :func:`parse_url`.
+
+    Returns a DataFrame with one column per :class:`UrlParts` field and the
+    index of a Series input. Each distinct URL is parsed once.
+    """
+    import pandas as pd
+
+    series, result = _apply_distinct(values, parse_url, _parse_str)
+    return pd.DataFrame.from_records(result.tolist(), columns=UrlParts._fields, index=series.index)
+
+
+# ---------------------------------------------------------------------------
+# Opt-in memoization
+# ---------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    capacity: int
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / total
+
+
+class UrlNormalizationCache:
+    """Bounded LRU memo for :func:`normalize_url` and :func:`extract_domain`.
+
+    Only ``str`` inputs are cached; None/NaN/numbers go straight to the
+    scalar functions. Batch methods look up each distinct value once, so
+    a repeated URL within a column counts as a single hit or miss.
+
+    Example::
+
+        cache = UrlNormalizationCache.load("reports/url_cache.json")
+        df["url_norm"] = cache.normalize_urls(df["source_url"])
+        cache.save("reports/url_cache.json")
+        print(cache.stats.hit_rate)
+    """
+
+    def __init__(self, capacity: int = 250_000) -> None:
+        if capacity < 1:
+            raise ValueError(f"capacity must be >= 1, got {capacity}")
+        self.capacity = capacity
+        self._entries: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            evictions=self._evictions,
+            size=len(self._entries),
+            capacity=self.capacity,
+        )
+
+    def clear(self) -> None:
+        """Drop all entries and reset the counters."""
+        self._entries.clear()
+        self._hits = self._misses = self._evictions = 0
+
+    def _lookup(self, kind: str, value: str, compute: Callable[[str], str]) -> str:
+        key = (kind, value)
+        try:
+            result = self._entries[key]
+        except KeyError:
+            self._misses += 1
+            result = compute(value)
+            self._store(key, result)
+            return result
+        self._hits += 1
+        self._entries.move_to_end(key)
+        return result
+
+    def _store(self, key: tuple[str, str], result: str) -> None:
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def normalize_url(self, url: object) -> str:
+        """Cached :func:`normalize_url`."""
+        if not isinstance(url, str):
+            return normalize_url(url)
+        return self._lookup("url", url, _normalize_str)
+
+    def extract_domain(self, url: object) -> str:
+        """Cached :func:`extract_domain`."""
+        if not isinstance(url, str):
+            return extract_domain(url)
+        return self._lookup("domain", url, _domain_str)
+
+    def normalize_urls(self, values: Iterable[object]) -> pd.Series:
+        """Cached :func:`normalize_urls`."""
+        return _map_batch(values, normalize_url, lambda v: self._lookup("url", v, _normalize_str))
+
+    def extract_domains(self, values: Iterable[object]) -> pd.Series:
+        """Cached :func:`extract_domains`."""
+        return _map_batch(values, extract_domain, lambda v: self._lookup("domain", v, _domain_str))
+
+    def save(self, path: str | Path) -> None:
+        """Write entries (least recently used first) to a JSON file.
+
+        The file is written to a temporary sibling and renamed into place,
+        so an interrupted save never leaves a truncated cache behind.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "normalization_version": NORMALIZATION_VERSION,
+            "entries": [[kind, value, result] for (kind, value), result in self._entries.items()],
+        }
+        tmp_path = path.with_name(path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as fh:
+            json.dump(payload, fh, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str | Path, capacity: int = 250_000) -> UrlNormalizationCache:
+        """Return a cache warmed from *path*.
+
+        A missing file, or one written under a different
+        ``NORMALIZATION_VERSION``, yields an empty cache. If the file holds
+        more than *capacity* entries, the most recently used are kept.
+        """
+        cache = cls(capacity=capacity)
+        path = Path(path)
+        if not path.exists():
+            return cache
+
+        with path.open("r", encoding="utf-8") as fh:
+            payload = json.load(fh)
+        if payload.get("normalization_version") != NORMALIZATION_VERSION:
+            return cache
+
+        for kind, value, result in payload.get("entries", [])[-capacity:]:
+            cache._entries[(kind, value)] = result
+        return cache
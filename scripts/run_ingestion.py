@@ -1,34 +1,217 @@
 #!/usr/bin/env python3
-"""Run ingestion classification for one or more URLs."""
+"""Run ingestion classification for one or more URLs.
+
+URLs come from ``--url`` (repeatable) and/or ``--url-file`` (one per line,
+``-`` for stdin; blank lines and ``#`` comments are skipped), so a whole
+city batch runs in one process. Up to ``--concurrency`` URLs are
+classified at once through a single classifier (one HTTP client), with
+``--rpm`` capping the requests per minute across all of them, and
+snapshots are streamed as they finish: to ``--output`` (``.jsonl``,
+appended line by line, or a ``.parquet`` dataset directory, one part file
+per ``--part-size`` snapshots) or as tab-separated lines on stdout.
+"""
 
 from __future__ import annotations
 
 import argparse
-from pathlib import Path
+import contextlib
+import dataclasses
+import importlib.util
+import json
 import sys
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, TextIO
 
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from ingestion.config import load_config
-from ingestion.llm_classifier import LLMClassifier
+
+def read_urls(urls: Iterable[str] = (), url_file: str | None = None, stdin: TextIO = sys.stdin) -> list[str]:
+    """URLs from the command line and a URL file (``-`` = stdin), in order, without repeats."""
+    out = [u.strip() for u in urls if u and u.strip()]
+    if url_file:
+        with contextlib.nullcontext(stdin) if url_file == "-" else open(url_file, encoding="utf-8") as fh:
+            out += [line.strip() for line in fh if line.strip() and not line.lstrip().startswith("#")]
+    return list(dict.fromkeys(out))
+
+
+class RateLimiter:
+    """Spaces calls to at most *rpm* per minute across threads (first come, first served)."""
+
+    def __init__(self, rpm: float, clock=time.monotonic, sleep=time.sleep):
+        if rpm <= 0:
+            raise ValueError(f"rpm must be positive, got {rpm}")
+        self.interval = 60.0 / rpm
+        self._clock = clock
+        self._sleep = sleep
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = self._clock()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            self._sleep(start - now)
+
+
+def classify_many(
+    classifier, urls: Iterable[str], concurrency: int = 8, limiter: RateLimiter | None = None
+) -> Iterator[tuple[str, Any]]:
+    """Yield (url, snapshot or exception) as classifications finish.
+
+    Uses ``classifier.classify_many`` when the classifier has one (it then
+    does its own rate limiting); otherwise runs ``classifier.classify`` on a
+    thread pool, at most *concurrency* URLs at a time, sharing the one
+    classifier (and its HTTP client) and, when given, one *limiter*.
+    """
+    if hasattr(classifier, "classify_many"):
+        for snap in classifier.classify_many(urls, concurrency=concurrency):
+            yield snap.source_url, snap
+        return
+
+    def classify(url: str) -> Any:
+        if limiter is not None:
+            limiter.acquire()
+        return classifier.classify(source_url=url)
+
+    urls = iter(urls)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = {}
+
+        def submit_next() -> bool:
+            url = next(urls, None)
+            if url is None:
+                return False
+            pending[pool.submit(classify, url)] = url
+            return True
+
+        while len(pending) < concurrency and submit_next():
+            pass
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                url = pending.pop(future)
+                error = future.exception()
+                yield url, future.result() if error is None else error
+                submit_next()
+
+
+def snapshot_record(snap: Any) -> dict[str, Any]:
+    """Plain dict of a classification snapshot (dataclass, pydantic model or object)."""
+    if dataclasses.is_dataclass(snap):
+        record = dataclasses.asdict(snap)
+    elif hasattr(snap, "model_dump"):
+        record = snap.model_dump()
+    else:
+        record = dict(vars(snap))
+    return {k: v.isoformat() if hasattr(v, "isoformat") else v for k, v in record.items()}
+
+
+def parquet_engine() -> str:
+    """Name of an installed pandas Parquet engine; raises ImportError if there is none."""
+    for engine in ("pyarrow", "fastparquet"):
+        if importlib.util.find_spec(engine) is not None:
+            return engine
+    raise ImportError("Parquet output needs pyarrow (pip install '.[parquet]') or fastparquet; or use .jsonl")
+
+
+class SnapshotWriter:
+    """Writes snapshot records to .jsonl (streamed), .parquet (in parts) or stdout (TSV).
+
+    A ``.parquet`` output is a dataset directory: every *part_size* records
+    go to a new ``part-NNNNN.parquet`` file, so a crash loses at most one
+    part, and ``pandas.read_parquet`` reads the directory as one table.
+    Parts from earlier runs are kept, like appended .jsonl lines.
+    """
+
+    def __init__(self, path: Path | None, part_size: int = 1000):
+        self.path = path
+        self.part_size = part_size
+        self.records: list[dict[str, Any]] = []
+        self._fh = None
+        self._engine = None
+        if path is not None and path.suffix not in (".jsonl", ".parquet"):
+            raise ValueError(f"--output must end in .jsonl or .parquet, got {path}")
+        if path is not None and path.suffix == ".parquet":
+            if path.is_file():
+                raise ValueError(f"{path} is a file; .parquet output is written as a directory of parts")
+            self._engine = parquet_engine()
+            path.mkdir(parents=True, exist_ok=True)
+            self._parts = 1 + max((int(p.stem[5:]) for p in path.glob("part-*.parquet") if p.stem[5:].isdigit()),
+                                  default=-1)
+        elif path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = path.open("a", encoding="utf-8")
+
+    def write(self, snap: Any) -> None:
+        if self.path is None:
+            print(f"{snap.source_url}\t{snap.label}\t{snap.confidence}\t{snap.executed_at_utc}", flush=True)
+        elif self._fh is not None:
+            self._fh.write(json.dumps(snapshot_record(snap), ensure_ascii=False, default=str) + "\n")
+            self._fh.flush()
+        else:
+            self.records.append(snapshot_record(snap))
+            if len(self.records) >= self.part_size:
+                self._write_part()
+
+    def _write_part(self) -> None:
+        import pandas as pd
+
+        part = self.path / f"part-{self._parts:05d}.parquet"
+        tmp = part.with_name(f".{part.name}.tmp")  # not picked up by readers until complete
+        pd.DataFrame(self.records).to_parquet(tmp, engine=self._engine, index=False)
+        tmp.replace(part)
+        self._parts += 1
+        self.records = []
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+        elif self.records:
+            self._write_part()
 
 
 def main() -> int:
+    from ingestion.config import load_config
+    from ingestion.llm_classifier import LLMClassifier
+
     parser = argparse.ArgumentParser(description="Run ingestion classification entry point")
     parser.add_argument("--url", action="append", dest="urls", help="Source URL to classify (repeatable)")
+    parser.add_argument("--url-file", help="File with one URL per line ('-' reads stdin)")
+    parser.add_argument("--output", type=Path, help="Write snapshots to a .jsonl file or .parquet directory instead of stdout")
+    parser.add_argument("--part-size", type=int, default=1000, help="Snapshots per .parquet part file (default: 1000)")
+    parser.add_argument("--concurrency", type=int, default=8, help="URLs classified at once (default: 8)")
+    parser.add_argument("--rpm", type=float, default=0, help="Max classifications started per minute, 0 = no limit")
     args = parser.parse_args()
 
-    urls = args.urls or ["https://example.org"]
+    limiter = RateLimiter(args.rpm) if args.rpm > 0 else None
+    urls = read_urls(args.urls or [], args.url_file) or ["https://example.org"]
     cfg = load_config()
     classifier = LLMClassifier(model_version="v3.0.0", prompt_version="public-skeleton")
 
-    print(f"model={cfg.openai_model} urls={len(urls)}")
-    for url in urls:
-        snap = classifier.classify(source_url=url)
-        print(f"{snap.source_url}\t{snap.label}\t{snap.confidence}\t{snap.executed_at_utc}")
-    return 0
+    print(f"model={cfg.openai_model} urls={len(urls)} concurrency={args.concurrency} rpm={args.rpm or 'off'}",
+          file=sys.stderr)
+    writer = SnapshotWriter(args.output, args.part_size)
+    failed = 0
+    try:
+        for url, snap in classify_many(classifier, urls, args.concurrency, limiter):
+            if isinstance(snap, Exception):
+                failed += 1
+                print(f"{url}\tERROR\t{snap}", file=sys.stderr)
+            else:
+                writer.write(snap)
+    finally:
+        writer.close()
+    if failed:
+        print(f"{failed} of {len(urls)} URL(s) failed", file=sys.stderr)
+    return 1 if failed else 0
 
 
 if __name__ == "__main__":
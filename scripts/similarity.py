@@ -0,0 +1,135 @@
+"""difflib-compatible string similarity for fuzzy name matching.
+
+Scores are exactly ``difflib.SequenceMatcher(None, a, b).ratio()``. Two
+things make it cheaper than building a SequenceMatcher per pair:
+
+- a *cutoff*: pairs whose length bound or character-multiset bound
+  (``real_quick_ratio`` / ``quick_ratio``) is already below it exit early
+  without computing matching blocks;
+- reuse of the index difflib builds over ``b`` when one string is scored
+  against many others.
+
+The matcher class is pluggable. ``cdifflib`` (a C port of SequenceMatcher
+with identical results) is used when installed; otherwise the standard
+library implementation is the fallback.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator, Sequence
+from difflib import SequenceMatcher
+
+try:
+    from cdifflib import CSequenceMatcher
+except ImportError:  # optional speed-up, see pyproject "speedups" extra
+    CSequenceMatcher = None
+
+
+def available_backends() -> list[str]:
+    """Names accepted by :func:`get_matcher_class`, fastest first."""
+    backends = ["difflib"]
+    if CSequenceMatcher is not None:
+        backends.insert(0, "cdifflib")
+    return backends
+
+
+def get_matcher_class(backend: str = "auto") -> type[SequenceMatcher]:
+    """Return the SequenceMatcher implementation for *backend*.
+
+    ``"auto"`` picks ``cdifflib`` when it is installed and ``difflib``
+    otherwise.
+    """
+    if backend == "auto":
+        backend = available_backends()[0]
+    if backend == "cdifflib":
+        if CSequenceMatcher is None:
+            raise ImportError("backend 'cdifflib' requested but the cdifflib package is not installed")
+        return CSequenceMatcher
+    if backend == "difflib":
+        return SequenceMatcher
+    raise ValueError(f"Unknown similarity backend: {backend!r} (expected one of {available_backends()})")
+
+
+class RatioScorer:
+    """Reusable ``SequenceMatcher.ratio`` with an optional cutoff.
+
+    Scoring many ``a`` strings against the same ``b`` (in that argument
+    order) reuses difflib's index of ``b``.
+    """
+
+    def __init__(self, backend: str = "auto") -> None:
+        self.backend = backend
+        self._matcher = get_matcher_class(backend)(None, "", "")
+        self._matcher_b: str | None = None
+        self._b: str | None = None
+        self._b_counts: dict[str, int] = {}
+
+    def score(self, a: str, b: str, cutoff: float = 0.0) -> float:
+        """Return ``SequenceMatcher(None, a, b).ratio()``.
+
+        With *cutoff* > 0, pairs below it score ``0.0`` (returned as soon
+        as an upper bound proves it); any other value is the exact ratio.
+        """
+        total = len(a) + len(b)
+        if total == 0:
+            return 1.0
+        if cutoff > 0 and 2.0 * min(len(a), len(b)) / total < cutoff:
+            return 0.0
+
+        if cutoff > 0 and self._quick_ratio(a, b) < cutoff:
+            return 0.0
+
+        matcher = self._matcher
+        if b != self._matcher_b:
+            matcher.set_seq2(b)
+            self._matcher_b = b
+        matcher.set_seq1(a)
+        result = matcher.ratio()
+        return result if result >= cutoff else 0.0
+
+    def _quick_ratio(self, a: str, b: str) -> float:
+        """``SequenceMatcher.quick_ratio`` (multiset bound) with cached counts of *b*.
+
+        Kept outside the matcher so pruned pairs never touch it, which
+        matters for backends whose per-call overhead dominates short names.
+        """
+        if b != self._b:
+            counts: dict[str, int] = {}
+            for ch in b:
+                counts[ch] = counts.get(ch, 0) + 1
+            self._b = b
+            self._b_counts = counts
+
+        avail = dict(self._b_counts)
+        matches = 0
+        for ch in a:
+            n = avail.get(ch, 0)
+            if n > 0:
+                avail[ch] = n - 1
+                matches += 1
+        return 2.0 * matches / (len(a) + len(b))
+
+
+def ratio(a: str, b: str, cutoff: float = 0.0, backend: str = "auto") -> float:
+    """One-off :meth:`RatioScorer.score`."""
+    return RatioScorer(backend).score(a, b, cutoff)
+
+
+def similar_pairs(
+    names: Sequence[str],
+    threshold: float,
+    backend: str = "auto",
+) -> Iterator[tuple[int, int, float]]:
+    """Yield ``(i, j, ratio)`` for every ``i < j`` with ratio >= *threshold*.
+
+    The ratio is ``SequenceMatcher(None, names[i], names[j]).ratio()``; the
+    loop fixes ``names[j]`` and varies ``names[i]`` so the index of the
+    second sequence is built once per name rather than once per pair.
+    """
+    scorer = RatioScorer(backend)
+    for j in range(1, len(names)):
+        b = names[j]
+        for i in range(j):
+            s = scorer.score(names[i], b, cutoff=threshold)
+            if s >= threshold:
+                yield i, j, s
@@ -0,0 +1,186 @@
+"""Tests for the Azure blob transfers, against a local Azurite-style Blob service stand-in."""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import escape
+
+import pytest
+
+pytest.importorskip("azure.storage.blob")
+
+import azure_blob_sync as sync
+
+# Azurite's well-known development account
+ACCOUNT = "devstoreaccount1"
+KEY = "Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw=="
+
+
+class _BlobService(BaseHTTPRequestHandler):
+    """The Blob REST calls the SDK makes for put/stage/commit, ranged get and list (no auth checks)."""
+
+    protocol_version = "HTTP/1.1"
+
+    def _target(self) -> tuple[str, str, dict]:
+        url = urlparse(self.path)
+        parts = unquote(url.path).split("/", 3)[2:]  # drop "" and the account name
+        return parts[0], parts[1] if len(parts) > 1 else "", {k: v[0] for k, v in parse_qs(url.query).items()}
+
+    def _reply(self, status: int, body: bytes = b"", headers: dict | None = None) -> None:
+        self.send_response(status)
+        for name, value in {"ETag": '"0x1"', "Last-Modified": formatdate(usegmt=True),
+                            "x-ms-version": self.headers.get("x-ms-version", ""), **(headers or {})}.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self) -> None:
+        container, blob, query = self._target()
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        store = self.server.store
+        with self.server.lock:
+            self.server.requests.append(("PUT", query.get("comp", "blob")))
+            if query.get("comp") == "block":
+                self.server.blocks[(container, blob, query["blockid"])] = body
+            elif query.get("comp") == "blocklist":
+                ids = re.findall(rb"<(?:Latest|Uncommitted|Committed)>([^<]+)<", body)
+                store[(container, blob)] = b"".join(
+                    self.server.blocks.pop((container, blob, i.decode())) for i in ids
+                )
+            elif query.get("restype") != "container":
+                store[(container, blob)] = body
+        self._reply(201)
+
+    def do_GET(self) -> None:
+        container, blob, query = self._target()
+        store = self.server.store
+        if query.get("comp") == "list":
+            prefix = query.get("prefix", "")
+            items = sorted((b, d) for (c, b), d in list(store.items()) if c == container and b.startswith(prefix))
+            xml = "".join(
+                f"<Blob><Name>{escape(b)}</Name><Properties><Last-Modified>{formatdate(usegmt=True)}</Last-Modified>"
+                f"<Etag>0x1</Etag><Content-Length>{len(d)}</Content-Length><BlobType>BlockBlob</BlobType>"
+                f"</Properties></Blob>" for b, d in items
+            )
+            body = (f'<?xml version="1.0" encoding="utf-8"?><EnumerationResults ContainerName="{container}">'
+                    f"<Prefix>{escape(prefix)}</Prefix><Blobs>{xml}</Blobs><NextMarker /></EnumerationResults>")
+            self._reply(200, body.encode(), {"Content-Type": "application/xml"})
+            return
+
+        data = store.get((container, blob))
+        if data is None:
+            self._reply(404, headers={"x-ms-error-code": "BlobNotFound"})
+            return
+        with self.server.lock:
+            self.server.requests.append(("GET", "range" if "x-ms-range" in self.headers else "blob"))
+        headers = {"x-ms-blob-type": "BlockBlob", "Content-Type": "application/octet-stream"}
+        ranged = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("x-ms-range", ""))
+        if not ranged:
+            self._reply(200, data, headers)
+        elif not data:
+            self._reply(416, headers={"x-ms-error-code": "InvalidRange"})
+        else:
+            start = int(ranged.group(1))
+            end = min(int(ranged.group(2) or len(data) - 1), len(data) - 1)
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            self._reply(206, data[start : end + 1], headers)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def blob_service(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _BlobService)
+    server.store, server.blocks, server.requests, server.lock = {}, {}, [], threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}/{ACCOUNT}"
+    monkeypatch.setattr(sync, "CONNECTION_STRING",
+                        f"DefaultEndpointsProtocol=http;AccountName={ACCOUNT};AccountKey={KEY};BlobEndpoint={endpoint};")
+    monkeypatch.setattr(sync, "CONTAINER_NAME", "test")
+    monkeypatch.setattr(sync, "BLOCK_SIZE", 64 * 1024)  # exercise block uploads / ranged downloads
+    sync.get_blob_service_client.cache_clear()
+    yield server
+    sync.get_blob_service_client.cache_clear()
+    server.shutdown()
+    server.server_close()
+
+
+def _write_tree(base: Path) -> dict[str, bytes]:
+    files = {
+        "a.csv": b"city,name\ncork,fridge\n",
+        "empty.txt": b"",
+        "nested/big.bin": os.urandom(300 * 1024),
+    }
+    for name, data in files.items():
+        (base / name).parent.mkdir(parents=True, exist_ok=True)
+        (base / name).write_bytes(data)
+    return files
+
+
+def test_client_is_created_once(blob_service) -> None:
+    assert sync.get_blob_service_client() is sync.get_blob_service_client()
+
+
+def test_upload_directory_and_download_all_round_trip(blob_service, tmp_path) -> None:
+    files = _write_tree(tmp_path / "src")
+
+    up = sync.upload_directory(tmp_path / "src", "raw", workers=3)
+    assert (up.files, up.failed, up.bytes) == (3, 0, sum(len(d) for d in files.values()))
+    assert blob_service.store[("test", "raw/nested/big.bin")] == files["nested/big.bin"]
+    assert ("PUT", "block") in blob_service.requests  # large file went up in staged blocks
+
+    down = sync.download_all("raw", tmp_path / "dst", workers=3)
+    assert (down.files, down.failed) == (3, 0)
+    assert down.mb_per_s > 0
+    for name, data in files.items():
+        assert (tmp_path / "dst" / "raw" / name).read_bytes() == data
+    assert blob_service.requests.count(("GET", "range")) > 3  # large blob came down in ranges
+
+
+def test_failed_transfers_are_counted_not_raised(blob_service, tmp_path) -> None:
+    container = sync.get_container_client()
+    stats = sync.transfer_all(sync.download_blob, [("missing.csv", tmp_path / "missing.csv", container)])
+    assert (stats.files, stats.failed) == (0, 1)
+    assert list(tmp_path.iterdir()) == []  # no partial file left behind
+
+
+def test_failed_download_keeps_the_previous_copy(blob_service, tmp_path) -> None:
+    from azure.core.exceptions import ResourceNotFoundError
+
+    local = tmp_path / "data.csv"
+    local.write_bytes(b"good copy")
+    with pytest.raises(ResourceNotFoundError):
+        sync.download_blob("missing.csv", local, verbose=False)
+    assert local.read_bytes() == b"good copy"
+    assert list(tmp_path.iterdir()) == [local]
+
+    blob_service.store[("test", "data.csv")] = b"new copy"
+    sync.download_blob("data.csv", local, verbose=False)
+    assert local.read_bytes() == b"new copy"
+
+
+@pytest.mark.parametrize("argv", [["download-all", "raw"], ["upload-dir", "src", "raw"]])
+def test_main_exits_non_zero_when_transfers_fail(blob_service, tmp_path, monkeypatch, argv) -> None:
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "a.csv").write_bytes(b"a")
+    blob_service.store[("test", "raw/gone.csv")] = b"x"
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sync, "download_blob", _fail)
+    monkeypatch.setattr(sync, "upload_blob", _fail)
+    monkeypatch.setattr("sys.argv", ["azure_blob_sync.py", *argv])
+    with pytest.raises(SystemExit) as exc:
+        sync.main()
+    assert exc.value.code == 1
+
+
+def _fail(*args, **kwargs) -> int:
+    raise OSError("connection reset")
@@ -0,0 +1,84 @@
+"""Tests for the q-gram blocking index: no true near-duplicate may be lost."""
+
+from __future__ import annotations
+
+import random
+
+import pytest
+
+from blocking import (
+    QGramIndex,
+    blocking_recall,
+    candidate_pairs,
+    gram_frequencies,
+    near_duplicate_pairs,
+    qgram_counts,
+)
+from similarity import similar_pairs
+
+
+def _names(seed: int) -> list[str]:
+    rng = random.Random(seed)
+    words = ["food", "bank", "tafel", "community", "fridge", "kitchen", "cork", "e.v.", "banco", "alimentar"]
+    names = [" ".join(rng.sample(words, rng.randint(1, 4))) for _ in range(150)]
+    # Single-character edits and very short keys exercise the length-only path
+    names += [n[:-1] + rng.choice("abcxyz") for n in names[:60]]
+    names += ["".join(rng.choice("ab ") for _ in range(rng.randint(0, 3))) for _ in range(30)]
+    return names
+
+
+class TestQGramCounts:
+    def test_multiset(self) -> None:
+        assert qgram_counts("aaaa", 2) == {"aa": 3}
+
+    def test_shorter_than_q(self) -> None:
+        assert qgram_counts("ab", 3) == {}
+
+
+class TestLossless:
+    """Blocked results must equal exhaustive scoring."""
+
+    @pytest.mark.parametrize("q", [1, 2, 3, 4])
+    @pytest.mark.parametrize("threshold", [0.92, 0.8, 0.6])
+    def test_matches_exhaustive(self, q: int, threshold: float) -> None:
+        names = _names(seed=q)
+        expected = sorted(similar_pairs(names, threshold))
+        assert sorted(near_duplicate_pairs(names, threshold=threshold, q=q)) == expected
+
+    def test_prunes_most_pairs(self) -> None:
+        names = _names(seed=5)
+        n = len(names)
+        assert len(list(candidate_pairs(names))) < n * (n - 1) // 2 // 4
+
+    def test_incremental_index_without_frequencies(self) -> None:
+        names = _names(seed=8)
+        index = QGramIndex(threshold=0.92)
+        for name in names:
+            index.add(name)
+        probe = max(names, key=len) + "s"
+        true_ids = {i for i, name in enumerate(names) if next(similar_pairs([name, probe], 0.92), None)}
+        assert true_ids
+        assert true_ids <= set(index.candidates(probe))
+
+
+class TestBlockingRecall:
+    def test_full_recall_on_sample(self) -> None:
+        report = blocking_recall(_names(seed=13), sample_size=100, seed=1)
+        assert report.sample_size == 100
+        assert report.recall == 1.0
+        assert report.candidate_pairs < report.all_pairs
+        assert 0.0 < report.reduction_ratio < 1.0
+
+    def test_empty(self) -> None:
+        report = blocking_recall([])
+        assert report.recall == 1.0
+        assert report.reduction_ratio == 0.0
+
+
+def test_gram_frequencies_counts_documents() -> None:
+    assert gram_frequencies(["aaaa", "aab"], q=2) == {"aa": 2, "ab": 1}
+
+
+def test_rejects_bad_threshold() -> None:
+    with pytest.raises(ValueError):
+        QGramIndex(threshold=0.0)
@@ -0,0 +1,68 @@
+"""Tests for union-find clustering and persistent cluster IDs."""
+
+from __future__ import annotations
+
+from dedup_clusters import UnionFind, assign_cluster_ids, load_cluster_ids, record_key, save_cluster_ids
+
+
+class TestUnionFind:
+    def test_transitive_merge(self) -> None:
+        uf = UnionFind(range(5))
+        uf.union(0, 1)
+        uf.union(1, 2)
+        assert uf.find(0) == uf.find(2)
+        assert sorted(map(sorted, uf.groups())) == [[0, 1, 2], [3], [4]]
+
+    def test_union_adds_unseen_items(self) -> None:
+        uf = UnionFind()
+        uf.union("a", "b")
+        assert "a" in uf and "b" in uf
+        assert uf.groups() == [["a", "b"]]
+
+
+class TestAssignClusterIds:
+    def test_first_run_numbers_largest_first(self) -> None:
+        ids = assign_cluster_ids([["c"], ["a", "b"]])
+        assert ids == {"a": "CL000001", "b": "CL000001", "c": "CL000002"}
+
+    def test_rerun_is_stable(self) -> None:
+        components = [["a", "b"], ["c"], ["d", "e", "f"]]
+        first = assign_cluster_ids(components)
+        assert assign_cluster_ids(list(reversed(components)), first) == first
+
+    def test_new_record_joins_existing_cluster(self) -> None:
+        previous = assign_cluster_ids([["a", "b"], ["c"]])
+        ids = assign_cluster_ids([["a", "b", "new"], ["c"]], previous)
+        assert ids["new"] == previous["a"]
+        assert ids["c"] == previous["c"]
+
+    def test_merge_keeps_majority_id(self) -> None:
+        previous = {"a": "CL000001", "b": "CL000001", "c": "CL000002"}
+        ids = assign_cluster_ids([["a", "b", "c"]], previous)
+        assert set(ids.values()) == {"CL000001"}
+
+    def test_split_gives_largest_part_the_id(self) -> None:
+        previous = {k: "CL000007" for k in "abc"}
+        ids = assign_cluster_ids([["c"], ["a", "b"]], previous)
+        assert ids["a"] == ids["b"] == "CL000007"
+        assert ids["c"] == "CL000008"
+
+    def test_retired_ids_are_not_reissued(self) -> None:
+        previous = {"gone": "CL000003", "a": "CL000001"}
+        ids = assign_cluster_ids([["a"], ["b"]], previous)
+        assert ids == {"a": "CL000001", "b": "CL000004"}
+
+
+def test_record_key_depends_on_every_field() -> None:
+    base = record_key("ie", "cork", "food bank", "foodbank.ie")
+    assert base == record_key("ie", "cork", "food bank", "foodbank.ie")
+    assert base != record_key("ie", "cork", "food bank", "")
+    assert base != record_key("ie", "cork food", "bank", "foodbank.ie")
+
+
+def test_save_load_round_trip(tmp_path) -> None:
+    path = tmp_path / "ids.csv"
+    assert load_cluster_ids(path) == {}
+    ids = {"b": "CL000002", "a": "CL000001"}
+    save_cluster_ids(ids, path)
+    assert load_cluster_ids(path) == ids
@@ -0,0 +1,152 @@
+"""Tests for the incremental dedup index."""
+
+from __future__ import annotations
+
+import json
+import random
+
+import pytest
+
+from dedup_clusters import record_key
+from dedup_index import DedupIndex, DedupMatch
+from similarity import similar_pairs
+
+
+def _records(seed: int) -> list[tuple[str, str, str, str]]:
+    rng = random.Random(seed)
+    words = ["food", "bank", "tafel", "community", "fridge", "kitchen", "share", "e.v."]
+    records = []
+    for _ in range(150):
+        city = rng.choice(["cork", "koln", "lyon"])
+        name = " ".join(rng.sample(words, rng.randint(2, 5)))
+        url = rng.choice(["", f"{name.replace(' ', '')}.org", "shared.example/x"])
+        records.append(("ie" if city == "cork" else "de", city, name, url))
+    # Edited copies of earlier records: exact repeats, new URLs, typos
+    for _ in range(50):
+        country, city, name, url = rng.choice(records)
+        edit = rng.choice(["same", "url", "typo"])
+        if edit == "url":
+            url = rng.choice(["", "other.example"])
+        elif edit == "typo":
+            pos = rng.randrange(len(name))
+            name = name[:pos] + rng.choice("xyz") + name[pos + 1 :]
+        records.append((country, city, name, url))
+    return records
+
+
+def _exhaustive(records, threshold: float = 0.92) -> set[tuple[int, int, str]]:
+    """Pairs ``detect_duplicates.py`` would report, as (i, j, strategy) with i < j."""
+    found = set()
+    for i in range(len(records)):
+        for j in range(i + 1, len(records)):
+            a, b = records[i], records[j]
+            if a[:2] != b[:2]:
+                continue
+            if a[2] == b[2]:
+                found.add((i, j, "key"))
+            if a[3] and a[3] == b[3]:
+                found.add((i, j, "url"))
+    names_by_group = {}
+    for i, r in enumerate(records):
+        names_by_group.setdefault(r[:2], []).append(i)
+    for ids in names_by_group.values():
+        for i, j, _ in similar_pairs([records[k][2] for k in ids], threshold):
+            if records[ids[i]][2] != records[ids[j]][2]:
+                found.add((ids[i], ids[j], "fuzzy"))
+    return found
+
+
+def test_delta_matches_equal_exhaustive_pairs_touching_delta() -> None:
+    records = _records(seed=1)
+    gold, delta = records[:150], records[150:]
+    index = DedupIndex()
+    for i, r in enumerate(gold):
+        index.add(*r, ref=str(i))
+
+    got = set()
+    for offset, r in enumerate(delta):
+        j = len(gold) + offset
+        for m in index.match(*r):
+            got.add((int(m.matched_ref), j, m.strategy))
+        index.add(*r, ref=str(j))
+
+    expected = {p for p in _exhaustive(records) if p[1] >= len(gold)}
+    # Rows with identical keys collapse to one indexed record, so compare
+    # against the first occurrence only.
+    first = {}
+    for i, r in enumerate(records):
+        first.setdefault(record_key(*r), i)
+    expected = {(first[record_key(*records[i])], j, s) for i, j, s in expected if first[record_key(*records[i])] != j}
+    assert got == expected
+    assert any(s == "fuzzy" for _, _, s in got)
+
+
+def test_unchanged_records_are_members() -> None:
+    index = DedupIndex()
+    key = index.add("ie", "cork", "food bank", "foodbank.ie")
+    assert key in index
+    assert record_key("ie", "cork", "food bank", "foodbank.ie") == key
+    assert record_key("ie", "cork", "food bank", "foodbank.org") not in index
+    assert index.add("ie", "cork", "food bank", "foodbank.ie") == key
+    assert len(index) == 1
+
+
+def test_matching_stays_within_city() -> None:
+    index = DedupIndex()
+    index.add("ie", "cork", "food bank", "foodbank.ie")
+    assert index.match("ie", "dublin", "food bank", "foodbank.ie") == []
+
+
+def test_save_load_round_trip(tmp_path) -> None:
+    index = DedupIndex()
+    for i, r in enumerate(_records(seed=2)):
+        index.add(*r, ref=str(i))
+    path = tmp_path / "index.json"
+    index.save(path)
+
+    loaded = DedupIndex.load(path)
+    assert list(loaded.records()) == list(index.records())
+    probe = ("ie", "cork", "food bank", "")
+    assert loaded.match(*probe) == index.match(*probe)
+
+
+def test_load_rejects_other_version(tmp_path) -> None:
+    path = tmp_path / "index.json"
+    path.write_text(json.dumps({"index_version": 0, "normalization_version": 1, "records": []}))
+    with pytest.raises(ValueError):
+        DedupIndex.load(path)
+
+
+def test_edited_record_does_not_match_its_old_version() -> None:
+    index = DedupIndex()
+    index.add("ie", "cork", "food bank", "foodbank.ie", ref="7")
+    index.add("ie", "cork", "food banks", "", ref="8")
+
+    # id 7 edited (new URL): still a fuzzy duplicate of id 8, but not of itself
+    matches = index.match("ie", "cork", "food bank", "foodbank.org", ref="7")
+    assert [(m.matched_ref, m.strategy) for m in matches] == [("8", "fuzzy")]
+
+
+def test_replace_swaps_out_the_previous_version(tmp_path) -> None:
+    index = DedupIndex()
+    old = index.add("ie", "cork", "food bank", "foodbank.ie", ref="7")
+    new = index.add("ie", "cork", "food bank", "foodbank.org", ref="7", replace=True)
+
+    assert old not in index and new in index
+    assert len(index) == 1
+    assert [r.url_key for r in index.records()] == ["foodbank.org"]
+    assert index.match("ie", "cork", "food bank", "foodbank.ie") == [
+        DedupMatch(old, new, "7", "key", 1.0)
+    ]
+
+    path = tmp_path / "index.json"
+    index.save(path)
+    assert [r.record_key for r in DedupIndex.load(path).records()] == [new]
+
+
+def test_replaced_names_are_not_fuzzy_candidates() -> None:
+    index = DedupIndex()
+    index.add("de", "koln", "koelner tafel", ref="3")
+    assert index.match("de", "koln", "koelner tafeln")  # builds the name index
+    index.add("de", "koln", "foodsharing koeln", ref="3", replace=True)
+    assert index.match("de", "koln", "koelner tafeln") == []
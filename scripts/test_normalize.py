@@ -7,10 +7,24 @@ in ``stg_automation.sql`` / ``stg_ground_truth.sql``.
 from __future__ import annotations
 
 import math
+import random
 
+import numpy as np
+import pandas as pd
 import pytest
 
-from normalize import extract_domain, normalize_url
+import normalize
+from normalize import (
+    UrlNormalizationCache,
+    UrlParts,
+    extract_domain,
+    extract_domains,
+    normalize_url,
+    normalize_urls,
+    parse_url,
+    parse_urls,
+    registrable_domain,
+)
 
 
 # ---------------------------------------------------------------------------
@@ -145,3 +159,229 @@ class TestCrossConsistency:
         domain_from_norm = norm.split("/")[0]
         domain_direct = extract_domain(url)
         assert domain_from_norm == domain_direct
+
+
+# ---------------------------------------------------------------------------
+# Batch API: normalize_urls / extract_domains
+# ---------------------------------------------------------------------------
+
+_TRICKY_URLS: list[object] = [
+    "https://www.example.com/path?q=1",
+    "  HTTP://www.Food-Share.ie/about?lang=en#team  ",
+    "https://example.com/path/'",
+    "https://example.com/path'/",
+    "www.https://example.com",
+    "https://https://example.com",
+    "example.com?x=1",
+    "example.com/a?b\nc",
+    "example.com/a/\n/b",
+    "example.com / a\u00a0b\u2003c",
+    "https://example.com/\uff21\uff22\uff23",
+    "https://\uff57\uff57\uff57.example.com",
+    "HTTPS://STRASSE.DE/Stra\u00dfe",
+    "",
+    "   ",
+    None,
+    float("nan"),
+    np.nan,
+    pd.NA,
+    12345,
+    1.5,
+    True,
+]
+
+
+def _random_urls(n: int, seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    alphabet = "abcXYZ/?#' .\n\t\u00a0\uff41\u00e9\u00df:"
+    prefixes = ["", "http://", "HTTPS://", "www.", "https://WWW.", "  "]
+    return [
+        rng.choice(prefixes) + "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+        for _ in range(n)
+    ]
+
+
+class TestBatchParity:
+    """Batch functions must match the scalar functions byte for byte."""
+
+    @pytest.mark.parametrize(
+        ("batch_fn", "scalar_fn"),
+        [(normalize_urls, normalize_url), (extract_domains, extract_domain)],
+    )
+    def test_tricky_inputs(self, batch_fn, scalar_fn) -> None:
+        assert batch_fn(_TRICKY_URLS).tolist() == [scalar_fn(u) for u in _TRICKY_URLS]
+
+    @pytest.mark.parametrize(
+        ("batch_fn", "scalar_fn"),
+        [(normalize_urls, normalize_url), (extract_domains, extract_domain)],
+    )
+    def test_random_inputs(self, batch_fn, scalar_fn) -> None:
+        urls = _random_urls(2000)
+        assert batch_fn(urls).tolist() == [scalar_fn(u) for u in urls]
+
+    def test_series_matches_apply(self) -> None:
+        s = pd.Series(_TRICKY_URLS * 3, index=range(100, 100 + 3 * len(_TRICKY_URLS)), name="source_url")
+        result = normalize_urls(s)
+        pd.testing.assert_series_equal(result, s.apply(normalize_url))
+
+    def test_numpy_object_array(self) -> None:
+        arr = np.array(_TRICKY_URLS, dtype=object)
+        assert extract_domains(arr).tolist() == [extract_domain(u) for u in _TRICKY_URLS]
+
+    def test_generator_input(self) -> None:
+        result = normalize_urls(u for u in ["https://example.com/", None])
+        assert result.tolist() == ["example.com", ""]
+
+    def test_empty_input(self) -> None:
+        assert normalize_urls([]).tolist() == []
+
+
+# ---------------------------------------------------------------------------
+# UrlNormalizationCache
+# ---------------------------------------------------------------------------
+
+
+class TestUrlNormalizationCache:
+    """Memoized results must equal the uncached functions."""
+
+    def test_hits_and_misses(self) -> None:
+        cache = UrlNormalizationCache(capacity=10)
+        assert cache.normalize_url("https://www.example.com/a/") == "example.com/a"
+        assert cache.normalize_url("https://www.example.com/a/") == "example.com/a"
+        assert cache.extract_domain("https://www.example.com/a/") == "example.com"
+        stats = cache.stats
+        assert (stats.hits, stats.misses, stats.size) == (1, 2, 2)
+        assert stats.hit_rate == pytest.approx(1 / 3)
+
+    def test_non_string_inputs_bypass_cache(self) -> None:
+        cache = UrlNormalizationCache(capacity=10)
+        assert cache.normalize_url(None) == ""
+        assert cache.normalize_url(float("nan")) == ""
+        assert cache.normalize_url(12345) == "12345"
+        assert cache.stats.misses == 0
+        assert len(cache) == 0
+
+    def test_evicts_least_recently_used(self) -> None:
+        cache = UrlNormalizationCache(capacity=2)
+        cache.normalize_url("a.com")
+        cache.normalize_url("b.com")
+        cache.normalize_url("a.com")  # refresh a.com
+        cache.normalize_url("c.com")  # evicts b.com
+        assert cache.stats.evictions == 1
+        cache.normalize_url("a.com")
+        cache.normalize_url("b.com")
+        assert cache.stats.hits == 2
+        assert cache.stats.misses == 4
+
+    def test_batch_matches_uncached(self) -> None:
+        cache = UrlNormalizationCache(capacity=5)
+        urls = _TRICKY_URLS * 2
+        assert cache.normalize_urls(urls).tolist() == normalize_urls(urls).tolist()
+        assert cache.extract_domains(urls).tolist() == extract_domains(urls).tolist()
+        assert cache.stats.size == 5
+
+    def test_save_and_load_round_trip(self, tmp_path) -> None:
+        path = tmp_path / "url_cache.json"
+        cache = UrlNormalizationCache(capacity=10)
+        cache.normalize_urls(["https://a.com/x", "https://b.com/y", "https://a.com/x"])
+        cache.save(path)
+
+        warm = UrlNormalizationCache.load(path, capacity=10)
+        assert len(warm) == 2
+        assert warm.normalize_url("https://a.com/x") == "a.com/x"
+        assert warm.stats.hits == 1
+
+    def test_load_keeps_most_recent_when_over_capacity(self, tmp_path) -> None:
+        path = tmp_path / "url_cache.json"
+        cache = UrlNormalizationCache(capacity=10)
+        for url in ["a.com", "b.com", "c.com"]:
+            cache.normalize_url(url)
+        cache.save(path)
+
+        warm = UrlNormalizationCache.load(path, capacity=2)
+        warm.normalize_url("c.com")
+        warm.normalize_url("a.com")
+        assert (warm.stats.hits, warm.stats.misses) == (1, 1)
+
+    def test_load_discards_other_version(self, tmp_path, monkeypatch) -> None:
+        path = tmp_path / "url_cache.json"
+        cache = UrlNormalizationCache(capacity=10)
+        cache.normalize_url("a.com")
+        cache.save(path)
+
+        monkeypatch.setattr(normalize, "NORMALIZATION_VERSION", normalize.NORMALIZATION_VERSION + 1)
+        assert len(UrlNormalizationCache.load(path)) == 0
+
+    def test_load_missing_file(self, tmp_path) -> None:
+        assert len(UrlNormalizationCache.load(tmp_path / "missing.json")) == 0
+
+    def test_rejects_zero_capacity(self) -> None:
+        with pytest.raises(ValueError):
+            UrlNormalizationCache(capacity=0)
+
+
+# ---------------------------------------------------------------------------
+# parse_url / parse_urls
+# ---------------------------------------------------------------------------
+
+
+def _path_segments(url_norm: str) -> tuple[str, ...]:
+    parts = url_norm.split("/", 1)
+    if len(parts) < 2:
+        return ()
+    return tuple(s for s in parts[1].split("/") if s)
+
+
+class TestParseUrl:
+    """Single-pass parsing must agree with the individual functions."""
+
+    def test_full_record(self) -> None:
+        assert parse_url("https://www.Events.FoodSharing.de/About//Team/?x=1") == UrlParts(
+            url_norm="events.foodsharing.de/about//team",
+            domain="events.foodsharing.de",
+            path_segments=("about", "team"),
+            path_seg_1="about",
+            registrable_domain="foodsharing.de",
+        )
+
+    def test_no_path(self) -> None:
+        parts = parse_url("http://example.com/")
+        assert parts.path_segments == ()
+        assert parts.path_seg_1 is None
+
+    def test_empty_inputs(self) -> None:
+        for value in (None, float("nan"), "", "   "):
+            assert parse_url(value) == UrlParts("", "", (), None, "")
+
+    def test_matches_scalar_functions(self) -> None:
+        for url in [*_TRICKY_URLS, *_random_urls(500, seed=11)]:
+            parts = parse_url(url)
+            assert parts.url_norm == normalize_url(url)
+            assert parts.domain == extract_domain(url)
+            assert parts.path_segments == _path_segments(parts.url_norm)
+
+    def test_batch_matches_scalar(self) -> None:
+        urls = pd.Series(_TRICKY_URLS * 2, index=range(10, 10 + 2 * len(_TRICKY_URLS)))
+        frame = parse_urls(urls)
+        assert list(frame.columns) == list(UrlParts._fields)
+        assert frame.index.equals(urls.index)
+        assert frame["url_norm"].tolist() == [normalize_url(u) for u in urls]
+        assert frame["domain"].tolist() == [extract_domain(u) for u in urls]
+        assert frame["path_segments"].tolist() == [parse_url(u).path_segments for u in urls]
+
+
+class TestRegistrableDomain:
+    @pytest.mark.parametrize(
+        ("domain", "expected"),
+        [
+            ("example.com", "example.com"),
+            ("events.foodsharing.de", "foodsharing.de"),
+            ("a.b.foodbank.org.uk", "foodbank.org.uk"),
+            ("example.com:8080", "example.com"),
+            ("192.168.0.1:80", "192.168.0.1"),
+            ("localhost", "localhost"),
+            ("", ""),
+        ],
+    )
+    def test_examples(self, domain: str, expected: str) -> None:
+        assert registrable_domain(domain) == expected
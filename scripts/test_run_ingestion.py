@@ -0,0 +1,147 @@
+"""Tests for the batch helpers of the ingestion entry point."""
+
+from __future__ import annotations
+
+import dataclasses
+import datetime as dt
+import io
+import json
+import threading
+import time
+
+import pytest
+
+from run_ingestion import RateLimiter, SnapshotWriter, classify_many, read_urls
+
+
+@dataclasses.dataclass
+class _Snapshot:
+    source_url: str
+    label: str
+    confidence: float
+    executed_at_utc: dt.datetime
+
+
+class _Classifier:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def classify(self, source_url: str) -> _Snapshot:
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(0.05 if source_url.endswith("slow") else 0.01)
+            if source_url.endswith("bad"):
+                raise RuntimeError("upstream error")
+            return _Snapshot(source_url, "include", 0.9, dt.datetime(2025, 1, 1, tzinfo=dt.UTC))
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def test_read_urls_merges_sources_and_skips_comments(tmp_path) -> None:
+    path = tmp_path / "urls.txt"
+    path.write_text("https://a.org\n\n# comment\nhttps://b.org\nhttps://a.org\n", encoding="utf-8")
+    assert read_urls(["https://c.org"], str(path)) == ["https://c.org", "https://a.org", "https://b.org"]
+    assert read_urls([], "-", stdin=io.StringIO("https://d.org\n")) == ["https://d.org"]
+
+
+def test_classify_many_streams_with_bounded_concurrency() -> None:
+    classifier = _Classifier()
+    urls = ["https://x.org/slow"] + [f"https://x.org/{i}" for i in range(20)] + ["https://x.org/bad"]
+    results = list(classify_many(classifier, urls, concurrency=4))
+
+    assert sorted(url for url, _ in results) == sorted(urls)
+    assert classifier.max_in_flight == 4
+    assert results[0][0] != "https://x.org/slow"  # finished order, not input order
+    errors = {url: snap for url, snap in results if isinstance(snap, Exception)}
+    assert list(errors) == ["https://x.org/bad"]
+
+
+def test_classify_many_prefers_the_classifier_batch_api() -> None:
+    class _Batched(_Classifier):
+        def classify_many(self, urls, concurrency):
+            return [self.classify(source_url=u) for u in urls]
+
+    assert [url for url, _ in classify_many(_Batched(), ["https://a.org"], 2)] == ["https://a.org"]
+
+
+def test_jsonl_output_is_appended(tmp_path) -> None:
+    path = tmp_path / "out" / "snapshots.jsonl"
+    for url in ["https://a.org", "https://b.org"]:
+        writer = SnapshotWriter(path)
+        writer.write(_Snapshot(url, "exclude", 0.2, dt.datetime(2025, 1, 1)))
+        writer.close()
+
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [r["source_url"] for r in records] == ["https://a.org", "https://b.org"]
+    assert records[0]["executed_at_utc"] == "2025-01-01T00:00:00"
+
+
+def test_rate_limiter_spaces_calls() -> None:
+    now, waits = [0.0], []
+    limiter = RateLimiter(120, clock=lambda: now[0], sleep=waits.append)
+    for _ in range(3):
+        limiter.acquire()
+    assert waits == [0.5, 1.0]  # 0.5 s apart at 120 per minute
+
+    now[0] = 10.0  # idle for longer than the interval: no wait
+    limiter.acquire()
+    assert waits == [0.5, 1.0]
+
+
+def test_classify_many_shares_one_limiter() -> None:
+    waits = []
+    limiter = RateLimiter(60, sleep=waits.append)  # record the waits instead of sleeping
+    urls = [f"https://x.org/{i}" for i in range(10)]
+    assert len(list(classify_many(_Classifier(), urls, concurrency=4, limiter=limiter))) == 10
+    assert sorted(round(w) for w in waits) == list(range(1, 10))  # one slot per second across the pool
+
+
+def test_parquet_output_checks_the_engine_up_front(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr("importlib.util.find_spec", lambda name: None)
+    with pytest.raises(ImportError, match="pyarrow"):
+        SnapshotWriter(tmp_path / "snapshots.parquet")
+
+    (tmp_path / "file.parquet").write_bytes(b"")
+    with pytest.raises(ValueError, match="directory"):
+        SnapshotWriter(tmp_path / "file.parquet")
+
+
+def test_parquet_parts_continue_after_the_highest_index(tmp_path, monkeypatch) -> None:
+    pd = pytest.importorskip("pandas")
+    monkeypatch.setattr("run_ingestion.parquet_engine", lambda: "stub")
+    monkeypatch.setattr(pd.DataFrame, "to_parquet", lambda df, p, **kw: p.write_text(str(len(df))))
+
+    path = tmp_path / "snapshots.parquet"
+    path.mkdir()
+    for name in ["part-00000.parquet", "part-00002.parquet"]:  # part 1 was removed
+        (path / name).write_text("old")
+    writer = SnapshotWriter(path)
+    writer.write(_Snapshot("https://a.org", "include", 0.9, dt.datetime(2025, 1, 1)))
+    writer.close()
+
+    assert (path / "part-00002.parquet").read_text() == "old"
+    assert (path / "part-00003.parquet").read_text() == "1"
+
+
+def test_parquet_output_is_written_in_parts(tmp_path) -> None:
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("pyarrow")
+
+    path = tmp_path / "snapshots.parquet"
+    writer = SnapshotWriter(path, part_size=2)
+    for i in range(3):
+        writer.write(_Snapshot(f"https://{i}.org", "include", 0.9, dt.datetime(2025, 1, 1)))
+        assert len(list(path.glob("part-*.parquet"))) == (i + 1) // 2  # full parts land before close
+    writer.close()
+
+    writer = SnapshotWriter(path, part_size=2)
+    writer.write(_Snapshot("https://3.org", "exclude", 0.1, dt.datetime(2025, 1, 1)))
+    writer.close()
+
+    assert sorted(p.name for p in path.iterdir()) == [f"part-0000{i}.parquet" for i in range(3)]
+    assert sorted(pd.read_parquet(path)["source_url"]) == [f"https://{i}.org" for i in range(4)]
@@ -0,0 +1,105 @@
+"""Parity tests for the similarity backends against ``difflib.SequenceMatcher``."""
+
+from __future__ import annotations
+
+import random
+from difflib import SequenceMatcher
+
+import pytest
+
+from similarity import RatioScorer, available_backends, get_matcher_class, ratio, similar_pairs
+
+
+def _difflib_ratio(a: str, b: str) -> float:
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def _random_names(n: int, seed: int, alphabet: str = "abcde fgh'éß") -> list[str]:
+    rng = random.Random(seed)
+    base = ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30))) for _ in range(n // 2)]
+    # Near-duplicates: single-character edits of existing names
+    variants = []
+    for name in base:
+        pos = rng.randint(0, len(name))
+        variants.append(name[:pos] + rng.choice(alphabet) + name[pos + 1 :])
+    return base + variants
+
+
+_EDGE_CASES = [
+    ("", ""),
+    ("", "a"),
+    ("a", ""),
+    ("foodbank", "foodbank"),
+    ("food bank cork", "foodbank cork"),
+    ("community fridge", "fridge community"),
+    ("bäckerei tafel", "backerei tafel"),
+    ("x" * 250 + "abc", "x" * 249 + "abd"),  # len >= 200 triggers difflib's autojunk
+    ("ab" * 150, "ba" * 150),
+]
+
+
+@pytest.fixture(params=available_backends())
+def backend(request) -> str:
+    return request.param
+
+
+class TestRatioParity:
+    """Scores must equal difflib exactly, for every installed backend."""
+
+    @pytest.mark.parametrize(("a", "b"), _EDGE_CASES)
+    def test_edge_cases(self, backend: str, a: str, b: str) -> None:
+        assert ratio(a, b, backend=backend) == _difflib_ratio(a, b)
+
+    def test_random_pairs(self, backend: str) -> None:
+        names = _random_names(200, seed=3)
+        scorer = RatioScorer(backend)
+        rng = random.Random(5)
+        for _ in range(3000):
+            a, b = rng.choice(names), rng.choice(names)
+            assert scorer.score(a, b) == _difflib_ratio(a, b)
+
+    def test_is_order_sensitive_like_difflib(self, backend: str) -> None:
+        # difflib's ratio is not symmetric; the scorer keeps the (a, b) order.
+        a, b = "tafel e.v. koln", "kolner tafel e.v."
+        assert ratio(a, b, backend=backend) == _difflib_ratio(a, b)
+        assert ratio(b, a, backend=backend) == _difflib_ratio(b, a)
+
+
+class TestCutoff:
+    """Early exit must never drop a pair that reaches the cutoff."""
+
+    def test_exact_above_cutoff_zero_below(self, backend: str) -> None:
+        names = _random_names(200, seed=9)
+        scorer = RatioScorer(backend)
+        for a in names[:60]:
+            for b in names:
+                expected = _difflib_ratio(a, b)
+                got = scorer.score(a, b, cutoff=0.92)
+                if expected >= 0.92:
+                    assert got == expected
+                else:
+                    assert got == 0.0
+
+    def test_similar_pairs_matches_exhaustive(self, backend: str) -> None:
+        names = _random_names(120, seed=21)
+        expected = [
+            (i, j, _difflib_ratio(names[i], names[j]))
+            for i in range(len(names))
+            for j in range(i + 1, len(names))
+            if _difflib_ratio(names[i], names[j]) >= 0.92
+        ]
+        got = list(similar_pairs(names, 0.92, backend=backend))
+        assert sorted(got) == sorted(expected)
+        assert expected  # the fixture must contain near-duplicates
+
+
+class TestBackendSelection:
+    def test_auto_prefers_first_available(self) -> None:
+        assert get_matcher_class("auto") is get_matcher_class(available_backends()[0])
+
+    def test_difflib_always_available(self) -> None:
+        assert get_matcher_class("difflib") is SequenceMatcher
+
+    def test_unknown_backend(self) -> None:
+        with pytest.raises(ValueError):
+            get_matcher_class("levenshtein")